@@ -0,0 +1,58 @@
+"""
+Поиск городов: FTS5 индекс против LIKE '%...%' при росте таблицы.
+
+    python -m benchmarks.city_search --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import string
+
+from .common import measure, setup_django, summarize
+
+
+def random_name(rng):
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))).title()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import models
+
+    from weather_app import search
+    from weather_app.models import City
+
+    rng = random.Random(0)
+    queries = ["mos", "par", "ber", "lon", "tok"]
+    print(f"{'городов':>8} {'FTS p50':>9} {'FTS p99':>9} {'LIKE p50':>9} {'LIKE p99':>9}")
+    for size in sorted(args.sizes):
+        missing = size - City.objects.count()
+        City.objects.bulk_create(
+            [City(name=random_name(rng), country=random_name(rng), latitude=0, longitude=0)
+             for _ in range(missing)],
+            batch_size=5000,
+        )
+        search.rebuild_index(City.objects.all())
+
+        def fts():
+            q = rng.choice(queries)
+            return list(City.objects.filter(pk__in=search.search_city_ids(q)))
+
+        def like():
+            q = rng.choice(queries)
+            return list(City.objects.filter(
+                models.Q(name__icontains=q) | models.Q(country__icontains=q)
+            ))
+
+        fts_stats = summarize(measure(fts, repeat=args.repeat))
+        like_stats = summarize(measure(like, repeat=args.repeat))
+        print(f"{size:>8} {fts_stats['p50_ms']:>9} {fts_stats['p99_ms']:>9} "
+              f"{like_stats['p50_ms']:>9} {like_stats['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Общая настройка бенчмарков: Django поднимается на отдельной временной
+SQLite базе, рабочая db.sqlite3 не затрагивается.
+
+Запуск из корня проекта: python -m benchmarks.<имя>
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None):
+    """Настраивает Django на временной базе и применяет миграции."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meteoservice.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="meteo-bench-"), "bench.sqlite3")
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DATABASES["replica"]["NAME"] = db_path
+    # DEBUG копит все SQL запросы в памяти и искажает замеры
+    settings.DEBUG = False
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    return db_path
+
+
+def measure(func, repeat=50):
+    """Запускает func repeat раз, возвращает задержки в миллисекундах."""
+    func()  # прогрев
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings):
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
@@ -0,0 +1,102 @@
+"""
+Статистика прогнозов по корзинам (/api/v1/forecasts/aggregate/): NumPy
+против GROUP BY в SQLite на большой истории.
+
+База заполняется сырым executemany (ORM на 10 млн строк слишком медленный):
+--cities городов в --countries странах, по --rows / --cities дней истории
+на город. Для numpy отдельно показано время чтения столбцов из базы и
+время расчета корзин.
+
+    python -m benchmarks.forecast_aggregate --rows 10000000 --cities 1000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from .common import setup_django
+
+
+def populate(City, cities, countries, rows):
+    from django.db import connection, transaction
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country=f"Country {i % countries}", latitude=0, longitude=0)
+        for i in range(cities)
+    )
+    city_ids = list(City.objects.order_by("pk").values_list("pk", flat=True))
+    days = rows // cities
+    start = datetime(2000, 1, 1)
+    dates = [(start + timedelta(days=day)).strftime("%Y-%m-%d %H:%M:%S") for day in range(days)]
+    rng = random.Random(0)
+    noise = [round(rng.uniform(-5, 5), 1) for _ in range(997)]
+    created = start.strftime("%Y-%m-%d %H:%M:%S")
+    sql = (
+        "INSERT INTO weather_app_weatherforecast (city_id_id, forecast_date, temperature_min, "
+        "temperature_max, condition, humidity, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for n, city_id in enumerate(city_ids):
+            cursor.executemany(sql, [
+                (city_id, date, noise[(n + day) % 997], noise[(n + day) % 997] + 8,
+                 "Sunny", 40 + (n + day) % 50, created)
+                for day, date in enumerate(dates)
+            ])
+    return days * len(city_ids)
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--countries", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Avg, Count, Max, Min
+    from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+    from weather_app.aggregate import aggregate, load_columns
+    from weather_app.models import City, WeatherForecast
+
+    started = time.perf_counter()
+    total = populate(City, args.cities, args.countries, args.rows)
+    print(f"Строк: {total}, заполнение {time.perf_counter() - started:.0f} с")
+
+    city = City.objects.order_by("pk").first()
+    scopes = {
+        "город": WeatherForecast.objects.filter(city_id=city),
+        "страна": WeatherForecast.objects.filter(city_id__country=city.country),
+        "все": WeatherForecast.objects.all(),
+    }
+    truncs = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+
+    print(f"{'выборка':>8} {'строк':>10} {'корзина':>8} {'чтение мс':>10} {'numpy мс':>9} "
+          f"{'всего мс':>9} {'SQL мс':>9}")
+    for scope, queryset in scopes.items():
+        load_ms, columns = timed(lambda: load_columns(queryset), args.repeat)
+        for bucket, trunc in truncs.items():
+            compute_ms, stats = timed(lambda: aggregate(columns, bucket), args.repeat)
+            sql_ms, rows = timed(lambda: list(
+                queryset.annotate(start=trunc("forecast_date")).values("start")
+                .annotate(n=Count("pk"), low=Min("temperature_min"), high=Max("temperature_max"),
+                          wet=Avg("humidity"))
+                .order_by("start")
+            ), 1)
+            assert len(rows) == len(stats["start"]), (scope, bucket)
+            print(f"{scope:>8} {len(columns):>10} {bucket:>8} {load_ms:>10.0f} {compute_ms:>9.1f} "
+                  f"{load_ms + compute_ms:>9.0f} {sql_ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Размер ответа и время CPU серии прогнозов города: построчный формат
+(WeatherForecastSerializer) против колоночного (?format=columnar).
+
+Обе серии строятся из одной выборки и рендерятся JSONRenderer, как в API;
+размер указан без сжатия и с gzip. Время - процессорное (time.process_time),
+включает выборку из базы.
+
+    python -m benchmarks.forecast_columnar --points 1000 10000
+"""
+import argparse
+import gzip
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .common import setup_django, summarize
+
+
+def measure_cpu(func, repeat):
+    func()  # прогрев
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        timings.append((time.process_time() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from weather_app.columnar import columns
+    from weather_app.models import City, WeatherForecast
+    from weather_app.serializers import WeatherForecastSerializer
+
+    conditions = ["Sunny", "Cloudy", "Rain", "Snow"]
+    start = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+    renderer = JSONRenderer()
+
+    print(f"{'точек':>7} {'формат':>9} {'байт':>10} {'gzip':>9} {'p50 мс':>8} {'p95 мс':>8}")
+    for points in args.points:
+        city = City.objects.create(name=f"Series {points}", country="Bench", latitude=0, longitude=0)
+        WeatherForecast.objects.bulk_create(
+            (
+                WeatherForecast(
+                    city_id=city,
+                    forecast_date=start + timedelta(hours=i),
+                    temperature_min=round(-5 + (i % 97) / 7, 1),
+                    temperature_max=round(3 + (i % 89) / 5, 1),
+                    condition=conditions[i // 6 % len(conditions)],
+                    humidity=40 + i % 50,
+                )
+                for i in range(points)
+            ),
+            batch_size=5000,
+        )
+        forecasts = WeatherForecast.objects.filter(city_id=city).order_by("forecast_date", "id")
+
+        def rows():
+            data = WeatherForecastSerializer(forecasts.select_related("city_id"), many=True).data
+            return renderer.render(data)
+
+        def columnar():
+            conditions, data = columns(forecasts.values_list(
+                "forecast_date", "id", "temperature_min", "temperature_max", "humidity", "condition"
+            ))
+            header = {"id": city.pk, "name": city.name, "country": city.country}
+            return renderer.render({"city": header, "conditions": conditions, "columns": data})
+
+        for name, func in (("rows", rows), ("columnar", columnar)):
+            body = func()
+            stats = summarize(measure_cpu(func, args.repeat))
+            print(f"{points:>7} {name:>9} {len(body):>10} {len(gzip.compress(body)):>9} "
+                  f"{stats['p50_ms']:>8} {stats['p95_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Серия прогнозов города с ?max_points=N (LTTB) при росте истории: размер
+ответа не зависит от длины истории, время первого запроса растет линейно
+(чтение столбцов и один проход LTTB), повторный запрос берет выбранные id
+из кэша.
+
+    python -m benchmarks.forecast_downsample --points 10000 100000 1000000 --max-points 1000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+from .common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--max-points", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from django.test import Client
+    from weather_app.downsample import lttb_indices
+    from weather_app.models import City, WeatherForecast
+
+    client = Client()
+    start = datetime(1990, 1, 1, tzinfo=dt_timezone.utc)
+    rng = np.random.default_rng(0)
+
+    print(f"{'точек':>8} {'LTTB мс':>8} {'1-й запрос мс':>14} {'из кэша мс':>11} "
+          f"{'байт':>8} {'без прореживания, байт':>23}")
+    for points in args.points:
+        city = City.objects.create(name=f"History {points}", country="Bench", latitude=0, longitude=0)
+        lows = np.round(np.cumsum(rng.normal(0, 1, points)) / 10, 1).tolist()
+        WeatherForecast.objects.bulk_create(
+            (
+                WeatherForecast(
+                    city_id=city, forecast_date=start + timedelta(hours=i),
+                    temperature_min=low, temperature_max=low + 8, condition="Cloudy", humidity=50,
+                )
+                for i, low in enumerate(lows)
+            ),
+            batch_size=5000,
+        )
+        x = np.arange(points, dtype=np.float64)
+        ys = np.vstack((lows, np.add(lows, 8)))
+        started = time.perf_counter()
+        lttb_indices(x, ys, args.max_points)
+        lttb_ms = (time.perf_counter() - started) * 1000
+
+        params = {"city": city.pk, "format": "columnar", "max_points": args.max_points}
+        cache.clear()
+        timings = []
+        for attempt in range(2):
+            # лишний параметр - мимо кэша ответов, но с кэшем выбранных id
+            started = time.perf_counter()
+            response = client.get("/api/v1/forecasts/", {**params, "attempt": attempt})
+            timings.append((time.perf_counter() - started) * 1000)
+        # полная серия в том же формате - на одну точку ~24 байта
+        full = len(response.content) * points // args.max_points
+        print(f"{points:>8} {lttb_ms:>8.1f} {timings[0]:>14.0f} {timings[1]:>11.0f} "
+              f"{len(response.content):>8} {full:>23}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Память и скорость потоковой выгрузки прогнозов при росте числа строк.
+
+Пиковая память (tracemalloc) при чтении всей выгрузки не должна
+зависеть от количества строк.
+
+    python -m benchmarks.forecast_export --sizes 1000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .common import setup_django
+
+
+def populate(City, WeatherForecast, total):
+    """Добавляет прогнозы до total строк (по 1000 городов, день за днем)."""
+    from django.db import transaction
+
+    cities = list(City.objects.order_by("pk"))
+    start = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+    have = WeatherForecast.objects.count()
+    batch = []
+    with transaction.atomic():
+        for i in range(have, total):
+            batch.append(WeatherForecast(
+                city_id=cities[i % len(cities)],
+                forecast_date=start + timedelta(days=i // len(cities)),
+                temperature_min=-5 + i % 10,
+                temperature_max=5 + i % 10,
+                condition="Sunny",
+                humidity=50,
+            ))
+            if len(batch) >= 10000:
+                WeatherForecast.objects.bulk_create(batch)
+                batch.clear()
+        WeatherForecast.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    from weather_app import export
+    from weather_app.models import City, WeatherForecast
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=0, longitude=0) for i in range(1000)
+    )
+
+    print(f"{'формат':>7} {'строк':>9} {'МБ ответа':>10} {'пик МБ':>8} {'строк/с':>10}")
+    for size in sorted(args.sizes):
+        populate(City, WeatherForecast, size)
+        for fmt in export.RENDERERS:
+            tracemalloc.start()
+            started = time.perf_counter()
+            total = sum(len(chunk) for chunk in export.stream(
+                WeatherForecast.objects.all(), fmt, gzip=args.gzip
+            ))
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{fmt:>7} {size:>9} {total / 2**20:>10.1f} {peak / 2**20:>8.2f} "
+                  f"{size / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
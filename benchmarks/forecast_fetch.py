@@ -0,0 +1,51 @@
+"""
+Пропускная способность fetch_forecasts против локального провайдера с
+задержкой ответа: зависимость от числа потоков, доля повторов при ошибках
+и повторный проход условными запросами (304).
+
+    python -m benchmarks.forecast_fetch --cities 500 --latency 0.02 --workers 1 4 16
+"""
+import argparse
+import random
+
+from .common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка провайдера, секунд")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    setup_django()
+    from weather_app import stub_provider
+    from weather_app.models import City, ForecastFetchState, WeatherForecast
+    from weather_app.providers import ProviderClient, fetch_forecasts
+
+    rng = random.Random(0)
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=rng.uniform(-60, 70),
+             longitude=rng.uniform(-180, 180))
+        for i in range(args.cities)
+    )
+    server, url = stub_provider.start_in_thread(latency=args.latency, error_rate=args.error_rate)
+
+    print(f"городов: {args.cities}, задержка: {args.latency * 1000:.0f} мс, ошибок: {args.error_rate:.0%}")
+    print(f"{'потоков':>8} {'проход':>8} {'городов/с':>10} {'запросов':>9} {'200':>6} {'304':>6} {'отказ':>6}")
+    for workers in args.workers:
+        WeatherForecast.objects.all().delete()
+        ForecastFetchState.objects.all().delete()
+        for run in ("полный", "304"):
+            client = ProviderClient(url=url, workers=workers, rate=0, retries=3, backoff=0)
+            stats = fetch_forecasts(City.objects.order_by("pk"), client, workers=workers, days=args.days)
+            client.close()
+            print(f"{workers:>8} {run:>8} {stats.cities / stats.elapsed:>10.0f} {stats.requests:>9} "
+                  f"{stats.updated:>6} {stats.not_modified:>6} {stats.failed:>6}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Импорт прогнозов через WeatherForecastResource (django-import-export):
+быстрый режим против построчного (ForeignKeyWidget и save на строку).
+
+    python -m benchmarks.forecast_import --cities 100 --rows 20000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from .common import setup_django
+
+
+def make_dataset(city_names, rows):
+    import tablib
+
+    dataset = tablib.Dataset(headers=[
+        "city", "forecast_date", "temperature_min", "temperature_max", "condition", "humidity",
+    ])
+    start = datetime(2020, 1, 1)
+    for i in range(rows):
+        day = start + timedelta(days=i // len(city_names))
+        dataset.append([
+            city_names[i % len(city_names)], day.strftime("%Y-%m-%d"), -5 + i % 10, 5 + i % 10,
+            "Sunny", 50,
+        ])
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from import_export import fields
+    from import_export.instance_loaders import ModelInstanceLoader
+    from import_export.widgets import ForeignKeyWidget
+
+    from weather_app.models import City, WeatherForecast
+    from weather_app.resources import WeatherForecastResource
+
+    class RowByRowResource(WeatherForecastResource):
+        """Прежнее поведение: запрос города и save() на каждую строку"""
+        city_id = fields.Field(
+            column_name="city", attribute="city_id", widget=ForeignKeyWidget(City, "name")
+        )
+
+        class Meta(WeatherForecastResource.Meta):
+            use_bulk = False
+            skip_diff = False
+            instance_loader_class = ModelInstanceLoader
+
+        def before_import(self, dataset, **kwargs):
+            self.started = time.monotonic()
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=0, longitude=0)
+        for i in range(args.cities)
+    )
+    dataset = make_dataset([f"City {i}" for i in range(args.cities)], args.rows)
+
+    print(f"{'режим':>12} {'строк':>8} {'сек':>8} {'строк/с':>10}")
+    for label, resource_class in [("построчно", RowByRowResource), ("быстрый", WeatherForecastResource)]:
+        WeatherForecast.objects.all().delete()
+        started = time.perf_counter()
+        result = resource_class().import_data(dataset.copy() if hasattr(dataset, "copy") else dataset)
+        elapsed = time.perf_counter() - started
+        assert not result.has_errors(), result.base_errors
+        print(f"{label:>12} {WeatherForecast.objects.count():>8} {elapsed:>8.2f} "
+              f"{args.rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
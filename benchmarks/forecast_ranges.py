@@ -0,0 +1,76 @@
+"""
+Задержка выборки прогнозов города за месяц при росте истории.
+
+С индексом (city_id, forecast_date) время запроса не должно заметно
+расти от количества лет истории.
+
+    python -m benchmarks.forecast_ranges --cities 20 --years 1 5 20
+"""
+import argparse
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .common import measure, setup_django, summarize
+
+
+def populate(City, WeatherForecast, cities, days, start):
+    from django.db import transaction
+
+    existing = WeatherForecast.objects.count()
+    batch = []
+    with transaction.atomic():
+        for city in City.objects.order_by("pk")[:cities]:
+            have = WeatherForecast.objects.filter(city_id=city).count()
+            for day in range(have, days):
+                batch.append(WeatherForecast(
+                    city_id=city,
+                    forecast_date=start + timedelta(days=day),
+                    temperature_min=-5 + day % 10,
+                    temperature_max=5 + day % 10,
+                    condition="Sunny",
+                    humidity=50,
+                ))
+                if len(batch) >= 5000:
+                    WeatherForecast.objects.bulk_create(batch)
+                    batch.clear()
+        WeatherForecast.objects.bulk_create(batch)
+    return WeatherForecast.objects.count() - existing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from weather_app.filters import filter_forecast_dates
+    from weather_app.models import City, WeatherForecast
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=0, longitude=0)
+        for i in range(args.cities)
+    )
+    start = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+    city = City.objects.order_by("pk").first()
+
+    print(f"{'лет':>5} {'строк':>10} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}")
+    for years in sorted(args.years):
+        populate(City, WeatherForecast, args.cities, years * 365, start)
+        window_start = start + timedelta(days=years * 365 // 2)
+        params = {
+            "from": window_start.date().isoformat(),
+            "to": (window_start + timedelta(days=30)).date().isoformat(),
+        }
+
+        def query():
+            qs = filter_forecast_dates(WeatherForecast.objects.filter(city_id=city), params)
+            return list(qs)
+
+        stats = summarize(measure(query, repeat=args.repeat))
+        print(f"{years:>5} {WeatherForecast.objects.count():>10} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Сквозной бенчмарк страниц и API на синтетических данных разного размера.
+
+Для каждого размера (городов x дней прогнозов x пользователей) база
+заполняется заново, затем каждый эндпоинт вызывается через тестовый
+клиент Django (весь стек middleware, без сети). Замеряются задержки
+(p50/p95/p99), число SQL запросов и пик памяти Python (tracemalloc) на
+запрос. Кэш ответов выключен, чтобы измерялись сами view.
+
+Результаты пишутся в JSON; --compare сравнивает с прошлым запуском:
+
+    python -m benchmarks.load_suite --sizes 100x30x50 1000x365x500
+    python -m benchmarks.load_suite --compare benchmarks/results/<прошлый>.json
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from .common import BASE_DIR, measure, setup_django, summarize
+
+START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+COUNTRIES = [f"Country {i}" for i in range(40)]
+CONDITIONS = ["Sunny", "Cloudy", "Rain", "Snow", "Fog"]
+
+# имя -> (шаблон URL, нужен ли вход пользователя)
+ENDPOINTS = {
+    "city_list": ("/cities/", False),
+    "city_list_sorted": ("/cities/?sort=-country", False),
+    "city_detail": ("/cities/{city}/?from={date_from}&to={date_to}", False),
+    "city_search": ("/cities/search/?q=City+{city}", False),
+    "forecast_list": ("/forecasts/?city={city}", False),
+    "my_favorites": ("/my-favorites/", True),
+    "profile": ("/profile/", True),
+    "api_cities": ("/api/v1/cities/", False),
+    "api_city": ("/api/v1/cities/{city}/", False),
+    "api_forecasts": ("/api/v1/forecasts/?city={city}&from={date_from}&to={date_to}", False),
+    "api_nearby": ("/api/v1/cities/nearby/?lat={lat}&lon={lon}&radius_km=300", False),
+    "api_favorites": ("/api/v1/favorites/", True),
+}
+
+
+def parse_size(value):
+    try:
+        cities, days, users = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается ГОРОДАxДНЕЙxПОЛЬЗОВАТЕЛЕЙ: {value}")
+    return cities, days, users
+
+
+def generate(cities, days, users, favorites, seed=0):
+    """
+    Заполняет базу: cities городов с прогнозами на days дней, users
+    пользователей с профилями и favorites избранными городами у каждого.
+    Возвращает список (pk, широта, долгота) городов и pk пользователей.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from weather_app.models import City, Favorite, Profile, WeatherForecast
+
+    rng = random.Random(seed)
+    with transaction.atomic():
+        City.objects.bulk_create(
+            City(
+                name=f"City {i}",
+                country=rng.choice(COUNTRIES),
+                latitude=rng.uniform(-60, 70),
+                longitude=rng.uniform(-180, 180),
+            )
+            for i in range(cities)
+        )
+        city_rows = list(City.objects.values_list("pk", "latitude", "longitude"))
+        batch = []
+        for pk, _, _ in city_rows:
+            for day in range(days):
+                low = rng.uniform(-20, 25)
+                batch.append(WeatherForecast(
+                    city_id_id=pk,
+                    forecast_date=START + timedelta(days=day),
+                    temperature_min=round(low, 1),
+                    temperature_max=round(low + rng.uniform(2, 12), 1),
+                    condition=rng.choice(CONDITIONS),
+                    humidity=rng.randint(20, 100),
+                ))
+                if len(batch) >= 5000:
+                    WeatherForecast.objects.bulk_create(batch)
+                    batch.clear()
+        WeatherForecast.objects.bulk_create(batch)
+        City.objects.refresh_forecast_counts()
+
+        # один хэш на всех: хэширование пароля дороже всей генерации
+        password = make_password("benchmark")
+        User.objects.bulk_create(
+            User(username=f"user{i}", email=f"user{i}@example.com", password=password)
+            for i in range(users)
+        )
+        user_ids = list(User.objects.values_list("pk", flat=True))
+        # bulk_create не отправляет post_save, профили создаем сами
+        Profile.objects.bulk_create(Profile(user_id=pk) for pk in user_ids)
+        city_ids = [pk for pk, _, _ in city_rows]
+        Favorite.objects.bulk_create(
+            Favorite(user_id_id=user, city_id_id=city)
+            for user in user_ids
+            for city in rng.sample(city_ids, min(favorites, len(city_ids)))
+        )
+    return city_rows, user_ids
+
+
+def make_request(client, template, rng, city_rows, days):
+    pk, lat, lon = rng.choice(city_rows)
+    date_from = START + timedelta(days=rng.randrange(max(1, days - 30)))
+    url = template.format(
+        city=pk, lat=round(lat, 3), lon=round(lon, 3),
+        date_from=date_from.date(), date_to=(date_from + timedelta(days=30)).date(),
+    )
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url}: HTTP {response.status_code}")
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def bench_endpoint(client, template, city_rows, days, repeat, seed):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    rng = random.Random(seed)
+    timings = measure(lambda: make_request(client, template, rng, city_rows, days), repeat)
+
+    with CaptureQueriesContext(connection) as queries:
+        make_request(client, template, rng, city_rows, days)
+    # список запросов читается из лога соединения, который очистит следующий запрос
+    query_count = len(queries)
+
+    tracemalloc.start()
+    try:
+        make_request(client, template, rng, city_rows, days)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        **summarize(timings),
+        "queries": query_count,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_size(size, args):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    cities, days, users = size
+    call_command("flush", interactive=False, verbosity=0)
+    started = time.perf_counter()
+    city_rows, user_ids = generate(cities, days, users, args.favorites, args.seed)
+    generated = time.perf_counter() - started
+
+    anonymous = Client()
+    member = Client()
+    member.force_login(User.objects.get(pk=user_ids[0]))
+
+    results = {}
+    for name, (template, login) in ENDPOINTS.items():
+        if args.only and name not in args.only:
+            continue
+        client = member if login else anonymous
+        results[name] = bench_endpoint(client, template, city_rows, days, args.repeat, args.seed)
+        row = results[name]
+        print(f"{name:>18} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['queries']:>8} {row['peak_kb']:>9.0f}")
+    return {
+        "cities": cities,
+        "days": days,
+        "users": users,
+        "forecasts": cities * days,
+        "generate_s": round(generated, 2),
+        "endpoints": results,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Печатает отношение p50 и разницу запросов к прошлому запуску."""
+    report = json.loads(Path(baseline_path).read_text())
+    baseline = {(run["cities"], run["days"], run["users"]): run for run in report["runs"]}
+    print(f"\nсравнение с {baseline_path} (revision {report['revision']})")
+    print(f"{'размер':>18} {'эндпоинт':>18} {'p50 x':>7} {'запросы':>9}")
+    for run in current:
+        old = baseline.get((run["cities"], run["days"], run["users"]))
+        if old is None:
+            continue
+        label = f"{run['cities']}x{run['days']}x{run['users']}"
+        for name, row in run["endpoints"].items():
+            before = old["endpoints"].get(name)
+            if before is None:
+                continue
+            ratio = row["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 0
+            delta = row["queries"] - before["queries"]
+            print(f"{label:>18} {name:>18} {ratio:>7.2f} {delta:>+9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=parse_size, nargs="+",
+                        default=[(100, 30, 50), (1000, 365, 500)],
+                        help="размеры ГОРОДАxДНЕЙxПОЛЬЗОВАТЕЛЕЙ")
+    parser.add_argument("--favorites", type=int, default=5, help="избранных городов у пользователя")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=sorted(ENDPOINTS), help="только эти эндпоинты")
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.conf import settings
+
+    # сравниваем сами view, а не кэш ответов
+    settings.RESPONSE_CACHE_TIMEOUT = 0
+    settings.IMAGE_WORKERS = 0
+
+    runs = []
+    for size in args.sizes:
+        print(f"\nгородов {size[0]}, дней {size[1]}, пользователей {size[2]}")
+        print(f"{'эндпоинт':>18} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'запросов':>8} {'пик КБ':>9}")
+        runs.append(run_size(size, args))
+
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": args.repeat,
+        "favorites": args.favorites,
+        "seed": args.seed,
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else (
+        BASE_DIR / "benchmarks" / "results"
+        / f"load-{datetime.now():%Y%m%d-%H%M%S}-{report['revision'] or 'local'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nрезультаты: {output}")
+
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == "__main__":
+    main()
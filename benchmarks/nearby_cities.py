@@ -0,0 +1,56 @@
+"""
+Поиск ближайших городов по индексу в памяти.
+
+    python -m benchmarks.nearby_cities --cities 100000
+"""
+import argparse
+
+import numpy as np
+
+from .common import measure, summarize
+
+
+def random_cities(n, seed=0):
+    """Города сгущаются вокруг нескольких сотен "агломераций", как в реальности."""
+    rng = np.random.default_rng(seed)
+    centers_lat = rng.uniform(-60, 70, size=500)
+    centers_lon = rng.uniform(-180, 180, size=500)
+    which = rng.integers(0, 500, size=n)
+    lats = np.clip(centers_lat[which] + rng.normal(0, 3, size=n), -90, 90)
+    lons = (centers_lon[which] + rng.normal(0, 3, size=n) + 180) % 360 - 180
+    return np.arange(1, n + 1), lats, lons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    from weather_app.spatial import CityGridIndex
+
+    ids, lats, lons = random_cities(args.cities)
+    index = CityGridIndex(ids, lats, lons)
+    rng = np.random.default_rng(1)
+
+    print(f"городов: {len(index)}")
+    for label, kwargs in [
+        ("k=10", {"k": 10}),
+        ("k=10, radius_km=50", {"k": 10, "radius_km": 50}),
+        ("k=50, radius_km=300", {"k": 50, "radius_km": 300}),
+    ]:
+        points = iter(zip(
+            rng.uniform(-60, 70, size=args.queries + 1),
+            rng.uniform(-180, 180, size=args.queries + 1),
+        ))
+
+        def lookup():
+            lat, lon = next(points)
+            index.query(lat, lon, **kwargs)
+
+        stats = summarize(measure(lookup, repeat=args.queries))
+        print(f"{label:<22} p50 {stats['p50_ms']} мс  p99 {stats['p99_ms']} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Нагрузочное сравнение профилей gunicorn: sync, gthread и asgi (uvicorn).
+
+Каждый профиль запускается отдельным процессом gunicorn на одной и той же
+временной базе. Клиенты в потоках с keep-alive сессиями обращаются к
+страницам и API (для asgi - к асинхронным версиям тех же эндпоинтов).
+Кэш ответов выключен, чтобы сравнивались сами view, а не кэш.
+
+    python -m benchmarks.server_profiles --cities 200 --days 365 --duration 10
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import requests
+
+from .common import BASE_DIR, percentile, setup_django
+
+PATHS = {
+    "sync": [
+        "/api/v1/forecasts/?city={city}&from={date_from}&to={date_to}",
+        "/api/v1/cities/{city}/",
+        "/cities/{city}/?from={date_from}&to={date_to}",
+    ],
+    "asgi": [
+        "/api/v1/async/forecasts/?city={city}&from={date_from}&to={date_to}",
+        "/api/v1/async/cities/{city}/",
+        "/async/cities/{city}/?from={date_from}&to={date_to}",
+    ],
+}
+PATHS["gthread"] = PATHS["sync"]
+APPLICATIONS = {
+    "sync": "meteoservice.wsgi:application",
+    "gthread": "meteoservice.wsgi:application",
+    "asgi": "meteoservice.asgi:application",
+}
+
+
+def populate(cities, days):
+    from django.db import transaction
+
+    from weather_app.models import City, WeatherForecast
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=0, longitude=0)
+        for i in range(cities)
+    )
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    with transaction.atomic():
+        for city in City.objects.order_by("pk"):
+            WeatherForecast.objects.bulk_create(
+                WeatherForecast(
+                    city_id=city,
+                    forecast_date=start + timedelta(days=day),
+                    temperature_min=-5 + day % 10,
+                    temperature_max=5 + day % 10,
+                    condition="Sunny",
+                    humidity=50,
+                )
+                for day in range(days)
+            )
+    City.objects.refresh_forecast_counts()
+    return list(City.objects.values_list("pk", flat=True)), start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(profile, db_path, workers, threads):
+    port = free_port()
+    env = dict(
+        os.environ,
+        GUNICORN_PROFILE=profile,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_ACCESSLOG="",
+        SQLITE_PATH=db_path,
+        DEBUG="False",
+        ALLOWED_HOSTS="127.0.0.1",
+        RESPONSE_CACHE_TIMEOUT="0",
+    )
+    env.setdefault("SECRET_KEY", "benchmark")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", APPLICATIONS[profile], "-c", "gunicorn.conf.py"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{base_url}/api/v1/", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({profile}) не запустился")
+
+
+def run_load(base_url, paths, city_ids, start, concurrency, duration):
+    """Возвращает (число запросов, ошибки, задержки в мс)."""
+    stop_at = time.monotonic() + duration
+    lock = threading.Lock()
+    timings, errors = [], [0]
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        local, failed = [], 0
+        while time.monotonic() < stop_at:
+            date_from = start + timedelta(days=rng.randrange(300))
+            url = base_url + rng.choice(paths).format(
+                city=rng.choice(city_ids),
+                date_from=date_from.date().isoformat(),
+                date_to=(date_from + timedelta(days=30)).date().isoformat(),
+            )
+            started = time.perf_counter()
+            response = session.get(url)
+            local.append((time.perf_counter() - started) * 1000)
+            failed += response.status_code != 200
+        with lock:
+            timings.extend(local)
+            errors[0] += failed
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return len(timings), errors[0], timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", nargs="+", default=["sync", "gthread", "asgi"],
+                        choices=sorted(APPLICATIONS))
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    city_ids, start = populate(args.cities, args.days)
+    print(f"городов: {len(city_ids)}, прогнозов: {len(city_ids) * args.days}, "
+          f"воркеров: {args.workers}, клиентов: {args.concurrency}")
+    print(f"{'профиль':>8} {'запросов':>9} {'ошибок':>7} {'rps':>8} "
+          f"{'p50 мс':>8} {'p99 мс':>8}")
+
+    for profile in args.profiles:
+        process, base_url = start_server(profile, db_path, args.workers, args.threads)
+        try:
+            # прогрев: импорты, соединения с базой в каждом воркере
+            run_load(base_url, PATHS[profile], city_ids, start, args.concurrency, 1)
+            total, errors, timings = run_load(
+                base_url, PATHS[profile], city_ids, start, args.concurrency, args.duration
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{profile:>8} {total:>9} {errors:>7} {total / args.duration:>8.1f} "
+              f"{percentile(timings, 50):>8.2f} {percentile(timings, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Параллельные чтения и записи в SQLite из нескольких процессов (как воркеры
+gunicorn): профиль development (настройки по умолчанию) против production
+(WAL, прагмы, BEGIN IMMEDIATE, постоянные соединения).
+
+Каждая операция - "запрос": выборка прогнозов города за месяц или
+транзакция чтение + обновление прогноза, после нее соединение
+закрывается или переиспользуется по CONN_MAX_AGE, как в конце запроса.
+
+    python -m benchmarks.sqlite_concurrency --processes 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .common import BASE_DIR, percentile, setup_django
+
+START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def populate(cities, days):
+    from django.db import transaction
+
+    from weather_app.models import City, WeatherForecast
+
+    City.objects.bulk_create(
+        City(name=f"City {i}", country="Bench", latitude=0, longitude=0)
+        for i in range(cities)
+    )
+    with transaction.atomic():
+        for city in City.objects.order_by("pk"):
+            WeatherForecast.objects.bulk_create(
+                WeatherForecast(
+                    city_id=city,
+                    forecast_date=START + timedelta(days=day),
+                    temperature_min=0, temperature_max=5, condition="Sunny", humidity=50,
+                )
+                for day in range(days)
+            )
+    return list(City.objects.values_list("pk", flat=True))
+
+
+def worker(db_path, profile, city_ids, days, duration, write_ratio, seed, results):
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.update(
+        DJANGO_SETTINGS_MODULE="meteoservice.settings",
+        SQLITE_PATH=db_path,
+        DB_PROFILE=profile,
+        DEBUG="False",
+    )
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    import django
+
+    django.setup()
+    from django.db import OperationalError, close_old_connections, transaction
+
+    from weather_app.models import WeatherForecast
+
+    rng = random.Random(seed)
+    done = locked = 0
+    timings = []
+    stop_at = time.monotonic() + duration
+    while time.monotonic() < stop_at:
+        city = rng.choice(city_ids)
+        day = START + timedelta(days=rng.randrange(days - 30))
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    forecast = WeatherForecast.objects.filter(city_id=city, forecast_date=day).first()
+                    forecast.temperature_max = rng.uniform(0, 30)
+                    forecast.save(update_fields=["temperature_max"])
+            else:
+                list(WeatherForecast.objects.filter(
+                    city_id=city, forecast_date__gte=day, forecast_date__lt=day + timedelta(days=30)
+                ))
+            done += 1
+            timings.append((time.perf_counter() - started) * 1000)
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+        finally:
+            close_old_connections()  # конец "запроса"
+    results.put((done, locked, timings))
+
+
+def run(profile, db_path, city_ids, args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            db_path, profile, city_ids, args.days, args.duration, args.write_ratio, seed, results,
+        ))
+        for seed in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    done = locked = 0
+    timings = []
+    for _ in processes:
+        done_n, locked_n, chunk = results.get()
+        done, locked = done + done_n, locked + locked_n
+        timings.extend(chunk)
+    for process in processes:
+        process.join()
+    return done, locked, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    city_ids = populate(args.cities, args.days)
+    from django.db import connections
+
+    connections.close_all()
+
+    print(f"процессов: {args.processes}, доля записей: {args.write_ratio}")
+    print(f"{'профиль':>12} {'операций':>9} {'ops/с':>8} {'locked':>7} {'% ошибок':>9} "
+          f"{'p50 мс':>8} {'p99 мс':>8}")
+    for profile in ("development", "production"):
+        # отдельная копия: WAL сохраняется в файле базы
+        copy = f"{db_path}.{profile}"
+        shutil.copyfile(db_path, copy)
+        done, locked, timings = run(profile, copy, city_ids, args)
+        rate = 100 * locked / (done + locked) if done + locked else 0
+        print(f"{profile:>12} {done:>9} {done / args.duration:>8.0f} {locked:>7} {rate:>9.2f} "
+              f"{percentile(timings, 50):>8.2f} {percentile(timings, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
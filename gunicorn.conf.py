@@ -1,10 +1,32 @@
 # gunicorn.conf.py
+#
+# Профили воркеров (переменная окружения GUNICORN_PROFILE):
+#   sync    - по умолчанию, один запрос на процесс
+#   gthread - пул потоков в каждом процессе (GUNICORN_THREADS)
+#   asgi    - uvicorn воркер, запускать с meteoservice.asgi:application:
+#             GUNICORN_PROFILE=asgi gunicorn meteoservice.asgi:application -c gunicorn.conf.py
 import multiprocessing
+import os
+
+profile = os.getenv("GUNICORN_PROFILE", "sync")
 
 # Базовые настройки
-bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+if profile == "sync":
+    worker_class = "sync"
+elif profile == "gthread":
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+elif profile == "asgi":
+    # один процесс держит много соединений в event loop,
+    # поэтому процессов нужно меньше, чем для sync
+    worker_class = "uvicorn_worker.UvicornWorker"
+    workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+else:
+    raise RuntimeError(f"Неизвестный GUNICORN_PROFILE: {profile}")
+
 worker_connections = 1000
 
 # Таймауты
@@ -20,9 +42,28 @@ max_requests_jitter = 100
 preload_app = True
 
 # Логирование
-accesslog = "-"  # в stdout
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None  # в stdout, пустое значение - выключен
 errorlog = "-"   # в stdout
 loglevel = "info"
 
 # Имя процесса
-proc_name = "meteoservice"
\ No newline at end of file
+proc_name = "meteoservice"
+
+# Метрики /metrics: воркеры пишут файлы в METRICS_DIR (weather_app/metrics.py),
+# мастер очищает каталог при старте и переносит файлы завершившихся воркеров
+# в общий архив, чтобы счетчики не сбрасывались при перезапуске воркеров
+metrics_dir = os.getenv("METRICS_DIR")
+
+
+def on_starting(server):
+    if metrics_dir:
+        from weather_app import metrics
+
+        metrics.reset_directory(metrics_dir)
+
+
+def child_exit(server, worker):
+    if metrics_dir:
+        from weather_app import metrics
+
+        metrics.archive(metrics_dir, worker.pid)
@@ -26,7 +26,7 @@ load_dotenv(BASE_DIR / '.env')
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True').lower() in ('1', 'true', 'yes')
 INTERNAL_IPS = ['127.0.0.1']
 
 ALLOWED_HOSTS = []
@@ -62,7 +62,9 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'weather_app.timing.PerformanceMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'weather_app.replica.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -78,7 +80,9 @@ ROOT_URLCONF = 'meteoservice.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга (weather_app/timing.py)
+        'BACKEND': 'weather_app.timing.TimedTemplates',
+        'NAME': 'django',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,10 +104,113 @@ WSGI_APPLICATION = 'meteoservice.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Профиль SQLite для нескольких воркеров gunicorn (DB_PROFILE=production,
+# по умолчанию при DEBUG=False):
+# - WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в
+#   режиме WAL не теряет целостность, только последние транзакции при сбое ОС
+# - mmap_size / cache_size: чтение страниц без системных вызовов, 64 МБ кэша
+# - timeout (busy_timeout): ждать освобождения блокировки вместо
+#   немедленной ошибки "database is locked"
+# - BEGIN IMMEDIATE: транзакция берет блокировку записи сразу, без
+#   взаимоблокировки при повышении блокировки чтения до записи
+# - постоянные соединения с проверкой перед повторным использованием
+SQLITE_PRODUCTION_PROFILE = {
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'
+            'PRAGMA cache_size=-65536;'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 10,
+    },
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+}
+DB_PROFILE = os.getenv('DB_PROFILE', 'development' if DEBUG else 'production')
+if DB_PROFILE == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION_PROFILE)
+
+# Реплика для чтения списков и API (weather_app/replica.py). Локально это
+# копия основной базы, которую обновляет manage.py sync_replica; без
+# REPLICA_SQLITE_PATH все запросы идут в основную базу.
+REPLICA_READS = bool(os.getenv('REPLICA_SQLITE_PATH'))
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.getenv('REPLICA_SQLITE_PATH', DATABASES['default']['NAME']),
+    # timeout и transaction_mode - как у основной базы (профиль production)
+    'OPTIONS': {
+        **DATABASES['default'].get('OPTIONS', {}),
+        'init_command': (
+            DATABASES['default'].get('OPTIONS', {}).get('init_command', '')
+            + 'PRAGMA query_only=ON;'
+        ),
+    },
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['weather_app.replica.PrimaryReplicaRouter']
+# сколько секунд после записи пользователь читает из основной базы
+# (должно быть больше интервала sync_replica)
+REPLICA_PIN_SECONDS = 15
+
+
+# Cache
+# По умолчанию локальная память процесса. Чтобы кэш ответов и его версия
+# были общими для всех воркеров gunicorn, укажите каталог файлового кэша,
+# например CACHE_DIR=/dev/shm/meteoservice-cache (файлы в памяти).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'meteoservice',
+    }
+}
+if os.getenv('CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR'),
+    }
+
+# Ограничение срока жизни кэша ответов (секунды); актуальность данных
+# обеспечивает версия, которую сбрасывают сигналы и массовые загрузки
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 600))
+
+
+# Замеры времени запросов (weather_app/timing.py): доля запросов 0..1, для
+# которых добавляется заголовок Server-Timing и строка в лог weather_app.perf
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0 if DEBUG else 0.01))
+
+# Метрики Prometheus (/metrics, weather_app/metrics.py). Под gunicorn с
+# несколькими воркерами задайте общий каталог, например
+# METRICS_DIR=/dev/shm/meteoservice-metrics: каждый воркер раз в
+# METRICS_FLUSH_INTERVAL секунд пишет туда свой файл, /metrics их суммирует.
+# По умолчанию включены только с DEBUG. Доступ - сотрудникам (is_staff) и
+# сборщику с заголовком Authorization: Bearer <METRICS_TOKEN>.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 1.0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'perf': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'weather_app.perf': {'handlers': ['perf'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -157,5 +264,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@meteoservice.com'  # email отправителя
 SUPPORT_EMAIL = 'support@meteoservice.com'       # email для уведомлений о заявках
+EMAIL_TIMEOUT = 10                               # секунд на операцию SMTP
+
+# Очередь писем (manage.py deliver_outbox): число попыток и базовая
+# задержка повтора в секундах, удваивается после каждой ошибки
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+
+# Провайдер прогнозов (manage.py fetch_forecasts, локально - manage.py stub_provider):
+# адрес, запросов в секунду на хост, таймаут запроса, дней прогноза, потоков
+FORECAST_PROVIDER_URL = os.getenv('FORECAST_PROVIDER_URL', 'http://127.0.0.1:8081/forecast')
+FORECAST_PROVIDER_RATE = float(os.getenv('FORECAST_PROVIDER_RATE', 20))
+FORECAST_PROVIDER_TIMEOUT = float(os.getenv('FORECAST_PROVIDER_TIMEOUT', 5))
+FORECAST_FETCH_DAYS = 7
+FORECAST_FETCH_WORKERS = 8
+
+# Обновление устаревших прогнозов (manage.py refresh_forecasts --loop):
+# прогноз устаревает через FORECAST_STALE_AFTER секунд, за цикл обновляется
+# не больше FORECAST_REFRESH_BUDGET городов; просмотры страниц города
+# затухают вдвое за CITY_HITS_HALF_LIFE секунд и пишутся в базу раз в
+# CITY_HITS_FLUSH_INTERVAL секунд
+FORECAST_STALE_AFTER = int(os.getenv('FORECAST_STALE_AFTER', 3 * 3600))
+FORECAST_REFRESH_BUDGET = int(os.getenv('FORECAST_REFRESH_BUDGET', 100))
+FORECAST_REFRESH_INTERVAL = 60
+CITY_HITS_HALF_LIFE = 6 * 3600
+CITY_HITS_FLUSH_INTERVAL = 10
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Время жизни индекса ближайших городов в воркере (секунды). В своем процессе
+# индекс сбрасывается сигналами City сразу, в остальных - не позже TTL.
+CITY_INDEX_TTL = 300
+
+# Процессов в пуле создания уменьшенных копий изображений в каждом воркере;
+# 0 - создавать копии сразу в запросе (тесты, разработка)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
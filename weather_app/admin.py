@@ -1,8 +1,9 @@
 from django.contrib import admin, messages
-from .models import City, Favorite, WeatherForecast, SupportRequest
+from .models import City, Favorite, WeatherForecast, SupportRequest, OutgoingEmail, ForecastFetchState
 from .resources import CityResource, WeatherForecastResource
 from import_export.admin import ImportExportModelAdmin
 import random
+from django.utils import timezone
 import string
 
 
@@ -65,3 +66,28 @@ class SupportRequestAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at']
     search_fields = ['subject', 'name', 'email', 'message']
     readonly_fields = ['created_at', 'updated_at']
+
+@admin.action(description="Отправить повторно")
+def retry_emails(modeladmin, request, queryset):
+    updated = queryset.exclude(status=OutgoingEmail.STATUS_SENT).update(
+        status=OutgoingEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+    )
+    modeladmin.message_user(request, f"Поставлено в очередь писем: {updated}.", messages.SUCCESS)
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'last_error']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    actions = [retry_emails]
+
+
+@admin.register(ForecastFetchState)
+class ForecastFetchStateAdmin(admin.ModelAdmin):
+    list_display = ['city', 'last_status', 'failures', 'refreshed_at', 'recent_hits']
+    list_filter = ['last_status']
+    search_fields = ['city__name', 'last_error']
+    list_select_related = ['city']
+    readonly_fields = ['etag', 'last_modified', 'fetched_at', 'last_status', 'last_error', 'failures',
+                       'refreshed_at', 'recent_hits', 'hits_at']
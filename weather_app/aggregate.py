@@ -0,0 +1,109 @@
+"""
+Статистика прогнозов по дням, неделям и месяцам
+(/api/v1/forecasts/aggregate/?city=|country=&bucket=&from=&to=).
+
+Столбцы выборки читаются одним запросом прямо из курсора в массивы NumPy
+(np.fromiter, без моделей и промежуточных кортежей в памяти), дата - как
+julianday SQLite, без разбора строк дат в Python. Строки сортируются по
+корзине, а min/max/сумма по корзинам считаются векторно через reduceat.
+Границы корзин - по UTC (TIME_ZONE = 'UTC'), неделя начинается в понедельник.
+"""
+import numpy as np
+from django.db import connections
+from django.db.models import F, FloatField, Func
+
+BUCKETS = ("day", "week", "month")
+# юлианский день начала эпохи Unix
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+MS_PER_DAY = 86_400_000
+
+COLUMNS_DTYPE = np.dtype([
+    ("julian_day", np.float64),
+    ("temperature_min", np.float64),
+    ("temperature_max", np.float64),
+    ("humidity", np.float64),
+])
+
+
+class JulianDay(Func):
+    function = "julianday"
+    output_field = FloatField()
+
+
+def load_columns(queryset, dtype=COLUMNS_DTYPE):
+    """
+    Столбцы выборки прогнозов одним запросом: структурированный массив dtype
+    (первое поле - julian_day, остальные - поля модели). Порядок строк любой.
+    """
+    rows = queryset.order_by().annotate(julian_day=JulianDay(F("forecast_date"))).values_list(
+        "julian_day", *dtype.names[1:]
+    )
+    sql, params = rows.query.get_compiler(rows.db).as_sql()
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return np.fromiter(cursor, dtype=dtype)
+
+
+def bucket_starts(julian_days, bucket):
+    """Начало корзины каждой строки (datetime64[D])."""
+    # через целые миллисекунды: julianday полуночи может оказаться чуть меньше целого
+    milliseconds = np.rint((julian_days - UNIX_EPOCH_JULIAN_DAY) * MS_PER_DAY).astype(np.int64)
+    days = milliseconds // MS_PER_DAY
+    if bucket == "week":
+        # 1970-01-01 - четверг: сдвиг к понедельнику
+        days -= (days + 3) % 7
+    starts = days.astype("datetime64[D]")
+    if bucket == "month":
+        starts = starts.astype("datetime64[M]").astype("datetime64[D]")
+    return starts
+
+
+def aggregate(columns, bucket):
+    """
+    Статистика по корзинам: словарь массивов одинаковой длины (по корзине
+    на элемент), корзины по возрастанию.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Неизвестная корзина: {bucket!r}")
+    starts = bucket_starts(columns["julian_day"], bucket)
+    if len(starts) > 1 and not (starts[1:] >= starts[:-1]).all():
+        order = np.argsort(starts, kind="stable")
+        starts = starts[order]
+        columns = columns[order]
+    if not len(starts):
+        bounds = np.empty(0, dtype=np.int64)
+    else:
+        bounds = np.concatenate(([0], np.flatnonzero(starts[1:] != starts[:-1]) + 1))
+    counts = np.diff(np.append(bounds, len(starts)))
+
+    def reduce(ufunc, values):
+        return ufunc.reduceat(values, bounds) if len(bounds) else values[:0]
+
+    low = columns["temperature_min"]
+    high = columns["temperature_max"]
+    humidity = columns["humidity"]
+    return {
+        "start": starts[bounds],
+        "count": counts,
+        "temperature_min": reduce(np.minimum, low),
+        "temperature_max": reduce(np.maximum, high),
+        # средняя температура дня - середина между минимумом и максимумом
+        "temperature_mean": reduce(np.add, low + high) / (2 * counts),
+        "humidity_min": reduce(np.minimum, humidity).astype(np.int64),
+        "humidity_max": reduce(np.maximum, humidity).astype(np.int64),
+        "humidity_mean": reduce(np.add, humidity) / counts,
+    }
+
+
+def forecast_aggregates(queryset, bucket):
+    """Статистика выборки прогнозов по корзинам в виде списка словарей для API."""
+    stats = aggregate(load_columns(queryset), bucket)
+    names = [name for name in stats if name not in ("start", "count")]
+    # округление и tolist векторно, в цикле только сборка словарей
+    values = [np.round(stats[name], 2).tolist() for name in names]
+    return [
+        {"start": start, "count": count, **dict(zip(names, row))}
+        for start, count, *row in zip(
+            np.datetime_as_string(stats["start"]).tolist(), stats["count"].tolist(), *values
+        )
+    ]
@@ -1,7 +1,8 @@
 # weather_app/api_urls.py
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .api_views import UserViewSet, CityViewSet, WeatherForecastViewSet, FavoriteViewSet
+from . import async_views
+from .api_views import UserViewSet, CityViewSet, WeatherForecastViewSet, FavoriteViewSet, export_forecasts
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -10,5 +11,12 @@ router.register(r'forecasts', WeatherForecastViewSet, basename='weatherforecast'
 router.register(r'favorites', FavoriteViewSet, basename='favorite')  # ← basename обязательно!
 
 urlpatterns = [
+    # асинхронные read-only эндпоинты для ASGI
+    path('async/cities/', async_views.api_city_list, name='async-city-list'),
+    path('async/cities/<int:pk>/', async_views.api_city_detail, name='async-city-detail'),
+    path('async/forecasts/', async_views.api_forecast_list, name='async-forecast-list'),
+    path('async/forecasts/<int:pk>/', async_views.api_forecast_detail, name='async-forecast-detail'),
+    # потоковая выгрузка прогнозов
+    re_path(r'^forecasts/export\.(?P<fmt>csv|ndjson)$', export_forecasts, name='forecast-export'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
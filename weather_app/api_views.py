@@ -1,29 +1,193 @@
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action, api_view
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
 from .models import City, Favorite, WeatherForecast
 from .serializers import UserSerializer, CitySerializer, WeatherForecastSerializer, FavoriteSerializer
+from .serializers import NearbyCitySerializer, NearbyQuerySerializer, AggregateQuerySerializer, requested_fields
+from .spatial import get_city_index
+from .pagination import KeysetPagination
+from .filters import filter_forecast_dates
+from .conditional import city_conditional, forecast_conditional, forecasts_conditional
+from .cache import cached_response
+from . import export
+from . import downsample
+from .replica import replica_reads, ReplicaReadsMixin
+from .columnar import ColumnarJSONRenderer, forecast_series
+from .aggregate import forecast_aggregates
+
+def filter_forecasts(queryset, params):
+    """Фильтры списка прогнозов ?city=&from=&to=, ошибки - ValidationError (400)"""
+    city = params.get('city', '')
+    if city:
+        if not city.isdigit():
+            raise ValidationError({'city': 'Ожидается id города'})
+        queryset = queryset.filter(city_id=city)
+    try:
+        return filter_forecast_dates(queryset, params)
+    except ValueError as e:
+        raise ValidationError({'detail': str(e)})
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class CityViewSet(viewsets.ModelViewSet):
+@method_decorator(city_conditional, name='retrieve')
+@method_decorator(cached_response('api-cities'), name='list')
+@method_decorator(cached_response('api-city'), name='retrieve')
+@method_decorator(cached_response('api-cities-nearby'), name='nearby')
+class CityViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     queryset = City.objects.all()
     serializer_class = CitySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        return self.with_users(super().get_queryset())
+
+    def with_users(self, queryset):
+        # users сериализуются списком id - одна выборка на страницу, только id
+        fields = requested_fields(self.request)
+        if fields is None or 'users' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('users', queryset=User.objects.only('id'))
+            )
+        return queryset
 
-class WeatherForecastViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Ближайшие к точке города: ?lat=&lon=&k=&radius_km="""
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        found = get_city_index().query(
+            params.validated_data['lat'],
+            params.validated_data['lon'],
+            k=params.validated_data['k'],
+            radius_km=params.validated_data.get('radius_km'),
+        )
+        cities = self.with_users(City.objects.all()).in_bulk([pk for pk, _ in found])
+        results = []
+        for pk, distance in found:
+            city = cities.get(pk)
+            if city is None:  # город удален в другом процессе, индекс еще не обновлен
+                continue
+            city.distance_km = round(distance, 3)
+            results.append(city)
+        serializer = NearbyCitySerializer(results, many=True, context={'request': request})
+        return Response(serializer.data)
+
+@method_decorator(forecasts_conditional, name='list')
+@method_decorator(forecasts_conditional, name='aggregate')
+@method_decorator(forecast_conditional, name='retrieve')
+@method_decorator(cached_response('api-forecasts'), name='list')
+@method_decorator(cached_response('api-forecasts-aggregate'), name='aggregate')
+@method_decorator(cached_response('api-forecast'), name='retrieve')
+class WeatherForecastViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     queryset = WeatherForecast.objects.all()
     serializer_class = WeatherForecastSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('forecast_date', 'id')
+
+    def get_queryset(self):
+        queryset = self.with_city(super().get_queryset())
+        if self.action != 'list':
+            return queryset
+        return filter_forecasts(queryset, self.request.query_params)
+
+    def with_city(self, queryset):
+        fields = requested_fields(self.request)
+        if fields is None or fields & {'city_name', 'city_country'}:
+            queryset = queryset.select_related('city_id')
+        return queryset
+
+    def get_renderers(self):
+        # ?format=columnar - только для списка (серии прогнозов города)
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            renderers.append(ColumnarJSONRenderer())
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        columnar = request.accepted_renderer.format == ColumnarJSONRenderer.format
+        if 'max_points' in request.query_params:
+            return self.downsampled(request, columnar)
+        if columnar:
+            queryset = filter_forecasts(WeatherForecast.objects.all(), request.query_params)
+            return Response(forecast_series(queryset, request))
+        return super().list(request, *args, **kwargs)
+
+    def downsampled(self, request, columnar):
+        """Серия города, прореженная до ?max_points= точек (LTTB), одной страницей"""
+        queryset = filter_forecasts(WeatherForecast.objects.all(), request.query_params)
+        # строки выбираются только по id: с фильтрами города SQLite
+        # просматривает всю историю города вместо поиска по первичному ключу
+        rows = WeatherForecast.objects.filter(pk__in=downsample.series_ids(queryset, request.query_params))
+        if columnar:
+            return Response(forecast_series(rows, request, paginate=False))
+        serializer = self.get_serializer(self.with_city(rows).order_by(*self.keyset_ordering), many=True)
+        return Response({'next': None, 'previous': None, 'results': serializer.data})
+
+    @action(detail=False, methods=['get'])
+    def aggregate(self, request):
+        """Статистика прогнозов города или страны по корзинам: ?city=|country=&bucket=day|week|month&from=&to="""
+        params = AggregateQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = filter_forecasts(WeatherForecast.objects.all(), request.query_params)
+        scope = {}
+        if 'city' in params.validated_data:
+            city = get_object_or_404(
+                City.objects.values('id', 'name', 'country'), pk=params.validated_data['city']
+            )
+            scope['city'] = city
+        else:
+            scope['country'] = params.validated_data['country']
+            queryset = queryset.filter(city_id__country=scope['country'])
+        bucket = params.validated_data['bucket']
+        return Response({**scope, 'bucket': bucket, 'buckets': forecast_aggregates(queryset, bucket)})
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Favorite.objects.filter(user_id=self.request.user)
+        return (
+            Favorite.objects.filter(user_id=self.request.user)
+            .select_related('city_id', 'user_id')
+            .order_by('-added_at', 'id')
+        )
     
     def perform_create(self, serializer):
-        serializer.save(user_id=self.request.user)
\ No newline at end of file
+        serializer.save(user_id=self.request.user)
+
+@replica_reads
+@api_view(['GET'])
+def export_forecasts(request, fmt):
+    """
+    Выгрузка прогнозов /forecasts/export.csv|ndjson с фильтрами ?city=&from=&to=.
+    Ответ формируется по мере чтения из базы; при Accept-Encoding: gzip
+    сжимается на лету.
+    """
+    queryset = filter_forecasts(
+        WeatherForecast.objects.all(), request.query_params
+    )
+    # поток читается после выхода из view - фиксируем базу сейчас
+    queryset = queryset.using(queryset.db)
+    gzip = export.accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = StreamingHttpResponse(
+        export.stream(queryset, fmt, gzip=gzip),
+        content_type=export.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="forecasts.{fmt}"'
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -6,4 +6,5 @@ class WeatherAppConfig(AppConfig):
     name = 'weather_app'
     
     def ready(self):
-        import weather_app.signals
\ No newline at end of file
+        import weather_app.signals
+        import weather_app.timing  # noqa: F401 - обработчик connection_created
\ No newline at end of file
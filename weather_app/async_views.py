@@ -0,0 +1,170 @@
+"""
+Асинхронные версии горячих read-эндпоинтов для запуска под ASGI
+(gunicorn -c gunicorn.conf.py с GUNICORN_PROFILE=asgi).
+
+Запросы к базе идут через асинхронный ORM, поэтому воркер не держит поток
+на время ожидания ответа. Синхронные декораторы условного GET и кэша
+ответов здесь не используются: они обращаются к базе синхронно.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import Prefetch, aprefetch_related_objects
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .api_views import filter_forecasts
+from .filters import filter_forecast_dates
+from .models import City, Favorite, WeatherForecast
+from .pagination import akeyset_paginate
+from .refresh import record_hit
+from .serializers import CitySerializer, WeatherForecastSerializer, requested_fields
+from .views import (
+    FORECAST_LIST_ORDERING, FORECAST_LIST_PAGE_SIZE, favorited_by_query,
+    filter_forecast_list, forecast_list_context,
+)
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+
+async def city_detail(request, pk):
+    # пользователь загружается заранее, шаблон не должен ходить в базу
+    request.user = await request.auser()
+    try:
+        city = await City.objects.aget(pk=pk)
+    except City.DoesNotExist:
+        raise Http404("Город не найден")
+
+    context = {
+        "city": city,
+        "date_from": request.GET.get("from", ""),
+        "date_to": request.GET.get("to", ""),
+    }
+    forecasts = WeatherForecast.objects.filter(city_id=city)
+    try:
+        forecasts = filter_forecast_dates(forecasts, request.GET)
+    except ValueError as e:
+        context["date_error"] = str(e)
+    context["forecasts"] = [forecast async for forecast in forecasts]
+
+    if request.user.is_authenticated:
+        context["is_favorite"] = await Favorite.objects.filter(
+            user_id=request.user, city_id=city
+        ).aexists()
+    await sync_to_async(record_hit)(city.pk)
+    return render(request, "city_detail.html", context)
+
+
+async def forecast_list(request):
+    request.user = await request.auser()
+    forecasts, date_error = filter_forecast_list(request.GET)
+    try:
+        page_obj = await akeyset_paginate(
+            forecasts, FORECAST_LIST_ORDERING, request.GET.get("cursor"), FORECAST_LIST_PAGE_SIZE
+        )
+    except ValueError:
+        page_obj = await akeyset_paginate(
+            forecasts, FORECAST_LIST_ORDERING, None, FORECAST_LIST_PAGE_SIZE
+        )
+
+    favorites = [row async for row in favorited_by_query(page_obj)]
+    cities = [row async for row in City.active.values_list("pk", "name", "country")]
+    context = forecast_list_context(request, page_obj, favorites, cities, date_error)
+    return render(request, "forecast_list.html", context)
+
+
+# --- API (тот же формат, что у CityViewSet / WeatherForecastViewSet) ---
+
+def _json(data, status=200):
+    """JSON как у JSONRenderer DRF: UTF-8 без экранирования, компактный."""
+    return JsonResponse(
+        data, status=status, safe=False, encoder=JSONEncoder,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def _not_found(detail):
+    # форма ошибки DRF: {"detail": ...}
+    return _json({"detail": str(detail)}, status=404)
+
+
+def _missing(model):
+    # текст get_object_or_404, который DRF отдает для несуществующего объекта
+    return _not_found(f"No {model._meta.object_name} matches the given query.")
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET["page_size"])
+    except (KeyError, ValueError):
+        return API_PAGE_SIZE
+    return min(max(size, 1), API_MAX_PAGE_SIZE)
+
+
+def _link(request, cursor):
+    if cursor is None:
+        return None
+    url = remove_query_param(request.build_absolute_uri(), "page")
+    return replace_query_param(url, "cursor", cursor)
+
+
+async def _paginated_response(request, queryset, ordering, serializer_class, prefetch=()):
+    try:
+        page = await akeyset_paginate(
+            queryset, ordering, request.GET.get("cursor"), _page_size(request)
+        )
+    except ValueError as e:
+        return _not_found(e)
+    if prefetch:
+        await aprefetch_related_objects(page, *prefetch)
+    data = serializer_class(page, many=True, context={"request": request}).data
+    return _json({
+        "next": _link(request, page.next_cursor),
+        "previous": _link(request, page.previous_cursor),
+        "results": data,
+    })
+
+
+def _city_prefetch(request):
+    fields = requested_fields(request)
+    if fields is not None and "users" not in fields:
+        return ()
+    return (Prefetch("users", queryset=User.objects.only("id")),)
+
+
+async def api_city_list(request):
+    return await _paginated_response(
+        request, City.objects.all(), ("name", "id"), CitySerializer, _city_prefetch(request)
+    )
+
+
+async def api_city_detail(request, pk):
+    try:
+        city = await City.objects.aget(pk=pk)
+    except City.DoesNotExist:
+        return _missing(City)
+    await aprefetch_related_objects([city], *_city_prefetch(request))
+    return _json(CitySerializer(city, context={"request": request}).data)
+
+
+async def api_forecast_list(request):
+    try:
+        queryset = filter_forecasts(
+            WeatherForecast.objects.select_related("city_id"), request.GET
+        )
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+    return await _paginated_response(
+        request, queryset, ("forecast_date", "id"), WeatherForecastSerializer
+    )
+
+
+async def api_forecast_detail(request, pk):
+    try:
+        forecast = await WeatherForecast.objects.select_related("city_id").aget(pk=pk)
+    except WeatherForecast.DoesNotExist:
+        return _missing(WeatherForecast)
+    return _json(WeatherForecastSerializer(forecast, context={"request": request}).data)
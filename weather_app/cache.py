@@ -0,0 +1,129 @@
+"""
+Кэш ответов read-only страниц и API для анонимных запросов.
+
+Ключ = имя view + параметры URL + нормализованная query string + Accept
++ текущая версия данных. Любое изменение городов, прогнозов или избранного
+(сигналы) и массовые загрузки (явный bump_version) меняют версию, и все
+старые ключи становятся недостижимыми - TTL для корректности не нужен.
+Версия и счетчики хранятся в самом кэше, поэтому с файловым бэкендом
+(например в /dev/shm) их видят все воркеры gunicorn.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "response-cache:version"
+HITS_KEY = "response-cache:hits"
+MISSES_KEY = "response-cache:misses"
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # ключ вытеснен или кэш пуст - начинаем новое пространство ключей
+        cache.add(VERSION_KEY, str(time.time_ns()), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Сбрасывает все закэшированные ответы (вызывать после изменения данных)."""
+    cache.set(VERSION_KEY, str(time.time_ns()), None)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "version": cache.get(VERSION_KEY),
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def is_cacheable(request):
+    """Кэшируются только GET анонимов без сессии и отложенных сообщений."""
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and "messages" not in request.COOKIES
+    )
+
+
+def normalized_query(request):
+    """
+    Query string без зависимости от порядка параметров. Общая для ключа кэша
+    и ETag (weather_app/conditional.py): у равнозначных URL один закэшированный
+    ответ и один ETag.
+    """
+    return repr(sorted((key, request.GET.getlist(key)) for key in request.GET))
+
+
+def cache_key(name, request, kwargs):
+    raw = "|".join([
+        name,
+        repr(sorted(kwargs.items())),
+        normalized_query(request),
+        request.META.get("HTTP_ACCEPT", ""),
+    ])
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f"response-cache:{get_version()}:{name}:{digest}"
+
+
+def cached_response(name, timeout=None):
+    """
+    Декоратор view (или метода viewset через method_decorator).
+    timeout по умолчанию - settings.RESPONSE_CACHE_TIMEOUT, он лишь
+    ограничивает занимаемое место, актуальность обеспечивает версия.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            key = cache_key(name, request, kwargs)
+            response = cache.get(key)
+            if response is not None:
+                _count(HITS_KEY)
+                return response
+            _count(MISSES_KEY)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            ttl = timeout if timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+
+            def store(rendered):
+                # шаблон может запретить кэширование (например, копии
+                # изображений еще не готовы)
+                if not getattr(request, "skip_response_cache", False):
+                    cache.set(key, rendered, ttl)
+
+            if getattr(response, "is_rendered", True):
+                store(response)
+            else:
+                # TemplateResponse / DRF Response кэшируются после рендеринга
+                response.add_post_render_callback(store)
+            return response
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,103 @@
+"""
+Колоночный формат серии прогнозов города для графиков:
+GET /api/v1/forecasts/?city=<id>&from=&to=&format=columnar
+(или Accept: application/vnd.meteoservice.columnar+json).
+
+Вместо объекта на строку - заголовок города и параллельные массивы:
+
+    {"city": {"id": 1, "name": "Москва", "country": "Россия", ...},
+     "count": 3, "next": null, "previous": null,
+     "conditions": ["Rain", "Sunny"],
+     "columns": {"timestamp": [1735689600, ...],
+                 "temperature_min": [-3.5, ...], "temperature_max": [2.0, ...],
+                 "humidity": [80, ...], "condition": [1, 0, ...]}}
+
+timestamp - секунды Unix (UTC), condition - индекс в списке conditions.
+Страница строится прямо из values_list, без экземпляров моделей и
+сериализатора; пагинация та же cursor пагинация (курсоры совместимы с
+обычным форматом), но страницы до COLUMNAR_MAX_PAGE_SIZE точек.
+"""
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+
+from .models import City
+from .pagination import KeysetPage, keyset_paginate
+from .timing import span
+
+COLUMNAR_PAGE_SIZE = 1000
+COLUMNAR_MAX_PAGE_SIZE = 10000
+ORDERING = ("forecast_date", "id")
+CITY_FIELDS = ("id", "name", "country", "latitude", "longitude")
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = "application/vnd.meteoservice.columnar+json"
+    format = "columnar"
+
+
+def page_size(params):
+    try:
+        size = int(params["page_size"])
+    except (KeyError, ValueError):
+        return COLUMNAR_PAGE_SIZE
+    return min(max(size, 1), COLUMNAR_MAX_PAGE_SIZE)
+
+
+def columns(rows):
+    """Строки (forecast_date, id, tmin, tmax, humidity, condition) -> (conditions, columns)."""
+    codes = {}
+    timestamps, lows, highs, humidity, conditions = [], [], [], [], []
+    for forecast_date, _, low, high, wet, condition in rows:
+        timestamps.append(int(forecast_date.timestamp()))
+        lows.append(low)
+        highs.append(high)
+        humidity.append(wet)
+        conditions.append(codes.setdefault(condition, len(codes)))
+    return list(codes), {
+        "timestamp": timestamps,
+        "temperature_min": lows,
+        "temperature_max": highs,
+        "humidity": humidity,
+        "condition": conditions,
+    }
+
+
+def forecast_series(queryset, request, paginate=True):
+    """
+    Страница прогнозов города (queryset уже отфильтрован по ?city=&from=&to=).
+    paginate=False - вся выборка одной страницей (прореженная серия).
+    """
+    city_id = request.query_params.get("city", "")
+    if not city_id:
+        raise ValidationError({"city": "Колоночный формат требует ?city="})
+    city = get_object_or_404(City.objects.values(*CITY_FIELDS), pk=city_id)
+
+    rows = queryset.values_list(
+        "forecast_date", "id", "temperature_min", "temperature_max", "humidity", "condition"
+    )
+    if not paginate:
+        page = KeysetPage(rows.order_by(*ORDERING))
+    else:
+        try:
+            page = keyset_paginate(
+                rows, ORDERING,
+                cursor=request.query_params.get("cursor"),
+                page_size=page_size(request.query_params),
+                key=lambda row: [row[0], row[1]],
+            )
+        except ValueError as e:
+            raise NotFound(str(e))
+
+    with span("ser"):
+        conditions, data = columns(page)
+    url = request.build_absolute_uri()
+    return {
+        "city": city,
+        "count": len(page),
+        "next": replace_query_param(url, "cursor", page.next_cursor) if page.next_cursor else None,
+        "previous": replace_query_param(url, "cursor", page.previous_cursor) if page.previous_cursor else None,
+        "conditions": conditions,
+        "columns": data,
+    }
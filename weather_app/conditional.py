@@ -0,0 +1,100 @@
+"""
+Валидаторы условных GET (ETag / Last-Modified) для городов и прогнозов.
+
+Метки берутся из City.updated_at и City.forecasts_updated_at, которые
+обновляются сигналами, поэтому проверка стоит один индексный запрос и
+выполняется до выборки данных, сериализации и рендеринга шаблона.
+Изменение одного города не сбрасывает валидаторы остальных.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from .cache import normalized_query
+from .models import City, WeatherForecast
+
+
+def _stamps_for_city(city_id):
+    if not str(city_id).isdigit():
+        return None
+    return City.objects.filter(pk=city_id).values_list(
+        "updated_at", "forecasts_updated_at"
+    ).first()
+
+
+def _stamps_for_all_cities():
+    stamps = City.objects.order_by().aggregate(
+        updated=Max("updated_at"), forecasts=Max("forecasts_updated_at"), n=Count("pk")
+    )
+    # количество городов ловит удаление города, не меняющее максимумы
+    return stamps["updated"], stamps["forecasts"], stamps["n"]
+
+
+def _stamps_for_forecast(forecast_pk):
+    if not str(forecast_pk).isdigit():
+        return None
+    return WeatherForecast.objects.filter(pk=forecast_pk).values_list(
+        "city_id__updated_at", "city_id__forecasts_updated_at", "city_id"
+    ).first()
+
+
+def _validators(request, scope, stamps):
+    if stamps is None:  # объекта нет - пусть view вернет 404
+        return None, None
+    last_modified = max((s for s in stamps[:2] if s is not None), default=None)
+    # ответ зависит от query string (фильтры, курсор, ?fields=) и формата
+    key = "|".join([
+        scope,
+        *(str(s) for s in stamps),
+        normalized_query(request),
+        request.META.get("HTTP_ACCEPT", ""),
+    ])
+    etag = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+    return etag, last_modified
+
+
+def _memoized(compute):
+    """etag_func и last_modified_func вызываются по отдельности - считаем один раз."""
+    def validators(request, *args, **kwargs):
+        cached = getattr(request, "_conditional_validators", None)
+        if cached is None:
+            cached = compute(request, *args, **kwargs)
+            request._conditional_validators = cached
+        return cached
+
+    def etag_func(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
+
+
+def _city_page(request, pk, *args, **kwargs):
+    # HTML страница зависит от пользователя (избранное, кнопки, CSRF)
+    if request.user.is_authenticated:
+        return None, None
+    return _validators(request, f"city-page:{pk}", _stamps_for_city(pk))
+
+
+def _city(request, pk, *args, **kwargs):
+    return _validators(request, f"city:{pk}", _stamps_for_city(pk))
+
+
+def _forecasts(request, *args, **kwargs):
+    city = request.GET.get("city", "")
+    if city.isdigit():
+        return _validators(request, f"forecasts:{city}", _stamps_for_city(city))
+    return _validators(request, "forecasts", _stamps_for_all_cities())
+
+
+def _forecast(request, pk, *args, **kwargs):
+    return _validators(request, f"forecast:{pk}", _stamps_for_forecast(pk))
+
+
+city_page_conditional = _memoized(_city_page)
+city_conditional = _memoized(_city)
+forecasts_conditional = _memoized(_forecasts)
+forecast_conditional = _memoized(_forecast)
@@ -0,0 +1,119 @@
+"""
+Прореживание длинной серии прогнозов города для графиков
+(?max_points=N на /api/v1/forecasts/?city=..., в обоих форматах).
+
+Точки выбираются алгоритмом Largest-Triangle-Three-Buckets: первая и
+последняя точки сохраняются, остальные делятся на N - 2 корзины, и из
+каждой берется точка, образующая наибольший треугольник с выбранной точкой
+предыдущей корзины и средним следующей. temperature_min и temperature_max
+прореживаются вместе: площади треугольников обеих кривых складываются,
+поэтому ответ - N настоящих строк прогноза с общими датами (параллельные
+массивы колоночного формата и построчный формат не меняются).
+
+Границы и средние корзин считаются векторно (reduceat), площади внутри
+корзины - тоже; цикл на Python - только по корзинам (не больше N).
+Выбранные id кэшируются по (город, from, to, N) и версии данных кэша
+ответов, поэтому после любого изменения прогнозов пересчитываются.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import ValidationError
+
+from . import cache as response_cache
+from .aggregate import load_columns
+from .filters import parse_date_bound
+
+MAX_POINTS = 10000
+
+SERIES_DTYPE = np.dtype([
+    ("julian_day", np.float64),
+    ("id", np.int64),
+    ("temperature_min", np.float64),
+    ("temperature_max", np.float64),
+])
+
+
+def lttb_indices(x, ys, n):
+    """
+    Индексы точек, выбранных LTTB. x - возрастающий массив длины m,
+    ys - массив (k, m) кривых, прореживаемых вместе.
+    """
+    m = len(x)
+    if n >= m:
+        return np.arange(m)
+    if n < 3:
+        raise ValueError("LTTB выбирает не меньше 3 точек")
+    ys = np.atleast_2d(ys)
+
+    # корзины для точек 1..m-2: начало i-й корзины и конец последней
+    bounds = (np.arange(n - 1) * ((m - 2) / (n - 2))).astype(np.int64) + 1
+    bounds[-1] = m - 1
+    sizes = np.diff(bounds)
+    starts = bounds[:-1]
+    # среднее каждой корзины; для последней корзины "следующая" - последняя точка
+    avg_x = np.append(np.add.reduceat(x[:-1], starts) / sizes, x[-1])
+    avg_y = np.column_stack((np.add.reduceat(ys[:, :-1], starts, axis=1) / sizes, ys[:, -1]))
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = bounds[i], bounds[i + 1]
+        ax, ay = x[a], ys[:, a, None]
+        cx, cy = avg_x[i + 1], avg_y[:, i + 1, None]
+        # удвоенная площадь треугольника (a, p, c) для всех p корзины
+        area = np.abs((ax - cx) * (ys[:, start:end] - ay) - (ax - x[start:end]) * (cy - ay)).sum(axis=0)
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def parse_max_points(params):
+    try:
+        value = int(params["max_points"])
+    except ValueError:
+        raise ValidationError({"max_points": "Ожидается целое число"})
+    if not 3 <= value <= MAX_POINTS:
+        raise ValidationError({"max_points": f"Допустимо от 3 до {MAX_POINTS}"})
+    return value
+
+
+def _cache_key(params, n):
+    # по разобранным значениям (их уже проверил filter_forecasts): ?city=01 и
+    # ?city=1, "2025-01-01" и "2025-01-01T00:00" - одна и та же серия
+    bounds = []
+    for name in ("from", "to"):
+        if params.get(name):
+            moment, inclusive = parse_date_bound(params[name], end=name == "to")
+            bounds.append(f"{moment.isoformat()}{'' if inclusive else ')'}")
+        else:
+            bounds.append("")
+    raw = "|".join([str(int(params["city"])), *bounds, str(n)])
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f"forecast-lttb:{response_cache.get_version()}:{digest}"
+
+
+def series_ids(queryset, params):
+    """
+    id не больше max_points прогнозов серии города (queryset уже
+    отфильтрован по ?city=&from=&to=), в порядке дат.
+    """
+    if not params.get("city"):
+        raise ValidationError({"city": "Прореживание требует ?city="})
+    n = parse_max_points(params)
+    key = _cache_key(params, n)
+    ids = cache.get(key)
+    if ids is None:
+        columns = load_columns(queryset, SERIES_DTYPE)
+        columns = columns[np.lexsort((columns["id"], columns["julian_day"]))]
+        selected = lttb_indices(
+            columns["julian_day"],
+            np.vstack((columns["temperature_min"], columns["temperature_max"])),
+            n,
+        )
+        ids = columns["id"][selected].tolist()
+        cache.set(key, ids, settings.RESPONSE_CACHE_TIMEOUT)
+    return ids
@@ -0,0 +1,101 @@
+"""
+Потоковая выгрузка прогнозов в CSV / NDJSON.
+
+Строки читаются курсором через .iterator() пачками и сразу уходят клиенту,
+поэтому память процесса не зависит от размера выгрузки. Модели не
+создаются: данные берутся через values_list.
+
+Под ASGI Django собирает синхронный итератор StreamingHttpResponse в
+память целиком, поэтому большие выгрузки нужно забирать с sync/gthread
+воркеров.
+"""
+import csv
+import json
+
+from django.utils.text import compress_sequence
+
+from .ingest import chunked
+
+COLUMNS = (
+    "id", "city_id", "city_name", "city_country", "forecast_date",
+    "temperature_min", "temperature_max", "condition", "humidity",
+)
+LOOKUPS = (
+    "id", "city_id", "city_id__name", "city_id__country", "forecast_date",
+    "temperature_min", "temperature_max", "condition", "humidity",
+)
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Разрешает ли заголовок Accept-Encoding ответ в gzip: явный gzip или *
+    с q больше нуля ("gzip;q=0" - отказ от gzip).
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Кортежи значений COLUMNS в порядке (дата, id), пачками по chunk_size."""
+    rows = queryset.order_by("forecast_date", "id").values_list(*LOOKUPS)
+    return chunked(rows.iterator(chunk_size=chunk_size), chunk_size)
+
+
+class _Lines:
+    """Буфер для csv.writer: копит строки пачки"""
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+
+def render_csv(chunks):
+    buffer = _Lines()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        writer.writerows(
+            (*row[:4], row[4].isoformat(), *row[5:]) for row in rows
+        )
+        yield "".join(buffer.lines).encode()
+        buffer.lines.clear()
+    if buffer.lines:  # пустая выгрузка - только заголовок
+        yield "".join(buffer.lines).encode()
+
+
+def render_ndjson(chunks):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for rows in chunks:
+        yield "".join(
+            dumps(dict(zip(COLUMNS, (*row[:4], row[4].isoformat(), *row[5:])))) + "\n"
+            for row in rows
+        ).encode()
+
+
+RENDERERS = {
+    "csv": render_csv,
+    "ndjson": render_ndjson,
+}
+
+
+def stream(queryset, fmt, gzip=False):
+    """Итератор байтов выгрузки в формате fmt (csv / ndjson)."""
+    content = RENDERERS[fmt](export_rows(queryset))
+    return compress_sequence(content) if gzip else content
@@ -0,0 +1,42 @@
+"""Разбор общих параметров фильтрации из query string."""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_date_bound(value, end=False):
+    """
+    Граница диапазона дат: 'YYYY-MM-DD' или ISO дата-время.
+    Для конца диапазона дата без времени включает весь день.
+    Возвращает (aware datetime, включительно ли), бросает ValueError.
+    """
+    value = value.strip()
+    inclusive = True
+    day = parse_date(value)
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+            inclusive = False
+        moment = datetime.combine(day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Некорректная дата: {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, inclusive
+
+
+def filter_forecast_dates(queryset, params, field="forecast_date"):
+    """Применяет ?from=&to= к выборке прогнозов, бросает ValueError."""
+    date_from = params.get("from")
+    if date_from:
+        moment, _ = parse_date_bound(date_from)
+        queryset = queryset.filter(**{f"{field}__gte": moment})
+    date_to = params.get("to")
+    if date_to:
+        moment, inclusive = parse_date_bound(date_to, end=True)
+        lookup = "lte" if inclusive else "lt"
+        queryset = queryset.filter(**{f"{field}__{lookup}": moment})
+    return queryset
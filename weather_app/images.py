@@ -0,0 +1,184 @@
+"""
+Уменьшенные копии загруженных изображений (фото городов, аватары).
+
+Для каждого оригинала в MEDIA_ROOT/derivatives/<ключ>/ лежат WebP и JPEG
+нескольких фиксированных ширин и manifest.json со списком готовых ширин.
+Копии создаются лениво: шаблонный тег при первом показе ставит оригинал в
+очередь пула процессов и отдает оригинал, следующие показы получают srcset.
+Пока копий нет, страница не попадает в кэш ответов.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+
+DERIVATIVES_DIR = "derivatives"
+MANIFEST = "manifest.json"
+WIDTHS = (160, 320, 640)
+# (формат Pillow, расширение, MIME тип) в порядке предпочтения браузером
+FORMATS = (("WEBP", "webp", "image/webp"), ("JPEG", "jpg", "image/jpeg"))
+QUALITY = 80
+
+# копии оригинала name готовы (отправляется в процессе веб-воркера из потока
+# пула, не из запроса)
+derivatives_ready = Signal()
+
+
+def derivative_key(name):
+    return hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()
+
+
+def derivative_dir(name):
+    return f"{DERIVATIVES_DIR}/{derivative_key(name)}"
+
+
+def derivative_name(name, width, extension):
+    return f"{derivative_dir(name)}/{width}.{extension}"
+
+
+def generate(source, target_dir, widths=WIDTHS):
+    """
+    Создает копии файла source в каталоге target_dir (пути файловой системы).
+    Выполняется в дочернем процессе, поэтому не использует Django.
+    Возвращает список созданных ширин (больше оригинала не увеличиваем).
+    """
+    from PIL import Image, ImageOps
+
+    os.makedirs(target_dir, exist_ok=True)
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    done = []
+    for width in sorted(widths):
+        if width > image.width and done:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        for pil_format, extension, _ in FORMATS:
+            frame = resized
+            if pil_format == "JPEG" and frame.mode not in ("RGB", "L"):
+                frame = _flatten(frame)
+            path = os.path.join(target_dir, f"{width}.{extension}")
+            tmp = f"{path}.tmp"
+            frame.save(tmp, pil_format, quality=QUALITY, optimize=True)
+            os.replace(tmp, path)
+        done.append({"width": width, "real_width": resized.width})
+
+    manifest = os.path.join(target_dir, MANIFEST)
+    with open(f"{manifest}.tmp", "w") as f:
+        json.dump({"source": os.path.basename(source), "widths": done}, f)
+    os.replace(f"{manifest}.tmp", manifest)
+    return done
+
+
+def _flatten(image):
+    from PIL import Image
+
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def load_manifest(name):
+    path = os.path.join(settings.MEDIA_ROOT, derivative_dir(name), MANIFEST)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def workers():
+    return getattr(settings, "IMAGE_WORKERS", 2)
+
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: fork из многопоточного воркера gunicorn небезопасен
+        _executor = ProcessPoolExecutor(
+            max_workers=workers(), mp_context=get_context("spawn")
+        )
+    return _executor
+
+
+def _finished(name, future):
+    if future.exception() is not None:
+        # битый файл: в этом процессе больше не пытаемся
+        return
+    with _lock:
+        _pending.discard(name)
+    try:
+        derivatives_ready.send(sender=None, name=name)
+    finally:
+        # колбэк выполняется в служебном потоке пула
+        connections.close_all()
+
+
+def schedule(name):
+    """Ставит создание копий в очередь; повторные вызовы для name игнорируются."""
+    source = os.path.join(settings.MEDIA_ROOT, name)
+    target = os.path.join(settings.MEDIA_ROOT, derivative_dir(name))
+    if not workers():
+        # без пула (тесты, разработка) - сразу в текущем процессе. Сигнал не
+        # отправляется: вызывающая страница уже покажет srcset, устаревших
+        # ответов нет, а запись в базу из шаблона сломала бы async view
+        try:
+            generate(source, target)
+        except OSError:
+            pass
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    future = _get_executor().submit(generate, source, target)
+    future.add_done_callback(lambda f: _finished(name, f))
+
+
+def srcsets(name):
+    """
+    [(MIME тип, srcset)] для готовых копий или None, если копий еще нет
+    (тогда они ставятся в очередь).
+    """
+    manifest = load_manifest(name)
+    if manifest is None:
+        if not os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+            return None
+        schedule(name)
+        # без пула копии уже готовы
+        manifest = load_manifest(name)
+        if manifest is None:
+            return None
+    sets = []
+    for _, extension, mime in FORMATS:
+        entries = [
+            f"{settings.MEDIA_URL}{derivative_name(name, item['width'], extension)} {item['real_width']}w"
+            for item in manifest["widths"]
+        ]
+        sets.append((mime, ", ".join(entries)))
+    return sets
+
+
+def orphaned(names):
+    """Каталоги копий, оригиналов которых нет среди names."""
+    root = os.path.join(settings.MEDIA_ROOT, DERIVATIVES_DIR)
+    if not os.path.isdir(root):
+        return []
+    keep = {derivative_key(name) for name in names}
+    return sorted(
+        os.path.join(root, entry) for entry in os.listdir(root) if entry not in keep
+    )
@@ -0,0 +1,223 @@
+"""Потоковая загрузка прогнозов погоды пачками (NDJSON / CSV)."""
+import csv
+import json
+import time
+from datetime import datetime, time as dt_time
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import cache as response_cache
+from .models import City, WeatherForecast
+
+# поля, которые перезаписываются при повторной загрузке того же прогноза
+UPSERT_FIELDS = ["temperature_min", "temperature_max", "condition", "humidity"]
+
+
+class RowError(ValueError):
+    """Строка входных данных не может быть превращена в прогноз."""
+
+
+def read_ndjson(stream):
+    """Построчно читает NDJSON, пропуская пустые строки."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield RowError(f"некорректный JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield RowError("ожидается объект JSON")
+            continue
+        yield row
+
+
+def read_csv(stream):
+    """Построчно читает CSV с заголовком."""
+    yield from csv.DictReader(stream)
+
+
+READERS = {
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+}
+
+
+def chunked(iterable, size):
+    """Разбивает итератор на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_forecast_date(value):
+    """Дата или дата-время в ISO формате -> aware datetime."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        value = str(value or "").strip()
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise RowError(f"некорректная дата: {value!r}")
+            parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class IngestStats:
+    def __init__(self):
+        self.rows = 0
+        self.written = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+
+class ForecastIngestor:
+    """
+    Загружает прогнозы пачками: одна транзакция и один bulk_create на пачку,
+    повторная загрузка того же (город, дата) обновляет существующую запись.
+    """
+
+    max_reported_errors = 50
+
+    def __init__(self, batch_size=1000, on_chunk=None):
+        self.batch_size = batch_size
+        self.on_chunk = on_chunk
+        # кэш города: название/id -> id, растет не больше таблицы городов
+        self._city_by_name = {}
+        self._known_city_ids = set()
+        # города, в которые писали: bulk_create не вызывает сигналы,
+        # поэтому их счетчики прогнозов пересчитываются в конце загрузки
+        self.touched_city_ids = set()
+
+    def run(self, rows):
+        stats = IngestStats()
+        try:
+            for chunk in chunked(rows, self.batch_size):
+                self.ingest_chunk(chunk, stats)
+                if self.on_chunk:
+                    self.on_chunk(stats)
+        finally:
+            self.finish()
+        return stats
+
+    def finish(self):
+        if self.touched_city_ids:
+            City.objects.refresh_forecast_counts(self.touched_city_ids)
+            self.touched_city_ids.clear()
+            response_cache.bump_version()
+
+    def ingest_chunk(self, chunk, stats):
+        first_row = stats.rows + 1
+        stats.rows += len(chunk)
+        self._load_cities(row for row in chunk if isinstance(row, dict))
+
+        forecasts = {}
+        for number, row in enumerate(chunk, start=first_row):
+            try:
+                forecast = self.build(row)
+            except RowError as e:
+                stats.skipped += 1
+                if len(stats.errors) < self.max_reported_errors:
+                    stats.errors.append(f"строка {number}: {e}")
+                continue
+            # внутри пачки последняя строка с тем же ключом побеждает
+            forecasts[(forecast.city_id_id, forecast.forecast_date)] = forecast
+
+        if forecasts:
+            self.write(list(forecasts.values()))
+            stats.written += len(forecasts)
+
+    def _load_cities(self, rows):
+        """Одним запросом подгружает города пачки, которых еще нет в кэше."""
+        names, ids = set(), set()
+        for row in rows:
+            if row.get("city_id") not in (None, ""):
+                try:
+                    city_id = int(row["city_id"])
+                except (TypeError, ValueError):
+                    continue
+                if city_id not in self._known_city_ids:
+                    ids.add(city_id)
+            elif row.get("city"):
+                name = str(row["city"]).strip()
+                if name not in self._city_by_name:
+                    names.add(name)
+        if ids:
+            self._known_city_ids.update(
+                City.objects.filter(pk__in=ids).values_list("pk", flat=True)
+            )
+        if names:
+            found = City.objects.filter(name__in=names).order_by("-pk")
+            for pk, name in found.values_list("pk", "name"):
+                self._city_by_name[name] = pk
+            for name in names - self._city_by_name.keys():
+                self._city_by_name[name] = None
+
+    def resolve_city(self, row):
+        if row.get("city_id") not in (None, ""):
+            try:
+                city_id = int(row["city_id"])
+            except (TypeError, ValueError):
+                raise RowError(f"некорректный city_id: {row['city_id']!r}")
+            if city_id not in self._known_city_ids:
+                raise RowError(f"неизвестный город с id {city_id}")
+            return city_id
+        name = str(row.get("city") or "").strip()
+        if not name:
+            raise RowError("не указан город (city или city_id)")
+        city_id = self._city_by_name.get(name)
+        if city_id is None:
+            raise RowError(f"неизвестный город {name!r}")
+        return city_id
+
+    def build(self, row):
+        if isinstance(row, RowError):
+            raise row
+        try:
+            return WeatherForecast(
+                city_id_id=self.resolve_city(row),
+                forecast_date=parse_forecast_date(row.get("forecast_date")),
+                temperature_min=float(row["temperature_min"]),
+                temperature_max=float(row["temperature_max"]),
+                condition=str(row.get("condition") or "")[:30],
+                humidity=int(float(row["humidity"])),
+            )
+        except KeyError as e:
+            raise RowError(f"нет поля {e.args[0]}")
+        except (TypeError, ValueError) as e:
+            if isinstance(e, RowError):
+                raise
+            raise RowError(str(e))
+
+    def write(self, forecasts):
+        """Upsert пачки по (city_id, forecast_date) одной транзакцией."""
+        self.touched_city_ids.update(f.city_id_id for f in forecasts)
+        with transaction.atomic():
+            WeatherForecast.objects.bulk_create(
+                forecasts,
+                update_conflicts=True,
+                unique_fields=["city_id", "forecast_date"],
+                update_fields=UPSERT_FIELDS,
+            )
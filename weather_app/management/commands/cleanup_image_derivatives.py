@@ -0,0 +1,33 @@
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from weather_app import images
+from weather_app.models import City, Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет уменьшенные копии изображений, оригиналы которых больше "
+        "не используются (фото города или аватар заменены или удалены)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="только показать")
+
+    def handle(self, *args, **options):
+        names = set(
+            City.objects.exclude(photo="").exclude(photo=None).values_list("photo", flat=True)
+        )
+        names.update(
+            Profile.objects.exclude(avatar="").exclude(avatar=None).values_list("avatar", flat=True)
+        )
+        orphaned = images.orphaned(names)
+        for path in orphaned:
+            if options["verbosity"] >= 2:
+                self.stdout.write(path)
+            if not options["dry_run"]:
+                shutil.rmtree(path, ignore_errors=True)
+
+        action = "Найдено" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{action} каталогов копий: {len(orphaned)}"))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from weather_app import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Отправляет письма из очереди через одно SMTP соединение на пачку. "
+        "С --loop работает постоянно, опрашивая очередь каждые --interval секунд."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--max-attempts", type=int, default=None,
+                            help="попыток до отказа (по умолчанию OUTBOX_MAX_ATTEMPTS)")
+        parser.add_argument("--loop", action="store_true", help="не завершаться после очереди")
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            try:
+                sent, retried, failed = outbox.deliver(
+                    batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+                )
+            except Exception as e:
+                # почтовый сервер недоступен - письма остаются в очереди
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"Ошибка соединения: {e}")
+                time.sleep(options["interval"])
+                continue
+            total_sent += sent
+            total_failed += failed
+            if options["verbosity"] >= 2 and (sent or retried or failed):
+                self.stdout.write(
+                    f"отправлено: {sent}, отложено: {retried}, отказ: {failed}"
+                )
+            # полная пачка - в очереди, вероятно, есть еще письма
+            if sent + retried + failed == options["batch_size"]:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Отправлено писем: {total_sent}, не отправлено: {total_failed}"
+        ))
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather_app.models import City
+from weather_app.providers import ProviderClient, fetch_forecasts
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает прогнозы всех городов у провайдера (FORECAST_PROVIDER_URL) "
+        "по координатам: пул потоков, ограничение частоты на хост, условные запросы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="адрес провайдера (по умолчанию FORECAST_PROVIDER_URL)")
+        parser.add_argument("--city", type=int, nargs="+", help="только города с этими id")
+        parser.add_argument("--days", type=int, default=settings.FORECAST_FETCH_DAYS)
+        parser.add_argument("--workers", type=int, default=settings.FORECAST_FETCH_WORKERS)
+        parser.add_argument("--rate", type=float, default=None,
+                            help="запросов в секунду на хост (по умолчанию FORECAST_PROVIDER_RATE, 0 - без ограничения)")
+        parser.add_argument("--timeout", type=float, default=None, help="таймаут запроса, секунд")
+        parser.add_argument("--retries", type=int, default=2, help="повторов после ошибки")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cities = City.objects.only("pk", "latitude", "longitude").order_by("pk")
+        if options["city"]:
+            cities = cities.filter(pk__in=options["city"])
+
+        client = ProviderClient(
+            url=options["url"],
+            workers=options["workers"],
+            rate=options["rate"],
+            timeout=options["timeout"],
+            retries=options["retries"],
+        )
+
+        def on_result(result):
+            if result.error and options["verbosity"] >= 2:
+                self.stderr.write(f"город {result.city_id}: {result.error}")
+
+        try:
+            stats = fetch_forecasts(
+                cities.iterator(chunk_size=options["batch_size"]),
+                client,
+                workers=options["workers"],
+                days=options["days"],
+                batch_size=options["batch_size"],
+                on_result=on_result,
+            )
+        finally:
+            client.close()
+
+        ingest = stats.ingest
+        for error in ingest.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Городов: {stats.cities} (обновлено {stats.updated}, без изменений {stats.not_modified}, "
+            f"ошибок {stats.failed}), запросов: {stats.requests}, "
+            f"прогнозов записано: {ingest.written}, за {stats.elapsed:.1f} с "
+            f"({stats.cities / stats.elapsed if stats.elapsed else 0:.0f} городов/с)"
+        ))
@@ -0,0 +1,67 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather_app.ingest import READERS, ForecastIngestor
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковая загрузка прогнозов из NDJSON/CSV файла или stdin. "
+        "Повторная загрузка обновляет прогнозы по (город, дата)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?", default="-",
+            help="Путь к файлу или '-' для чтения из stdin",
+        )
+        parser.add_argument(
+            "--format", choices=sorted(READERS), default=None,
+            help="Формат входных данных (по умолчанию по расширению файла, иначе ndjson)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Количество строк в одной транзакции",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        fmt = options["format"] or self.guess_format(path)
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+
+        ingestor = ForecastIngestor(
+            batch_size=options["batch_size"],
+            on_chunk=self.report_progress,
+        )
+        if path == "-":
+            stats = ingestor.run(READERS[fmt](sys.stdin))
+        else:
+            try:
+                stream = open(path, encoding="utf-8", newline="")
+            except OSError as e:
+                raise CommandError(f"Не удалось открыть {path}: {e}")
+            with stream:
+                stats = ingestor.run(READERS[fmt](stream))
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: {stats.rows} строк, записано {stats.written}, "
+            f"пропущено {stats.skipped} за {stats.elapsed:.2f} с "
+            f"({stats.rows_per_second:.0f} строк/с)"
+        ))
+
+    @staticmethod
+    def guess_format(path):
+        if path.lower().endswith(".csv"):
+            return "csv"
+        return "ndjson"
+
+    def report_progress(self, stats):
+        if self.verbosity >= 1:
+            self.stdout.write(
+                f"{stats.rows} строк, {stats.rows_per_second:.0f} строк/с"
+            )
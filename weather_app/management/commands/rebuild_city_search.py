@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from weather_app import search
+from weather_app import cache as response_cache
+from weather_app.models import City
+
+
+class Command(BaseCommand):
+    help = (
+        "Перестраивает FTS индекс поиска городов. "
+        "Нужен после изменения городов в обход ORM (raw SQL)."
+    )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("FTS индекс доступен только на SQLite после миграций")
+        indexed = search.rebuild_index(City.objects.all())
+        response_cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано городов: {indexed}"))
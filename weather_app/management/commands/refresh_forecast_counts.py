@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from weather_app import cache as response_cache
+from weather_app.models import City
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает City.forecast_count по таблице прогнозов. "
+        "Нужен после загрузок в обход ORM (raw SQL, внешние утилиты)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "city_ids", nargs="*", type=int,
+            help="id городов для пересчета (по умолчанию все)",
+        )
+
+    def handle(self, *args, **options):
+        city_ids = options["city_ids"] or None
+        updated = City.objects.refresh_forecast_counts(city_ids)
+        response_cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано городов: {updated}"))
@@ -0,0 +1,90 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather_app import refresh
+from weather_app.providers import ProviderClient, fetch_forecasts
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет устаревшие прогнозы: за цикл не больше --budget городов "
+        "с наибольшим приоритетом (спрос * возраст прогноза). С --loop "
+        "повторяет цикл каждые --interval секунд."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="адрес провайдера (по умолчанию FORECAST_PROVIDER_URL)")
+        parser.add_argument("--budget", type=int, default=settings.FORECAST_REFRESH_BUDGET,
+                            help="городов за цикл")
+        parser.add_argument("--loop", action="store_true", help="работать непрерывно")
+        parser.add_argument("--interval", type=float, default=settings.FORECAST_REFRESH_INTERVAL,
+                            help="секунд между циклами")
+        parser.add_argument("--days", type=int, default=settings.FORECAST_FETCH_DAYS)
+        parser.add_argument("--workers", type=int, default=settings.FORECAST_FETCH_WORKERS)
+        parser.add_argument("--rate", type=float, default=None,
+                            help="запросов в секунду на хост (по умолчанию FORECAST_PROVIDER_RATE)")
+        parser.add_argument("--timeout", type=float, default=None, help="таймаут запроса, секунд")
+        parser.add_argument("--stats", action="store_true",
+                            help="только показать очередь и возраст прогнозов")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.write_stats()
+            return
+
+        client = ProviderClient(
+            url=options["url"],
+            workers=options["workers"],
+            rate=options["rate"],
+            timeout=options["timeout"],
+        )
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    self.run_cycle(client, options)
+                except Exception:
+                    if not options["loop"]:
+                        raise
+                    # ошибка одного цикла (база занята, сбой провайдера) не
+                    # останавливает планировщик: следующий цикл по расписанию
+                    logger.exception("Цикл обновления прогнозов завершился ошибкой")
+                if not options["loop"]:
+                    break
+                time.sleep(max(options["interval"] - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.close()
+
+    def run_cycle(self, client, options):
+        # просмотры этого процесса (если команда запущена рядом с сайтом)
+        refresh.flush_hits()
+        cities = refresh.plan(options["budget"])
+        if cities:
+            stats = fetch_forecasts(
+                cities, client, workers=options["workers"], days=options["days"],
+            )
+            for error in stats.ingest.errors:
+                self.stderr.write(error)
+            self.stdout.write(self.style.SUCCESS(
+                f"Обновлено городов: {stats.cities} (новых прогнозов {stats.updated}, "
+                f"без изменений {stats.not_modified}, ошибок {stats.failed}) за {stats.elapsed:.1f} с"
+            ))
+        self.write_stats()
+
+    def write_stats(self):
+        stats = refresh.queue_stats()
+        buckets = ", ".join(
+            f"≤{bound // 3600 if bound >= 3600 else bound // 60}{'ч' if bound >= 3600 else 'мин'}: {count}"
+            for bound, count in stats["staleness"].items()
+        )
+        self.stdout.write(
+            f"В очереди: {stats['queue_depth']} из {stats['total']} "
+            f"(не загружались: {stats['never_fetched']}); возраст прогнозов {buckets}"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from weather_app import cache as response_cache
+
+
+class Command(BaseCommand):
+    help = "Счетчики попаданий кэша ответов (общие для воркеров при общем бэкенде кэша)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счетчики")
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"hit rate: {stats['hit_rate']:.1%}, версия: {stats['version']}"
+        )
+        if options["reset"]:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
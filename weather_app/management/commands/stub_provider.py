@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from weather_app.stub_provider import StubProviderServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Локальный провайдер прогнозов для fetch_forecasts: "
+        "GET /forecast?lat=&lon=&days= с ETag/304, задержкой и ошибками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунд")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+        parser.add_argument("--hang-rate", type=float, default=0.0,
+                            help="доля ответов, которые зависают на --hang-seconds")
+        parser.add_argument("--hang-seconds", type=float, default=30.0)
+        parser.add_argument("--change-every", type=float, default=0,
+                            help="секунд до смены данных (0 - данные не меняются, всегда 304)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        server = StubProviderServer(
+            (options["host"], options["port"]),
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            hang_rate=options["hang_rate"],
+            hang_seconds=options["hang_seconds"],
+            change_every=options["change_every"],
+            seed=options["seed"],
+        )
+        host, port = server.server_address
+        self.stdout.write(f"Провайдер: http://{host}:{port}/forecast (Ctrl+C - остановить)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Запросов: {server.counts}")
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from weather_app import cache as response_cache
+from weather_app.replica import REPLICA_DB_ALIAS, sync_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в файл реплики (REPLICA_SQLITE_PATH). "
+        "С --loop копирует только после изменений основной базы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="не завершаться")
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        primary = str(connections[DEFAULT_DB_ALIAS].settings_dict["NAME"])
+        replica = str(connections[REPLICA_DB_ALIAS].settings_dict["NAME"])
+        if primary == replica:
+            raise CommandError(
+                "Реплика использует файл основной базы: задайте REPLICA_SQLITE_PATH"
+            )
+
+        source = sqlite3.connect(primary, timeout=30)
+        last_version = None
+        try:
+            while True:
+                # data_version меняется, когда другие соединения что-то записали
+                version = source.execute("PRAGMA data_version").fetchone()[0]
+                if version != last_version:
+                    started = time.monotonic()
+                    sync_sqlite(source, replica)
+                    last_version = version
+                    # в кэше могли оказаться ответы, собранные по отставшей реплике
+                    response_cache.bump_version()
+                    if options["verbosity"] >= 1:
+                        self.stdout.write(self.style.SUCCESS(
+                            f"Реплика обновлена за {time.monotonic() - started:.2f} с"
+                        ))
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        finally:
+            source.close()
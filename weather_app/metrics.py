@@ -0,0 +1,269 @@
+"""
+Метрики Prometheus (/metrics), общие для всех воркеров gunicorn.
+
+Каждый процесс считает метрики в памяти (словарь под блокировкой - на
+запрос несколько операций со словарем), а фоновый поток раз в
+METRICS_FLUSH_INTERVAL секунд записывает изменившиеся метрики в файл
+процесса METRICS_DIR/<pid>.json (через временный файл и os.replace).
+/metrics суммирует файлы всех процессов. Счетчики завершившихся воркеров (например
+после max_requests) мастер gunicorn переносит в archive.json хуком
+child_exit, поэтому счетчики не уменьшаются и файлы не копятся.
+
+Без METRICS_DIR (runserver, тесты) /metrics отдает метрики своего процесса.
+Данные других воркеров отстают не больше чем на METRICS_FLUSH_INTERVAL.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+ARCHIVE = "archive.json"
+PREFIX = "meteoservice"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# имя -> (тип, описание, метки, границы корзин гистограммы)
+METRICS = {
+    "http_requests_total": (
+        "counter", "HTTP запросы по view, методу и статусу", ("view", "method", "status"), None,
+    ),
+    "http_request_duration_seconds": (
+        "histogram", "Время обработки запроса", ("view",), DURATION_BUCKETS,
+    ),
+    "db_queries_per_request": (
+        "histogram", "SQL запросов на HTTP запрос", ("view",), QUERY_BUCKETS,
+    ),
+    "db_query_duration_seconds_total": (
+        "counter", "Суммарное время SQL запросов", ("view",), None,
+    ),
+}
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_counters = {}    # (имя, метки) -> значение
+_histograms = {}  # (имя, метки) -> [корзина..., сумма, количество]
+_dirty = False
+_flusher_pid = None
+
+
+def _observe(name, labels, value):
+    buckets = METRICS[name][3]
+    key = (name, labels)
+    row = _histograms.get(key)
+    if row is None:
+        row = _histograms[key] = [0] * (len(buckets) + 2)
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            row[i] += 1
+            break
+    row[-2] += value
+    row[-1] += 1
+
+
+def observe_request(request, response, timings, total_ms):
+    """Учитывает запрос (вызывает timing.PerformanceMiddleware)."""
+    global _dirty
+    match = request.resolver_match
+    view = (match.url_name or match.view_name) if match else "unmatched"
+    labels = (view,)
+    key = ("http_requests_total", (view, request.method, str(response.status_code)))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+        _observe("http_request_duration_seconds", labels, total_ms / 1000)
+        _observe("db_queries_per_request", labels, timings.queries)
+        key = ("db_query_duration_seconds_total", labels)
+        _counters[key] = _counters.get(key, 0) + timings.durations["db"]
+        _dirty = True
+    if settings.METRICS_DIR and _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def _start_flusher():
+    # поток создается в воркере после fork (в мастере с preload_app его нет)
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        if _dirty:
+            flush()
+
+
+def _dump(counters, histograms):
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), list(row)] for (name, labels), row in histograms.items()],
+    }
+
+
+def snapshot():
+    """Метрики процесса в виде, пригодном для JSON."""
+    with _lock:
+        return _dump(_counters, _histograms)
+
+
+def reset():
+    """Обнуляет метрики процесса."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _write(path, data):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def flush():
+    """Записывает метрики процесса в METRICS_DIR/<pid>.json."""
+    global _dirty
+    directory = settings.METRICS_DIR
+    # мастер gunicorn с preload_app запросы не обслуживает - файл не нужен
+    if not directory or not (_counters or _histograms):
+        return
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    # снимок и запись под одной блокировкой: старый снимок не перезапишет новый
+    with _write_lock:
+        with _lock:
+            data = _dump(_counters, _histograms)
+            _dirty = False
+        _write(path / f"{os.getpid()}.json", data)
+
+
+atexit.register(flush)
+
+
+def _merge(total, data):
+    for name, labels, value in data.get("counters", ()):
+        key = (name, tuple(labels))
+        total["counters"][key] = total["counters"].get(key, 0) + value
+    for name, labels, row in data.get("histograms", ()):
+        key = (name, tuple(labels))
+        current = total["histograms"].get(key)
+        total["histograms"][key] = row if current is None else [a + b for a, b in zip(current, row)]
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        # файл перенесен в архив мастером между glob и чтением
+        return {}
+
+
+def collect():
+    """Метрики всех процессов: {"counters": {...}, "histograms": {...}}."""
+    total = {"counters": {}, "histograms": {}}
+    if not settings.METRICS_DIR:
+        _merge(total, snapshot())
+        return total
+    flush()
+    for path in Path(settings.METRICS_DIR).glob("*.json"):
+        _merge(total, _read(path))
+    return total
+
+
+def archive(directory, pid):
+    """
+    Переносит метрики завершившегося процесса pid в archive.json (вызывать
+    только из мастера gunicorn, хук child_exit).
+    """
+    path = Path(directory) / f"{pid}.json"
+    if not path.exists():
+        return
+    total = {"counters": {}, "histograms": {}}
+    _merge(total, _read(Path(directory) / ARCHIVE))
+    _merge(total, _read(path))
+    _write(Path(directory) / ARCHIVE, _dump(total["counters"], total["histograms"]))
+    path.unlink()
+
+
+def reset_directory(directory):
+    """Очищает каталог метрик при старте мастера gunicorn."""
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for file in path.glob("*.json"):
+        file.unlink()
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render():
+    """Текстовый формат Prometheus 0.0.4."""
+    from . import cache as response_cache
+    from . import refresh
+
+    data = collect()
+    lines = []
+    for name, (kind, help_text, names, buckets) in METRICS.items():
+        full = f"{PREFIX}_{name}"
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(data["counters"].items()):
+                if metric == name:
+                    lines.append(f"{full}{_format_labels(names, labels)} {_number(value)}")
+            continue
+        for (metric, labels), row in sorted(data["histograms"].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, row):
+                cumulative += count
+                lines.append(f"{full}_bucket{_format_labels(names, labels, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{full}_bucket{_format_labels(names, labels, [('le', '+Inf')])} {row[-1]}")
+            lines.append(f"{full}_sum{_format_labels(names, labels)} {_number(row[-2])}")
+            lines.append(f"{full}_count{_format_labels(names, labels)} {row[-1]}")
+
+    # счетчики кэша ответов уже общие (хранятся в самом кэше)
+    stats = response_cache.stats()
+    for name, kind, help_text, value in (
+        ("response_cache_hits_total", "counter", "Попадания кэша ответов", stats["hits"]),
+        ("response_cache_misses_total", "counter", "Промахи кэша ответов", stats["misses"]),
+        ("response_cache_hit_ratio", "gauge", "Доля попаданий кэша ответов", stats["hit_rate"]),
+    ):
+        full = f"{PREFIX}_{name}"
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}", f"{full} {_number(value)}"]
+
+    # очередь обновления прогнозов считается по базе (один агрегирующий запрос)
+    queue = refresh.queue_stats()
+    full = f"{PREFIX}_refresh_queue_depth"
+    lines += [
+        f"# HELP {full} Городов с устаревшим прогнозом",
+        f"# TYPE {full} gauge",
+        f"{full} {queue['queue_depth']}",
+    ]
+    full = f"{PREFIX}_forecast_staleness_cities"
+    lines += [
+        f"# HELP {full} Городов с возрастом прогноза не больше le секунд",
+        f"# TYPE {full} gauge",
+    ]
+    for bound, count in queue["staleness"].items():
+        lines.append(f'{full}{{le="{bound}"}} {count}')
+    lines.append(f'{full}{{le="+Inf"}} {queue["total"] - queue["never_fetched"]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:27
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_forecasts(apps, schema_editor):
+    # перед добавлением уникальности оставляем последний загруженный прогноз
+    WeatherForecast = apps.get_model('weather_app', 'WeatherForecast')
+    duplicates = (
+        WeatherForecast.objects.values('city_id', 'forecast_date')
+        .annotate(n=Count('id'), last_id=Max('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates.iterator():
+        WeatherForecast.objects.filter(
+            city_id=row['city_id'], forecast_date=row['forecast_date']
+        ).exclude(id=row['last_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0008_alter_city_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_forecasts, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='weatherforecast',
+            options={'ordering': ['forecast_date']},
+        ),
+        migrations.AddConstraint(
+            model_name='weatherforecast',
+            constraint=models.UniqueConstraint(fields=('city_id', 'forecast_date'), name='weatherforecast_city_date_uniq'),
+        ),
+    ]
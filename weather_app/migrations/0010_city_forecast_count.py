@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_forecast_counts(apps, schema_editor):
+    City = apps.get_model('weather_app', 'City')
+    WeatherForecast = apps.get_model('weather_app', 'WeatherForecast')
+    counts = (
+        WeatherForecast.objects.filter(city_id=OuterRef('pk'))
+        .order_by()
+        .values('city_id')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    City.objects.update(forecast_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0009_weatherforecast_city_date_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='forecast_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Количество прогнозов'),
+        ),
+        migrations.RunPython(fill_forecast_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+import unicodedata
+
+from django.db import migrations
+
+# копия weather_app/search.py на момент миграции: изменения кода приложения
+# не должны менять результат migrate на новой базе
+FTS_TABLE = 'weather_app_city_fts'
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g', 'ў': 'u',
+}
+LATIN_FOLDS = [('kh', 'h'), ('w', 'v'), ('j', 'i'), ('y', 'i')]
+
+
+def fold(text):
+    text = unicodedata.normalize('NFC', (text or '').lower())
+    text = ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    for src, dst in LATIN_FOLDS:
+        text = text.replace(src, dst)
+    return text
+
+
+def create_city_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite, на других СУБД поиск работает через icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        "name, country, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    City = apps.get_model('weather_app', 'City')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, country) VALUES (%s, %s, %s)',
+            [
+                (pk, fold(name), fold(country))
+                for pk, name, country in City.objects.values_list('pk', 'name', 'country')
+            ],
+        )
+
+
+def drop_city_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0010_city_forecast_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_city_search_index, drop_city_search_index),
+    ]
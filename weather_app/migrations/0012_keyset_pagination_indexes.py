@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0011_city_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['name', 'id'], name='city_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['country', 'id'], name='city_country_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatherforecast',
+            index=models.Index(fields=['forecast_date', 'id'], name='forecast_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0012_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='forecasts_updated_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True, verbose_name='Дата обновления прогнозов'),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0014_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastFetchState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('fetched_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний запрос')),
+                ('last_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='HTTP статус')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('failures', models.PositiveSmallIntegerField(default=0, verbose_name='Ошибок подряд')),
+                ('city', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fetch_state', to='weather_app.city', verbose_name='Город')),
+            ],
+            options={
+                'verbose_name': 'Загрузка прогнозов',
+                'verbose_name_plural': 'Загрузка прогнозов',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_app', '0015_forecast_fetch_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecastfetchstate',
+            name='hits_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Просмотры учтены'),
+        ),
+        migrations.AddField(
+            model_name='forecastfetchstate',
+            name='recent_hits',
+            field=models.FloatField(default=0, verbose_name='Просмотры (с затуханием)'),
+        ),
+        migrations.AddField(
+            model_name='forecastfetchstate',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Прогноз актуален на'),
+        ),
+    ]
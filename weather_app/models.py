@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .validators import validate_latitude, validate_longitude
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="Пользователь")
@@ -14,11 +17,29 @@ class Profile(models.Model):
     def __str__(self):
         return f"Профиль {self.user.username}"
 
+class CityManager(models.Manager):
+    def refresh_forecast_counts(self, city_ids=None):
+        """Пересчитывает forecast_count по таблице прогнозов (после массовых загрузок)"""
+        counts = (
+            WeatherForecast.objects.filter(city_id=OuterRef('pk'))
+            .order_by()
+            .values('city_id')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+        queryset = self.get_queryset()
+        if city_ids is not None:
+            queryset = queryset.filter(pk__in=city_ids)
+        return queryset.update(
+            forecast_count=Coalesce(Subquery(counts), 0),
+            forecasts_updated_at=timezone.now(),
+        )
+
 class ActiveCityManager(models.Manager):
     """Менеджер, возвращающий только активные города"""
     def get_queryset(self):
-        # фильтруем города, например, только с заполненными координатами
-        return super().get_queryset().filter(weatherforecast__isnull=False).distinct()
+        # активные города - города с прогнозами, счетчик поддерживается сигналами
+        return super().get_queryset().filter(forecast_count__gt=0)
     
 class City(models.Model):
     name = models.CharField("Название", max_length=30)
@@ -27,11 +48,20 @@ class City(models.Model):
     longitude = models.FloatField("Долгота", validators=[validate_longitude])
     users = models.ManyToManyField(User, through='Favorite', verbose_name="Пользователи")
     photo = models.ImageField("Фото города", upload_to='city_photos/', blank=True, null=True)
+    forecast_count = models.PositiveIntegerField("Количество прогнозов", default=0, editable=False, db_index=True)
+    # метки изменений для условных GET (ETag / Last-Modified)
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True, db_index=True)
+    forecasts_updated_at = models.DateTimeField("Дата обновления прогнозов", null=True, editable=False, db_index=True)
     
     class Meta:
         verbose_name_plural = "Cities"
         ordering = ['name']
-    objects = models.Manager()          
+        indexes = [
+            # ключи cursor пагинации списка городов
+            models.Index(fields=['name', 'id'], name='city_name_id_idx'),
+            models.Index(fields=['country', 'id'], name='city_country_id_idx'),
+        ]
+    objects = CityManager()
     active = ActiveCityManager() 
 
     def __str__(self):
@@ -49,6 +79,20 @@ class Favorite(models.Model):
     def __str__(self):
          return self.city_id.name + "/" + self.city_id.country
 
+# прогнозы городов city_ids удалены (обработчик - weather_app/signals.py).
+# post_delete обработчик на WeatherForecast выключил бы быстрое удаление:
+# каскад при удалении города загружал бы и обрабатывал каждую строку
+forecasts_deleted = Signal()
+
+class ForecastQuerySet(models.QuerySet):
+    def delete(self):
+        """Удаление одним DELETE; счетчики затронутых городов пересчитываются один раз"""
+        city_ids = set(self.order_by().values_list('city_id', flat=True).distinct())
+        result = super().delete()
+        if city_ids:
+            forecasts_deleted.send(sender=WeatherForecast, city_ids=city_ids)
+        return result
+
 class WeatherForecast(models.Model):
     city_id = models.ForeignKey(City, on_delete=models.CASCADE)
     forecast_date = models.DateTimeField("Дата")
@@ -57,10 +101,33 @@ class WeatherForecast(models.Model):
     condition = models.CharField("Погодные условия", max_length=30)
     humidity = models.IntegerField("Влажность")
     created_at = models.DateTimeField("Время создания", auto_now_add = True)
-    
+
+    class Meta:
+        ordering = ['forecast_date']
+        constraints = [
+            # уникальный индекс (city_id, forecast_date) обслуживает и выборки
+            # по диапазону дат внутри города, и upsert при загрузке
+            models.UniqueConstraint(
+                fields=['city_id', 'forecast_date'],
+                name='weatherforecast_city_date_uniq',
+            ),
+        ]
+        indexes = [
+            # ключ cursor пагинации общего списка прогнозов
+            models.Index(fields=['forecast_date', 'id'], name='forecast_date_id_idx'),
+        ]
+
+    objects = ForecastQuerySet.as_manager()
+
     def __str__(self):
           return self.city_id.name + "/" + self.city_id.country
 
+    def delete(self, *args, **kwargs):
+        city_id = self.city_id_id
+        result = super().delete(*args, **kwargs)
+        forecasts_deleted.send(sender=WeatherForecast, city_ids={city_id})
+        return result
+
 class SupportRequest(models.Model):
     STATUS_CHOICES = [
         ('new', 'Новая'),
@@ -92,6 +159,63 @@ class SupportRequest(models.Model):
     def __str__(self):
         return f"{self.subject} ({self.get_status_display()})"
 
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку (отправляет manage.py deliver_outbox)"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Не отправлено'),
+    ]
+
+    subject = models.CharField("Тема", max_length=255)
+    body = models.TextField("Текст")
+    from_email = models.CharField("Отправитель", max_length=254)
+    recipients = models.JSONField("Получатели", default=list)
+    status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    next_attempt_at = models.DateTimeField("Следующая попытка", default=timezone.now)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    sent_at = models.DateTimeField("Дата отправки", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        ordering = ['-created_at']
+        indexes = [
+            # выборка писем, которые пора отправить
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.recipients)} ({self.get_status_display()})"
+
+class ForecastFetchState(models.Model):
+    """Состояние загрузки прогнозов города у провайдера (manage.py fetch_forecasts)"""
+    city = models.OneToOneField(City, on_delete=models.CASCADE, related_name='fetch_state', verbose_name="Город")
+    # валидаторы условного запроса: If-None-Match / If-Modified-Since
+    etag = models.CharField("ETag", max_length=255, blank=True)
+    last_modified = models.CharField("Last-Modified", max_length=64, blank=True)
+    fetched_at = models.DateTimeField("Последний запрос", null=True, blank=True)
+    last_status = models.PositiveSmallIntegerField("HTTP статус", null=True, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    failures = models.PositiveSmallIntegerField("Ошибок подряд", default=0)
+    # последний успешный запрос (200 или 304) - от него считается возраст прогноза
+    refreshed_at = models.DateTimeField("Прогноз актуален на", null=True, blank=True, db_index=True)
+    # спрос: просмотры страницы города с экспоненциальным затуханием (weather_app/refresh.py)
+    recent_hits = models.FloatField("Просмотры (с затуханием)", default=0)
+    hits_at = models.DateTimeField("Просмотры учтены", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Загрузка прогнозов"
+        verbose_name_plural = "Загрузка прогнозов"
+
+    def __str__(self):
+        return f"{self.city} ({self.last_status or '-'})"
+
 # Сигналы для автоматического создания профиля при создании пользователя
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -0,0 +1,89 @@
+"""
+Очередь исходящих писем.
+
+View только сохраняют письмо в таблицу (enqueue), отправляет его
+manage.py deliver_outbox: пачками через одно SMTP соединение, с повторами
+и экспоненциальной задержкой после ошибок. Медленный почтовый сервер
+больше не задерживает ответ на отправку формы.
+
+Рассчитано на один процесс deliver_outbox.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+def enqueue(subject, body, recipients, from_email=None):
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+
+
+def retry_delay(attempts):
+    """Задержка перед следующей попыткой: RETRY_DELAY * 2^(n-1), не больше часа."""
+    base = getattr(settings, "OUTBOX_RETRY_DELAY", 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def due(now=None):
+    return OutgoingEmail.objects.filter(
+        status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now or timezone.now()
+    ).order_by("next_attempt_at", "id")
+
+
+def deliver(batch_size=100, max_attempts=None, connection=None):
+    """
+    Отправляет одну пачку писем, которые пора отправить.
+    Возвращает (отправлено, отложено до следующей попытки, отказ).
+    """
+    max_attempts = max_attempts or getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+    batch = list(due()[:batch_size])
+    if not batch:
+        return 0, 0, 0
+
+    sent = retried = failed = 0
+    connection = connection or get_connection()
+    connection.open()
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                email.attempts += 1
+                email.last_error = f"{type(e).__name__}: {e}"
+                if email.attempts >= max_attempts:
+                    email.status = OutgoingEmail.STATUS_FAILED
+                    failed += 1
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                    retried += 1
+                email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+                # после ошибки соединение могло оборваться - переоткрываем,
+                # если сервер недоступен, остаток пачки ждет следующего запуска
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    break
+                continue
+
+            email.attempts += 1
+            email.status = OutgoingEmail.STATUS_SENT
+            email.sent_at = timezone.now()
+            email.last_error = ""
+            email.save(update_fields=["attempts", "status", "sent_at", "last_error"])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, retried, failed
@@ -0,0 +1,218 @@
+"""
+Keyset (cursor) пагинация: следующая страница выбирается условием
+"после последней строки" по (поле сортировки, id) вместо OFFSET,
+без COUNT(*). Стоимость страницы не зависит от ее глубины.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _json_default(value):
+    # isoformat без потери микросекунд, иначе курсор "съезжает"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Нельзя сохранить в курсор: {value!r}")
+
+
+def encode_cursor(values, direction="next"):
+    payload = json.dumps({"v": values, "d": direction}, default=_json_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Возвращает (значения ключа, направление), бросает ValueError."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload["v"], payload["d"]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError):
+        raise ValueError("Некорректный курсор")
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        raise ValueError("Некорректный курсор")
+    return values, direction
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _after(ordering, values):
+    """Строки строго после values в порядке ordering (лексикографически)."""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{previous.lstrip("-"): value})
+        condition |= step
+    return condition
+
+
+class KeysetPage(list):
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _cursor_values(model, ordering, values):
+    """Значения курсора в типах полей сортировки (курсор приходит от клиента)."""
+    converted = []
+    for field_name, value in zip(ordering, values):
+        try:
+            field = model._meta.get_field(field_name.lstrip("-"))
+        except FieldDoesNotExist:
+            converted.append(value)
+            continue
+        try:
+            value = field.to_python(value)
+        except (ValidationError, TypeError):
+            raise ValueError("Некорректный курсор")
+        if value is None:
+            raise ValueError("Некорректный курсор")
+        converted.append(value)
+    return converted
+
+
+def _keyset_query(queryset, ordering, cursor, page_size):
+    """Срез выборки для страницы (на одну строку больше, чтобы узнать о следующей)."""
+    values, direction = (None, "next")
+    if cursor:
+        values, direction = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise ValueError("Некорректный курсор")
+        values = _cursor_values(queryset.model, ordering, values)
+    backwards = direction == "prev"
+    order = [_flip(field) for field in ordering] if backwards else ordering
+
+    queryset = queryset.order_by(*order)
+    if values is not None:
+        queryset = queryset.filter(_after(order, values))
+    return queryset[:page_size + 1], values, backwards
+
+
+def _keyset_page(items, ordering, page_size, values, backwards, key=None):
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if backwards:
+        items.reverse()
+    if not items:
+        return KeysetPage(items)
+
+    if key is None:
+        def key(obj):
+            return [getattr(obj, field.lstrip("-")) for field in ordering]
+
+    has_next = True if backwards else has_more
+    has_previous = has_more if backwards else values is not None
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(key(items[-1]), "next") if has_next else None,
+        previous_cursor=encode_cursor(key(items[0]), "prev") if has_previous else None,
+    )
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=20, key=None):
+    """
+    Одна страница выборки. ordering - поля сортировки, последним должно идти
+    уникальное поле (id). key(строка) -> значения полей ordering нужен для
+    выборок values()/values_list(). Бросает ValueError при некорректном курсоре.
+    """
+    ordering = list(ordering)
+    query, values, backwards = _keyset_query(queryset, ordering, cursor, page_size)
+    return _keyset_page(list(query), ordering, page_size, values, backwards, key)
+
+
+async def akeyset_paginate(queryset, ordering, cursor=None, page_size=20):
+    """Асинхронный вариант keyset_paginate."""
+    ordering = list(ordering)
+    query, values, backwards = _keyset_query(queryset, ordering, cursor, page_size)
+    items = [obj async for obj in query]
+    return _keyset_page(items, ordering, page_size, values, backwards)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor пагинация для API. Порядок берется из view.keyset_ordering.
+    С параметром ?page= работает обычная постраничная пагинация
+    (с count), удобная для небольших выборок.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("id",)
+
+    def __init__(self):
+        self.page_size = settings.REST_FRAMEWORK.get("PAGE_SIZE", 20)
+        self.page_number_pagination = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number_pagination = PageNumberPagination()
+            return self.page_number_pagination.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        ordering = getattr(view, "keyset_ordering", self.ordering)
+        try:
+            self.page = keyset_paginate(
+                queryset,
+                ordering,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except ValueError as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.get_paginated_response(data)
+        return Response({
+            "next": self._link(self.page.next_cursor),
+            "previous": self._link(self.page.previous_cursor),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
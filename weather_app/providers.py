@@ -0,0 +1,278 @@
+"""
+Загрузка прогнозов городов у внешнего провайдера (manage.py fetch_forecasts).
+
+Запросы к провайдеру идут из пула потоков через общую requests.Session
+(пул keep-alive соединений на хост), не чаще FORECAST_PROVIDER_RATE в
+секунду на хост. Повторный запрос города условный (If-None-Match /
+If-Modified-Since): неизменившийся прогноз приходит ответом 304 без тела.
+Все записи в базу выполняет вызывающий поток - пачками через
+ForecastIngestor, так SQLite остается с одним писателем.
+
+Формат ответа провайдера на GET <url>?lat=&lon=&days=:
+
+    {"forecasts": [{"date": "2025-01-01", "temperature_min": -3.5,
+                    "temperature_max": 2.0, "condition": "Snow",
+                    "humidity": 80}, ...]}
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .ingest import ForecastIngestor, RowError, chunked
+from .models import ForecastFetchState
+
+# статусы, после которых запрос стоит повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+STATE_FIELDS = [
+    "etag", "last_modified", "fetched_at", "last_status", "last_error", "failures", "refreshed_at",
+]
+
+
+class HostRateLimiter:
+    """Не больше rate запросов в секунду на хост (равномерно, без всплесков)."""
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class FetchResult:
+    def __init__(self, city_id, status=None, forecasts=(), etag="", last_modified="",
+                 error="", attempts=0):
+        self.city_id = city_id
+        self.status = status
+        self.forecasts = forecasts
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+        self.attempts = attempts
+
+
+class ProviderClient:
+    def __init__(self, url=None, workers=8, rate=None, timeout=None, retries=2, backoff=0.5):
+        self.url = url or settings.FORECAST_PROVIDER_URL
+        self.timeout = timeout if timeout is not None else settings.FORECAST_PROVIDER_TIMEOUT
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = HostRateLimiter(
+            rate if rate is not None else settings.FORECAST_PROVIDER_RATE
+        )
+        self.host = urlsplit(self.url).netloc
+        # Session с адаптером общая для потоков: пул соединений urllib3
+        # потокобезопасен, соединений столько же, сколько потоков
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def fetch(self, city_id, latitude, longitude, days, etag="", last_modified=""):
+        """Прогнозы города; ошибки не выбрасываются, а возвращаются в FetchResult."""
+        headers = {"Accept": "application/json"}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        params = {"lat": latitude, "lon": longitude, "days": days}
+        error = ""
+        for attempt in range(1, self.retries + 2):
+            self.limiter.wait(self.host)
+            try:
+                response = self.session.get(
+                    self.url, params=params, headers=headers, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+                delay = self.backoff * 2 ** (attempt - 1)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return self._result(city_id, response, attempt)
+                error = f"HTTP {response.status_code}"
+                delay = self._retry_after(response, attempt)
+            if attempt <= self.retries:
+                time.sleep(delay)
+        return FetchResult(city_id, error=error, attempts=self.retries + 1)
+
+    def _retry_after(self, response, attempt):
+        """
+        Пауза перед повтором: Retry-After в секундах или HTTP-дата, но не
+        дольше таймаута запроса - иначе один ответ занял бы поток надолго.
+        """
+        value = response.headers.get("Retry-After", "").strip()
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - timezone.now()).total_seconds()
+            except (TypeError, ValueError, IndexError):
+                delay = self.backoff * 2 ** (attempt - 1)
+        return min(max(delay, 0), self.timeout)
+
+    def _result(self, city_id, response, attempts):
+        result = FetchResult(
+            city_id,
+            status=response.status_code,
+            etag=response.headers.get("ETag", ""),
+            last_modified=response.headers.get("Last-Modified", ""),
+            attempts=attempts,
+        )
+        if response.status_code == 304:
+            return result
+        if response.status_code != 200:
+            result.error = f"HTTP {response.status_code}"
+            return result
+        try:
+            result.forecasts = response.json()["forecasts"]
+        except (ValueError, KeyError, TypeError) as e:
+            result.error = f"некорректный ответ: {e!r}"
+        return result
+
+
+class FetchStats:
+    def __init__(self):
+        self.cities = 0
+        self.updated = 0       # 200 с прогнозами
+        self.not_modified = 0  # 304
+        self.failed = 0
+        self.requests = 0
+        self.ingest = None
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+def fetch_forecasts(cities, client, workers=8, days=7, batch_size=1000, on_result=None):
+    """
+    Загружает прогнозы городов (итерируемое City) через client.
+    В полете не больше workers * 2 запросов, чтобы не держать в памяти
+    задания для всех городов сразу.
+    """
+    stats = FetchStats()
+    states = {}
+    pending_states = []
+    # состояния городов, чьи прогнозы ушли в текущую пачку ForecastIngestor:
+    # ETag и refreshed_at сохраняются только после записи пачки, иначе при
+    # сбое записи следующий условный запрос получил бы 304 без данных в базе
+    unwritten_states = []
+    written_city_ids = set()
+
+    def save_states(force=False):
+        if pending_states and (force or len(pending_states) >= batch_size):
+            ForecastFetchState.objects.bulk_update(
+                [state for state in pending_states if state.pk], STATE_FIELDS
+            )
+            # строку состояния мог создать refresh.flush_hits уже после чтения
+            # состояний пачки: upsert по городу, просмотры не перезаписываются
+            ForecastFetchState.objects.bulk_create(
+                [state for state in pending_states if not state.pk],
+                update_conflicts=True,
+                unique_fields=["city"],
+                update_fields=STATE_FIELDS,
+            )
+            pending_states.clear()
+
+    def results():
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+            in_flight = set()
+            for chunk in chunked(cities, batch_size):
+                # валидаторы условных запросов пачки одним запросом
+                states.update(
+                    (state.city_id, state)
+                    for state in ForecastFetchState.objects.filter(city__in=[c.pk for c in chunk])
+                )
+                for city in chunk:
+                    state = states.get(city.pk) or ForecastFetchState(city_id=city.pk)
+                    in_flight.add(pool.submit(
+                        client.fetch, city.pk, city.latitude, city.longitude, days,
+                        state.etag, state.last_modified,
+                    ))
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        yield from (future.result() for future in done)
+            for future in in_flight:
+                yield future.result()
+
+    def rows():
+        for result in results():
+            stats.cities += 1
+            stats.requests += result.attempts
+            state = states.pop(result.city_id, None) or ForecastFetchState(city_id=result.city_id)
+            state.fetched_at = timezone.now()
+            state.last_status = result.status
+            state.last_error = result.error
+            if result.error:
+                stats.failed += 1
+                state.failures += 1
+            else:
+                state.failures = 0
+                if result.status == 304:
+                    stats.not_modified += 1
+                    accept(state, result)
+                else:
+                    stats.updated += 1
+            if on_result:
+                on_result(result)
+            if not result.forecasts:
+                # 304 или ошибка: писать нечего, состояние сохраняется сразу
+                if not result.error and result.status != 304:
+                    state.last_error = "ответ без прогнозов"
+                pending_states.append(state)
+                save_states()
+                continue
+            for forecast in result.forecasts:
+                if not isinstance(forecast, dict):
+                    yield RowError(f"некорректный прогноз: {forecast!r}")
+                    continue
+                yield {**forecast, "city_id": result.city_id, "forecast_date": forecast.get("date")}
+            unwritten_states.append((state, result))
+
+    def accept(state, result):
+        state.refreshed_at = state.fetched_at
+        # провайдер может не прислать валидаторы (например в 304) -
+        # сохраненные остаются, иначе каждый следующий запрос был бы полным
+        state.etag = result.etag or state.etag
+        state.last_modified = result.last_modified or state.last_modified
+
+    def chunk_written(ingest_stats):
+        written_city_ids.update(ingestor.touched_city_ids)
+        for state, result in unwritten_states:
+            if state.city_id in written_city_ids:
+                accept(state, result)
+            else:
+                # все строки ответа отклонены: без валидаторов ответ будет
+                # запрошен заново, а не получит 304
+                state.last_error = "нет корректных прогнозов"
+            pending_states.append(state)
+        unwritten_states.clear()
+        save_states()
+
+    ingestor = ForecastIngestor(batch_size=batch_size, on_chunk=chunk_written)
+    try:
+        stats.ingest = ingestor.run(rows())
+        # последняя пачка могла оказаться пустой - без вызова on_chunk
+        chunk_written(stats.ingest)
+    finally:
+        # при ошибке состояния городов с незаписанными прогнозами не сохраняются
+        save_states(force=True)
+    return stats
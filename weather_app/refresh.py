@@ -0,0 +1,159 @@
+"""
+Обновление прогнозов по принципу stale-while-revalidate
+(manage.py refresh_forecasts).
+
+Прогноз города устаревает через FORECAST_STALE_AFTER секунд после
+последнего успешного запроса к провайдеру (ForecastFetchState.refreshed_at).
+Устаревшие города - очередь на обновление; за цикл обновляется не больше
+FORECAST_REFRESH_BUDGET городов с наибольшим приоритетом:
+
+    (1 + избранное + просмотры) * возраст прогноза
+
+Просмотры - посещения страницы города с экспоненциальным затуханием
+(период полураспада CITY_HITS_HALF_LIFE). Страницы, пока город в очереди,
+показывают последний загруженный прогноз: загрузка заменяет прогнозы
+upsert'ом, ничего не удаляя заранее.
+"""
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import City, ForecastFetchState
+
+# границы распределения возраста прогнозов, секунд
+STALENESS_BUCKETS = (900, 3600, 3 * 3600, 6 * 3600, 24 * 3600, 7 * 24 * 3600)
+# возраст города, который ни разу не загружался
+NEVER_FETCHED_AGE = 7 * 24 * 3600
+
+_lock = threading.Lock()
+_hits = {}
+_last_flush = time.monotonic()
+
+
+def decayed(hits, since, now):
+    """Просмотры hits, учтенные в момент since, к моменту now."""
+    if not hits or since is None:
+        return hits or 0.0
+    elapsed = (now - since).total_seconds()
+    return hits * 0.5 ** (max(elapsed, 0) / settings.CITY_HITS_HALF_LIFE)
+
+
+def record_hit(city_id):
+    """
+    Учитывает просмотр страницы города. Счетчики копятся в памяти процесса
+    и раз в CITY_HITS_FLUSH_INTERVAL секунд записываются в базу.
+    """
+    global _last_flush
+    with _lock:
+        _hits[city_id] = _hits.get(city_id, 0) + 1
+        now = time.monotonic()
+        due = now - _last_flush >= settings.CITY_HITS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    if due:
+        flush_hits()
+
+
+def flush_hits():
+    """Записывает накопленные просмотры в ForecastFetchState."""
+    global _hits
+    with _lock:
+        hits, _hits = _hits, {}
+    if not hits:
+        return
+    now = timezone.now()
+    # явная база: запись из GET запроса не должна закреплять пользователя
+    # за основной базой (weather_app/replica.py)
+    states = ForecastFetchState.objects.using(DEFAULT_DB_ALIAS)
+    # чтение-изменение-запись: одновременный сброс из двух воркеров может
+    # потерять часть просмотров, для оценки спроса это допустимо
+    existing = states.in_bulk(hits.keys(), field_name="city_id")
+    for city_id, state in existing.items():
+        state.recent_hits = decayed(state.recent_hits, state.hits_at, now) + hits[city_id]
+        state.hits_at = now
+    states.bulk_update(existing.values(), ["recent_hits", "hits_at"])
+    # город мог быть удален после просмотра
+    missing = City.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk__in=[city_id for city_id in hits if city_id not in existing]
+    ).values_list("pk", flat=True)
+    states.bulk_create(
+        [ForecastFetchState(city_id=city_id, recent_hits=hits[city_id], hits_at=now) for city_id in missing],
+        ignore_conflicts=True,
+    )
+
+
+def count_city_hits(view):
+    """Декоратор get страницы города: учитывает просмотр до кэша и 304."""
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record_hit(kwargs["pk"])
+        return response
+
+    return wrapped
+
+
+def stale_before(now=None):
+    now = now or timezone.now()
+    return now - timedelta(seconds=settings.FORECAST_STALE_AFTER)
+
+
+def stale_filter(now=None):
+    """Города, прогноз которых устарел или ни разу не загружался."""
+    return (
+        Q(fetch_state__refreshed_at__lt=stale_before(now))
+        | Q(fetch_state__refreshed_at__isnull=True)
+    )
+
+
+def plan(budget=None, now=None):
+    """Города очереди с наибольшим приоритетом, не больше budget."""
+    budget = budget if budget is not None else settings.FORECAST_REFRESH_BUDGET
+    now = now or timezone.now()
+    rows = (
+        City.objects.filter(stale_filter(now))
+        .annotate(favorites=Count("favorite"))
+        .values_list(
+            "pk", "favorites", "fetch_state__recent_hits", "fetch_state__hits_at",
+            "fetch_state__refreshed_at",
+        )
+        .order_by()
+    )
+    scored = []
+    for pk, favorites, hits, hits_at, refreshed_at in rows.iterator(chunk_size=5000):
+        age = (now - refreshed_at).total_seconds() if refreshed_at else NEVER_FETCHED_AGE
+        demand = favorites + decayed(hits, hits_at, now)
+        scored.append((pk, (1 + demand) * age))
+    top = heapq.nlargest(budget, scored, key=lambda item: item[1])
+    cities = City.objects.only("pk", "latitude", "longitude").in_bulk([pk for pk, _ in top])
+    return [cities[pk] for pk, _ in top if pk in cities]
+
+
+def queue_stats(now=None):
+    """
+    Глубина очереди и распределение возраста прогнозов: число городов с
+    возрастом не больше каждой границы STALENESS_BUCKETS (накопительно).
+    """
+    now = now or timezone.now()
+    aggregates = {
+        "total": Count("pk"),
+        "never": Count("pk", filter=Q(fetch_state__refreshed_at__isnull=True)),
+        "queue_depth": Count("pk", filter=stale_filter(now)),
+    }
+    for bound in STALENESS_BUCKETS:
+        aggregates[f"le_{bound}"] = Count("pk", filter=Q(
+            fetch_state__refreshed_at__gte=now - timedelta(seconds=bound)
+        ))
+    data = City.objects.aggregate(**aggregates)
+    return {
+        "total": data["total"],
+        "never_fetched": data["never"],
+        "queue_depth": data["queue_depth"],
+        "staleness": {bound: data[f"le_{bound}"] for bound in STALENESS_BUCKETS},
+    }
@@ -0,0 +1,111 @@
+"""
+Чтение из реплики, запись в основную базу.
+
+В реплику уходят только чтения view, помеченных replica_reads /
+ReplicaReadsMixin (viewsets и списки), и только GET/HEAD. После первой
+записи запрос закрепляется за основной базой, а cookie закрепляет за ней
+и следующие запросы пользователя на REPLICA_PIN_SECONDS - пока реплика не
+догонит основную базу, пользователь видит свои изменения.
+
+Локально реплика - второй файл SQLite (REPLICA_SQLITE_PATH), который
+обновляет manage.py sync_replica.
+"""
+import contextvars
+import sqlite3
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+PIN_COOKIE = "pin_primary"
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+_pinned = contextvars.ContextVar("pinned_to_primary", default=False)
+_wrote = contextvars.ContextVar("wrote_to_primary", default=False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            settings.REPLICA_READS
+            and _replica_reads.get()
+            and not _pinned.get()
+            # внутри транзакции читаем то, что в ней же записали
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # в обеих базах одни и те же данные
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема реплики приходит из основной базы вместе с данными
+        return db != REPLICA_DB_ALIAS
+
+
+def replica_reads(view):
+    """Чтения GET/HEAD запросов view идут в реплику."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+            # шаблон TemplateResponse / DRF Response выполняет ленивые
+            # запросы при рендеринге - рендерим, пока действует реплика
+            if not getattr(response, "is_rendered", True):
+                response.render()
+            return response
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapped
+
+
+class ReplicaReadsMixin:
+    """replica_reads для class-based view и viewsets."""
+    def dispatch(self, request, *args, **kwargs):
+        return replica_reads(super().dispatch)(request, *args, **kwargs)
+
+
+class PrimaryPinMiddleware:
+    """Закрепляет за основной базой запросы после записи (см. модуль)."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True, samesite="Lax",
+                )
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+
+
+def sync_sqlite(source, target):
+    """
+    Копирует базу SQLite source в target через online backup API:
+    источник читается согласованным снимком, читатели реплики видят либо
+    старую, либо новую версию целиком.
+    """
+    destination = sqlite3.connect(target, timeout=30)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
@@ -1,18 +1,90 @@
+import logging
+import time
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
 from import_export import resources, fields
-from import_export.widgets import ForeignKeyWidget
+from import_export.instance_loaders import CachedInstanceLoader
+from import_export.widgets import DateTimeWidget, ForeignKeyWidget, IntegerWidget
+
+from . import cache as response_cache
+from .ingest import UPSERT_FIELDS, chunked, parse_forecast_date
 from .models import City, WeatherForecast
 
+logger = logging.getLogger(__name__)
+
+# поля прогноза без значения по умолчанию: пустая ячейка - ошибка строки
+REQUIRED_FIELDS = ["forecast_date", "temperature_min", "temperature_max", "condition", "humidity"]
+
 
 class CityResource(resources.ModelResource):
     class Meta:
         model = City
         fields = ("id", "name", "country", "latitude", "longitude")
 
+class CityNameWidget(ForeignKeyWidget):
+    """Город по названию из заранее загруженного словаря, без запроса на строку"""
+    def __init__(self):
+        super().__init__(City, 'name')
+        self.cities = None
+
+    def load(self, names):
+        """Загружает города по названиям; возвращает (неизвестные, неоднозначные)"""
+        self.cities = {}
+        ambiguous = set()
+        # пачками, чтобы не упереться в лимит параметров SQLite
+        for chunk in chunked(sorted(names), 500):
+            for city in City.objects.filter(name__in=chunk).only('id', 'name'):
+                if city.name in self.cities:
+                    ambiguous.add(city.name)
+                self.cities[city.name] = city
+        return set(names) - set(self.cities), ambiguous
+
+    def clean(self, value, row=None, **kwargs):
+        if self.cities is None:
+            return super().clean(value, row, **kwargs)
+        if not value:
+            return None
+        return self.cities[value]
+
+class ForecastDateWidget(DateTimeWidget):
+    """Дата или дата-время в ISO формате, как в ingest_forecasts"""
+    def clean(self, value, row=None, **kwargs):
+        if not value:
+            return None
+        return parse_forecast_date(value)
+
+class IntegerCellWidget(IntegerWidget):
+    """Целое число; нечисловая ячейка - ошибка строки, а не всего импорта"""
+    def clean(self, value, row=None, **kwargs):
+        try:
+            return super().clean(value, row, **kwargs)
+        except InvalidOperation:
+            # Field.clean превращает в ошибку строки только ValueError
+            raise ValueError(f"Некорректное целое число: {value!r}")
+
 class WeatherForecastResource(resources.ModelResource):
+    """
+    Быстрый импорт прогнозов: названия городов разрешаются одним словарем
+    до разбора строк, неизвестные и неоднозначные названия отклоняют файл
+    целиком одной ошибкой, строки пишутся bulk_create пачками по batch_size
+    с обновлением существующих прогнозов по (город, дата). Строки с пустыми
+    или некорректными ячейками попадают в invalid_rows результата и не пишутся.
+    """
     city_id = fields.Field(
         column_name='city',
         attribute='city_id',
-        widget=ForeignKeyWidget(City, 'name')
+        widget=CityNameWidget()
+    )
+    forecast_date = fields.Field(
+        column_name='forecast_date',
+        attribute='forecast_date',
+        widget=ForecastDateWidget()
+    )
+    humidity = fields.Field(
+        column_name='humidity',
+        attribute='humidity',
+        widget=IntegerCellWidget()
     )
 
     class Meta:
@@ -26,4 +98,111 @@ class WeatherForecastResource(resources.ModelResource):
             "condition",
             "humidity",
         )
-        export_order = fields
\ No newline at end of file
+        export_order = fields
+        use_bulk = True
+        batch_size = 1000
+        # сравнение с исходной строкой стоит лишнего экспорта на каждую строку
+        skip_diff = True
+        # существующие прогнозы по id загружаются одним запросом
+        instance_loader_class = CachedInstanceLoader
+
+    def __init__(self, progress=None, **kwargs):
+        super().__init__(**kwargs)
+        self.progress = progress or self._log_progress
+        self.written = 0
+        self.touched_city_ids = set()
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('city_id')
+
+    def before_import(self, dataset, **kwargs):
+        self.written = 0
+        self.touched_city_ids = set()
+        self.started = time.monotonic()
+        column = self.fields['city_id'].column_name
+        if column not in dataset.headers:
+            return
+        rows = {}
+        for number, name in enumerate(dataset[column], 1):
+            rows.setdefault(name, number)
+        unknown, ambiguous = self.fields['city_id'].widget.load(
+            [name for name in rows if name]
+        )
+        if unknown or ambiguous:
+            # строки не импортируются, ошибка одна на весь файл
+            del dataset[:]
+            raise ValueError(self.city_errors(unknown, ambiguous, rows))
+
+    @staticmethod
+    def city_errors(unknown, ambiguous, rows):
+        lines = []
+        if unknown:
+            lines.append(f"Неизвестные города ({len(unknown)}):")
+            lines += [f"  {name} (первая строка {rows[name]})" for name in sorted(unknown)]
+        if ambiguous:
+            lines.append(f"Неоднозначные названия, городов с таким именем несколько ({len(ambiguous)}):")
+            lines += [f"  {name} (первая строка {rows[name]})" for name in sorted(ambiguous)]
+        return "\n".join(lines)
+
+    def validate_instance(self, instance, import_validation_errors=None, validate_unique=True):
+        """
+        Проверка строки до пачечной записи, без full_clean (запрос на строку):
+        город и обязательные поля. Ошибка помечает строку как invalid в
+        результате импорта, а не обрывает всю пачку IntegrityError в bulk_create.
+        """
+        errors = dict(import_validation_errors or {})
+        if 'city_id' not in errors and instance.city_id_id is None:
+            errors['city_id'] = ['Не указан город']
+        for name in REQUIRED_FIELDS:
+            if name in errors:
+                continue
+            field = WeatherForecast._meta.get_field(name)
+            try:
+                field.clean(getattr(instance, field.attname), instance)
+            except ValidationError as e:
+                errors[name] = e.error_list
+        if errors:
+            raise ValidationError(errors)
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        if not self.create_instances or (dry_run and not using_transactions):
+            self.create_instances.clear()
+            return
+        # повтор (город, дата) в одной пачке - побеждает последняя строка
+        unique = {}
+        for forecast in self.create_instances:
+            unique[(forecast.city_id_id, forecast.forecast_date)] = forecast
+        try:
+            WeatherForecast.objects.bulk_create(
+                unique.values(),
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["city_id", "forecast_date"],
+                update_fields=UPSERT_FIELDS,
+            )
+        except Exception as e:
+            self.handle_import_error(result, e, raise_errors)
+        else:
+            # строки с повтором (город, дата) в пачке записаны одной
+            self.written += len(unique)
+            self.touched_city_ids.update(city_id for city_id, _ in unique)
+            self.progress(self.written, result.total_rows if result else None)
+        finally:
+            self.create_instances.clear()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        self.touched_city_ids.update(f.city_id_id for f in self.update_instances)
+        super().bulk_update(using_transactions, dry_run, raise_errors, batch_size, result)
+
+    def after_import(self, dataset, result, **kwargs):
+        # bulk операции не вызывают сигналы: счетчики и кэш обновляем явно
+        if self.touched_city_ids:
+            City.objects.refresh_forecast_counts(self.touched_city_ids)
+            response_cache.bump_version()
+
+    def _log_progress(self, written, total):
+        elapsed = time.monotonic() - self.started
+        logger.info(
+            "Импорт прогнозов: %s из %s строк, %.0f строк/с",
+            written, total, written / elapsed if elapsed else 0,
+        )
@@ -0,0 +1,114 @@
+"""
+Полнотекстовый поиск городов: теневая таблица SQLite FTS5.
+
+В индекс пишутся "сложенные" название и страна: нижний регистр, без
+диакритики, кириллица в латинице и упрощение неоднозначных сочетаний.
+Запрос складывается так же, поэтому "моск", "Moskva" и "moskwa" находят
+один и тот же город.
+"""
+import re
+import unicodedata
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+
+from .models import City
+
+FTS_TABLE = "weather_app_city_fts"
+
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u",
+}
+# разные системы транслитерации пишут один звук по-разному
+LATIN_FOLDS = [("kh", "h"), ("w", "v"), ("j", "i"), ("y", "i")]
+
+
+def fold(text):
+    """Нормализует текст для индекса и запросов."""
+    # транслитерация до снятия диакритики, иначе "й" превратится в "и"
+    text = unicodedata.normalize("NFC", (text or "").lower())
+    text = "".join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in text)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    for src, dst in LATIN_FOLDS:
+        text = text.replace(src, dst)
+    return text
+
+
+def match_expression(query):
+    """Префиксный поиск по всем словам запроса (AND), без синтаксиса FTS5."""
+    tokens = re.findall(r"\w+", fold(query))
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+# база -> есть ли индекс; отрицательный ответ тоже запоминается, иначе каждый
+# поиск и каждое сохранение города без индекса делали бы интроспекцию схемы
+_available = {}
+
+
+def is_available(using=DEFAULT_DB_ALIAS):
+    """Есть ли FTS индекс в базе using (только SQLite, после миграции)."""
+    available = _available.get(using)
+    if available is None:
+        db = connections[using]
+        available = _available[using] = (
+            db.vendor == "sqlite" and FTS_TABLE in db.introspection.table_names()
+        )
+    return available
+
+
+def create_index(schema_editor):
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, country, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def index_city(city):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, country) VALUES (%s, %s, %s)",
+            [city.pk, fold(city.name), fold(city.country)],
+        )
+
+
+def unindex_city(city_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [city_id])
+
+
+def rebuild_index(cities):
+    """Полностью перестраивает индекс по выборке городов."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        rows = (
+            (pk, fold(name), fold(country))
+            for pk, name, country in cities.values_list("pk", "name", "country").iterator()
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, country) VALUES (%s, %s, %s)", rows
+        )
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_city_ids(query, using=None):
+    """
+    id всех подходящих городов по релевантности (bm25, совпадение в названии
+    весит больше). Читает ту же базу, что и запросы к City (реплику в
+    ReplicaReadsMixin view).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    with connections[using or router.db_for_read(City)].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0)",
+            [expression],
+        )
+        return [row[0] for row in cursor.fetchall()]
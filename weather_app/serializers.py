@@ -1,15 +1,42 @@
 # weather_app/serializers.py
-from rest_framework import serializers
+from rest_framework import permissions, serializers
 from django.contrib.auth.models import User
 from .models import City, Favorite, WeatherForecast
+from .timing import span
 
-class UserSerializer(serializers.ModelSerializer):
+
+def requested_fields(request):
+    """Множество полей из ?fields=id,name или None, если параметр не задан"""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None
+    # DRF Request или обычный HttpRequest (асинхронные view)
+    raw = getattr(request, 'query_params', request.GET).get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+class SparseFieldsetMixin:
+    """Отдает только поля, перечисленные в ?fields= (только для чтения)"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+class TimedSerializerMixin:
+    """Время to_representation попадает в метрику ser (Server-Timing)"""
+    def to_representation(self, instance):
+        with span('ser'):
+            return super().to_representation(instance)
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'date_joined']
         read_only_fields = ['id', 'date_joined']
 
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = City
         fields = [
@@ -18,7 +45,31 @@ class CitySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id']
 
-class WeatherForecastSerializer(serializers.ModelSerializer):
+class NearbyCitySerializer(CitySerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(CitySerializer.Meta):
+        fields = CitySerializer.Meta.fields + ['distance_km']
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """Параметры запроса /cities/nearby/"""
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    radius_km = serializers.FloatField(min_value=0, required=False)
+
+class AggregateQuerySerializer(serializers.Serializer):
+    """Параметры запроса /forecasts/aggregate/ (кроме from/to)"""
+    city = serializers.IntegerField(min_value=1, required=False)
+    country = serializers.CharField(max_length=30, required=False)
+    bucket = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+
+    def validate(self, attrs):
+        if ('city' in attrs) == ('country' in attrs):
+            raise serializers.ValidationError('Укажите city или country')
+        return attrs
+
+class WeatherForecastSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     city_name = serializers.CharField(source='city_id.name', read_only=True)
     city_country = serializers.CharField(source='city_id.country', read_only=True)
     
@@ -31,7 +82,7 @@ class WeatherForecastSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at']
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     city_name = serializers.CharField(source='city_id.name', read_only=True)
     city_country = serializers.CharField(source='city_id.country', read_only=True)
     user_username = serializers.CharField(source='user_id.username', read_only=True)
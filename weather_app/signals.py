@@ -1,9 +1,103 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from django.utils import timezone
+from .models import City, Favorite, Profile, WeatherForecast, forecasts_deleted
+from .spatial import invalidate_city_index
+from . import search
+from . import cache as response_cache
+from .images import derivatives_ready
 
 @receiver(post_save, sender=User)
 def create_profile_for_new_user(sender, instance, created, **kwargs):
     if created:
         Profile.objects.get_or_create(user=instance)
+
+
+# Счетчик прогнозов города (City.forecast_count) и метка forecasts_updated_at
+# поддерживаются инкрементально. bulk_create/raw SQL сигналы не вызывают -
+# после них нужен City.objects.refresh_forecast_counts() или команда
+# refresh_forecast_counts.
+def _touch_city_forecasts(city_id, delta=0):
+    cities = City.objects.filter(pk=city_id)
+    changes = {'forecasts_updated_at': timezone.now()}
+    if delta:
+        changes['forecast_count'] = F('forecast_count') + delta
+        if delta < 0:
+            cities = cities.filter(forecast_count__gte=-delta)
+    cities.update(**changes)
+
+@receiver(pre_save, sender=WeatherForecast)
+def remember_forecast_city(sender, instance, **kwargs):
+    # при переносе прогноза в другой город нужно поправить оба счетчика
+    instance._previous_city_id = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._previous_city_id = (
+            WeatherForecast.objects.filter(pk=instance.pk)
+            .values_list('city_id', flat=True)
+            .first()
+        )
+
+@receiver(post_save, sender=WeatherForecast)
+def count_saved_forecast(sender, instance, created, **kwargs):
+    previous_city_id = getattr(instance, '_previous_city_id', None)
+    if created:
+        _touch_city_forecasts(instance.city_id_id, 1)
+    elif previous_city_id is not None and previous_city_id != instance.city_id_id:
+        _touch_city_forecasts(previous_city_id, -1)
+        _touch_city_forecasts(instance.city_id_id, 1)
+    else:
+        _touch_city_forecasts(instance.city_id_id)
+
+# Удаление прогнозов - без post_delete на строку (models.forecasts_deleted):
+# счетчики пересчитываются одним запросом, кэш ответов сбрасывается один раз.
+# При удалении города прогнозы удаляются каскадом одним DELETE без сигналов
+@receiver(forecasts_deleted)
+def count_deleted_forecasts(sender, city_ids, **kwargs):
+    City.objects.refresh_forecast_counts(city_ids)
+    response_cache.bump_version()
+
+
+# Избранное входит в представление города (users), поэтому меняет его updated_at
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def touch_favorite_city(sender, instance, **kwargs):
+    City.objects.filter(pk=instance.city_id_id).update(updated_at=timezone.now())
+
+
+# Пространственный индекс городов перестраивается при следующем запросе
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def reset_city_index(sender, **kwargs):
+    invalidate_city_index()
+
+
+# Теневой FTS индекс поиска городов
+@receiver(post_save, sender=City)
+def index_city_for_search(sender, instance, **kwargs):
+    if search.is_available():
+        search.index_city(instance)
+
+@receiver(post_delete, sender=City)
+def unindex_city_for_search(sender, instance, **kwargs):
+    if search.is_available():
+        search.unindex_city(instance.pk)
+
+
+# Любое изменение данных, попадающих в ответы, сбрасывает кэш ответов
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=WeatherForecast)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_response_cache(sender, **kwargs):
+    response_cache.bump_version()
+
+
+# Готовые копии фото меняют страницу города (srcset): новая метка сбрасывает
+# ETag, а update() сигналов не вызывает - кэш ответов сбрасываем явно
+@receiver(derivatives_ready)
+def touch_city_photo(sender, name, **kwargs):
+    if City.objects.filter(photo=name).update(updated_at=timezone.now()):
+        response_cache.bump_version()
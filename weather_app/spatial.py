@@ -0,0 +1,167 @@
+"""Индекс городов в памяти для поиска ближайших к точке."""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+# половина длины экватора - дальше на сфере ничего нет
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Расстояние по большому кругу от точки до массивов точек (все в радианах)."""
+    sin_dlat = np.sin((lats - lat) / 2)
+    sin_dlon = np.sin((lons - lon) / 2)
+    a = sin_dlat * sin_dlat + math.cos(lat) * np.cos(lats) * sin_dlon * sin_dlon
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CityGridIndex:
+    """
+    Равноугольная сетка по широте/долготе. Города отсортированы по номеру
+    ячейки, поэтому диапазон долгот в одной строке сетки - это один срез
+    массива, который находится через searchsorted. Расстояния до кандидатов
+    считаются векторно.
+    """
+
+    def __init__(self, ids, latitudes, longitudes, cell_deg=1.0):
+        self.cell_deg = cell_deg
+        self.rows = math.ceil(180 / cell_deg)
+        self.cols = math.ceil(360 / cell_deg)
+
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(latitudes, dtype=np.float64)
+        lons = np.asarray(longitudes, dtype=np.float64)
+        cells = self._row(lats) * self.cols + self._col(lons)
+        order = np.argsort(cells, kind="stable")
+
+        self.cells = cells[order]
+        self.ids = ids[order]
+        self.lats = np.radians(lats[order])
+        self.lons = np.radians(lons[order])
+
+    @classmethod
+    def from_queryset(cls, queryset, **kwargs):
+        rows = np.array(
+            list(queryset.values_list("pk", "latitude", "longitude")),
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], **kwargs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, lats):
+        rows = np.floor((np.asarray(lats) + 90) / self.cell_deg).astype(np.int64)
+        return np.clip(rows, 0, self.rows - 1)
+
+    def _col(self, lons):
+        cols = np.floor((np.asarray(lons) + 180) / self.cell_deg).astype(np.int64)
+        return np.mod(cols, self.cols)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Позиции городов в ячейках, покрывающих круг радиуса radius_km."""
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        row_lo = int(self._row(max(lat - dlat, -90)))
+        row_hi = int(self._row(min(lat + dlat, 90)))
+
+        # максимальное отклонение по долготе для круга на сфере
+        cos_lat = math.cos(math.radians(lat))
+        full_circle = (
+            lat - dlat <= -90 or lat + dlat >= 90 or math.sin(angle) >= cos_lat
+        )
+        if full_circle:
+            col_ranges = [(0, self.cols - 1)]
+        else:
+            dlon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+            col_lo = int(self._col(lon - dlon))
+            col_hi = int(self._col(lon + dlon))
+            if col_lo <= col_hi:
+                col_ranges = [(col_lo, col_hi)]
+            else:
+                # круг пересекает антимеридиан
+                col_ranges = [(col_lo, self.cols - 1), (0, col_hi)]
+
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.cols
+        starts, ends = [], []
+        for col_lo, col_hi in col_ranges:
+            starts.append(np.searchsorted(self.cells, rows + col_lo, side="left"))
+            ends.append(np.searchsorted(self.cells, rows + col_hi, side="right"))
+        starts = np.concatenate(starts)
+        lengths = np.concatenate(ends) - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # склеиваем срезы [start, end) без цикла по ячейкам
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(total)
+
+    def _within(self, lat, lon, radius_km):
+        positions = self._candidates(lat, lon, radius_km)
+        distances = haversine_km(
+            math.radians(lat), math.radians(lon),
+            self.lats[positions], self.lons[positions],
+        )
+        mask = distances <= radius_km
+        return positions[mask], distances[mask]
+
+    def query(self, lat, lon, k=10, radius_km=None):
+        """
+        k ближайших городов к точке (в градусах), не дальше radius_km.
+        Возвращает список (id города, расстояние в км) по возрастанию расстояния.
+        """
+        if not len(self) or k < 1:
+            return []
+        if radius_km is not None:
+            positions, distances = self._within(lat, lon, min(radius_km, MAX_DISTANCE_KM))
+        else:
+            # расширяем круг, пока в нем не окажется k городов
+            radius = max(self.cell_deg * 111.0, 1.0)
+            while True:
+                positions, distances = self._within(lat, lon, radius)
+                if len(positions) >= k or radius >= MAX_DISTANCE_KM:
+                    break
+                radius = min(radius * 2, MAX_DISTANCE_KM)
+
+        if len(positions) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+        return [
+            (int(city_id), float(distance))
+            for city_id, distance in zip(self.ids[positions[order]], distances[order])
+        ]
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_city_index():
+    """
+    Индекс строится лениво в каждом процессе. Сигналы City сбрасывают его
+    в текущем процессе, CITY_INDEX_TTL ограничивает устаревание в остальных
+    воркерах gunicorn.
+    """
+    global _index, _index_built_at
+    ttl = getattr(settings, "CITY_INDEX_TTL", 300)
+    index = _index
+    if index is not None and time.monotonic() - _index_built_at < ttl:
+        return index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built_at >= ttl:
+            from .models import City
+
+            _index = CityGridIndex.from_queryset(City.objects.order_by())
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_city_index():
+    global _index
+    _index = None
@@ -0,0 +1,147 @@
+"""
+Локальный провайдер прогнозов для проверки fetch_forecasts без сети
+(manage.py stub_provider).
+
+Отвечает на GET /forecast?lat=&lon=&days= в формате weather_app.providers.
+Прогноз детерминирован координатами и "версией данных", которая меняется
+раз в change_every секунд: пока версия прежняя, условный запрос получает
+304. Задержка, доля ошибок 503 и доля зависших ответов (дольше таймаута
+клиента) задаются параметрами сервера.
+"""
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CONDITIONS = ["Sunny", "Cloudy", "Rain", "Snow", "Fog", "Thunderstorm"]
+
+
+class StubProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, hang_rate=0.0,
+                 hang_seconds=30.0, change_every=0, seed=0):
+        super().__init__(address, StubProviderHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.change_every = change_every
+        self.started = time.time()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "200": 0, "304": 0, "503": 0, "hang": 0}
+
+    def handle_error(self, request, client_address):
+        # клиент не дождался зависшего ответа и закрыл соединение
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def roll(self):
+        with self.lock:
+            return self.rng.random()
+
+    def version(self):
+        if not self.change_every:
+            return 0
+        return int((time.time() - self.started) // self.change_every)
+
+    def version_started(self, version):
+        return self.started + version * self.change_every
+
+
+def forecasts(lat, lon, days, version, start=None):
+    """Детерминированный прогноз точки на days дней от start."""
+    start = start or date.today()
+    rng = random.Random(f"{lat:.4f}:{lon:.4f}:{version}")
+    base = 25 - abs(lat) / 2
+    rows = []
+    for day in range(days):
+        low = round(base + rng.uniform(-8, 4), 1)
+        rows.append({
+            "date": (start + timedelta(days=day)).isoformat(),
+            "temperature_min": low,
+            "temperature_max": round(low + rng.uniform(2, 10), 1),
+            "condition": rng.choice(CONDITIONS),
+            "humidity": rng.randint(20, 100),
+        })
+    return rows
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего провайдера
+    # заголовки и тело пишутся отдельно: без TCP_NODELAY тело ждет
+    # подтверждения заголовков (Nagle + delayed ACK, ~40 мс на ответ)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        url = urlsplit(self.path)
+        if url.path != "/forecast":
+            return self.reply(404, {"detail": "not found"})
+        try:
+            query = parse_qs(url.query)
+            lat = float(query["lat"][0])
+            lon = float(query["lon"][0])
+            days = min(int(query.get("days", ["7"])[0]), 60)
+        except (KeyError, ValueError):
+            return self.reply(400, {"detail": "lat, lon and days are required"})
+
+        if server.latency:
+            time.sleep(server.latency)
+        roll = server.roll()
+        if roll < server.hang_rate:
+            server.count("hang")
+            time.sleep(server.hang_seconds)
+        elif roll < server.hang_rate + server.error_rate:
+            server.count("503")
+            return self.reply(503, {"detail": "try again"}, {"Retry-After": "0"})
+
+        version = server.version()
+        etag = '"%s"' % hashlib.md5(
+            f"{lat:.4f}:{lon:.4f}:{days}:{version}:{date.today()}".encode(), usedforsecurity=False
+        ).hexdigest()
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(server.version_started(version), usegmt=True),
+            "Cache-Control": "max-age=0",
+        }
+        if self.headers.get("If-None-Match") == etag:
+            server.count("304")
+            return self.reply(304, None, headers)
+        server.count("200")
+        self.reply(200, {"forecasts": forecasts(lat, lon, days, version)}, headers)
+
+    def reply(self, status, payload, headers=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def start_in_thread(**options):
+    """Запускает сервер на свободном порту в фоновом потоке (тесты, бенчмарки)."""
+    server = StubProviderServer(("127.0.0.1", 0), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/forecast"
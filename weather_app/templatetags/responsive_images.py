@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, image, alt="", sizes="100vw", style=""):
+    """
+    <picture> с WebP/JPEG копиями изображения по srcset.
+    Пока копии не готовы, отдается оригинал, а страница не кэшируется.
+    """
+    if not image:
+        return ""
+    sets = images.srcsets(image.name)
+    if sets is None:
+        request = context.get("request")
+        if request is not None:
+            request.skip_response_cache = True
+        return format_html('<img src="{}" alt="{}" style="{}">', image.url, alt, style)
+
+    sources = format_html_join(
+        "", '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcset, sizes) for mime, srcset in sets[:-1]),
+    )
+    fallback_mime, fallback_srcset = sets[-1]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" style="{}" loading="lazy"></picture>',
+        sources, image.url, fallback_srcset, sizes, alt, style,
+    )
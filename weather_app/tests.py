@@ -1,10 +1,47 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import City, Favorite, WeatherForecast, Profile
+from .models import City, Favorite, WeatherForecast, Profile, OutgoingEmail, SupportRequest, ForecastFetchState
+from .spatial import CityGridIndex, haversine_km
+from .ingest import ForecastIngestor
+from .resources import WeatherForecastResource
+import tablib
+from . import cache as response_cache
+from . import outbox
+from . import images
+from . import metrics
+from . import stub_provider
+from . import refresh
+from . import search
+from . import downsample
+from .providers import FetchResult, HostRateLimiter, ProviderClient, fetch_forecasts
+from .replica import PIN_COOKIE, PrimaryReplicaRouter, replica_reads, sync_sqlite
+from django.core.cache import cache
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.test import override_settings
+from smtplib import SMTPException
 from django.utils import timezone
-from datetime import timedelta
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test.utils import CaptureQueriesContext
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+import contextvars
+import json
+import numpy as np
+import os
+import tempfile
+import time
+import csv
+import gzip
+import shutil
+from unittest import mock
+from PIL import Image
 
 class ModelTests(TestCase):
     def setUp(self):
@@ -229,4 +266,1750 @@ class FavoriteTests(TestCase):
         favorite = Favorite.objects.create(user_id=self.user1, city_id=self.city)
         self.assertEqual(Favorite.objects.filter(user_id=self.user1).count(), 1)
         self.assertEqual(favorite.user_id, self.user1)
-        self.assertEqual(favorite.city_id, self.city)
\ No newline at end of file
+        self.assertEqual(favorite.city_id, self.city)
+
+class IngestForecastsCommandTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Test City',
+            country='Test Country',
+            latitude=55.7558,
+            longitude=37.6173
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_ingest_ndjson_creates_forecasts(self):
+        """Тест загрузки прогнозов из NDJSON"""
+        path = self.write_file('forecasts.ndjson', '\n'.join(
+            json.dumps({
+                'city': 'Test City',
+                'forecast_date': f'2025-01-{day:02d}',
+                'temperature_min': -5,
+                'temperature_max': 1.5,
+                'condition': 'Snow',
+                'humidity': 80,
+            }) for day in range(1, 11)
+        ))
+        call_command('ingest_forecasts', path, batch_size=3, stdout=StringIO())
+        self.assertEqual(WeatherForecast.objects.filter(city_id=self.city).count(), 10)
+        self.city.refresh_from_db()
+        self.assertEqual(self.city.forecast_count, 10)
+
+    def test_ingest_rerun_updates_instead_of_duplicating(self):
+        """Тест что повторная загрузка обновляет прогноз по (город, дата)"""
+        header = 'city_id,forecast_date,temperature_min,temperature_max,condition,humidity\n'
+        first = self.write_file('a.csv', header + f'{self.city.pk},2025-01-01,1,2,Rain,90\n')
+        second = self.write_file('b.csv', header + f'{self.city.pk},2025-01-01,3,4,Sunny,40\n')
+        call_command('ingest_forecasts', first, stdout=StringIO())
+        call_command('ingest_forecasts', second, stdout=StringIO())
+
+        forecast = WeatherForecast.objects.get(city_id=self.city)
+        self.assertEqual(forecast.condition, 'Sunny')
+        self.assertEqual(forecast.temperature_max, 4)
+
+    def test_ingest_skips_invalid_rows(self):
+        """Тест что строки с неизвестным городом пропускаются с отчетом"""
+        path = self.write_file('bad.ndjson', '\n'.join([
+            json.dumps({'city': 'Nowhere', 'forecast_date': '2025-01-01',
+                        'temperature_min': 1, 'temperature_max': 2,
+                        'condition': 'Rain', 'humidity': 50}),
+            'not json',
+        ]))
+        stdout, stderr = StringIO(), StringIO()
+        call_command('ingest_forecasts', path, stdout=stdout, stderr=stderr)
+        self.assertEqual(WeatherForecast.objects.count(), 0)
+        self.assertIn('Nowhere', stderr.getvalue())
+        self.assertIn('строк/с', stdout.getvalue())
+
+    def test_ingest_skips_non_object_json(self):
+        """Тест что строки JSON не-объекты пропускаются, а не обрывают загрузку"""
+        good = json.dumps({'city': 'Test City', 'forecast_date': '2025-01-01',
+                           'temperature_min': 1, 'temperature_max': 2,
+                           'condition': 'Rain', 'humidity': 50})
+        path = self.write_file('mixed.ndjson', '\n'.join(['[1, 2]', '"x"', '3', good]))
+        stderr = StringIO()
+        call_command('ingest_forecasts', path, stdout=StringIO(), stderr=stderr)
+        self.assertEqual(WeatherForecast.objects.count(), 1)
+        self.assertEqual(stderr.getvalue().count('ожидается объект JSON'), 3)
+
+
+class ForecastDateRangeTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Test City',
+            country='Test Country',
+            latitude=55.7558,
+            longitude=37.6173
+        )
+        start = timezone.make_aware(datetime(2025, 1, 1, 12))
+        for day in range(10):
+            WeatherForecast.objects.create(
+                city_id=self.city,
+                forecast_date=start + timedelta(days=day),
+                temperature_min=0,
+                temperature_max=5,
+                condition='Cloudy',
+                humidity=60
+            )
+
+    def test_duplicate_city_date_rejected(self):
+        """Тест уникальности прогноза по (город, дата)"""
+        forecast = WeatherForecast.objects.first()
+        with self.assertRaises(IntegrityError):
+            WeatherForecast.objects.create(
+                city_id=self.city,
+                forecast_date=forecast.forecast_date,
+                temperature_min=1,
+                temperature_max=2,
+                condition='Rain',
+                humidity=90
+            )
+
+    def test_city_detail_date_range(self):
+        """Тест фильтра ?from=&to= на странице города (границы включительно)"""
+        response = self.client.get(
+            reverse('city_detail', args=[self.city.pk]),
+            {'from': '2025-01-03', 'to': '2025-01-05'}
+        )
+        self.assertEqual(len(response.context['forecasts']), 3)
+
+    def test_api_date_range(self):
+        """Тест фильтра ?from=&to= в API прогнозов"""
+        response = self.client.get('/api/v1/forecasts/', {'from': '2025-01-08'})
+        self.assertEqual(response.status_code, 200)
+        dates = [item['forecast_date'][:10] for item in response.json()['results']]
+        self.assertEqual(dates, ['2025-01-08', '2025-01-09', '2025-01-10'])
+
+    def test_api_invalid_date_returns_400(self):
+        """Тест что некорректная дата в API дает 400"""
+        response = self.client.get('/api/v1/forecasts/', {'to': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CityForecastCountTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Test City',
+            country='Test Country',
+            latitude=55.7558,
+            longitude=37.6173
+        )
+        self.other_city = City.objects.create(
+            name='Other City',
+            country='Test Country',
+            latitude=59.9343,
+            longitude=30.3351
+        )
+
+    def create_forecast(self, city, days=1):
+        return WeatherForecast.objects.create(
+            city_id=city,
+            forecast_date=timezone.now() + timedelta(days=days),
+            temperature_min=1,
+            temperature_max=2,
+            condition='Rain',
+            humidity=90
+        )
+
+    def test_counter_follows_create_move_and_delete(self):
+        """Тест инкрементального обновления счетчика прогнозов"""
+        forecast = self.create_forecast(self.city)
+        self.create_forecast(self.city, days=2)
+        self.city.refresh_from_db()
+        self.assertEqual(self.city.forecast_count, 2)
+
+        forecast.city_id = self.other_city
+        forecast.save()
+        forecast.delete()
+        self.city.refresh_from_db()
+        self.other_city.refresh_from_db()
+        self.assertEqual(self.city.forecast_count, 1)
+        self.assertEqual(self.other_city.forecast_count, 0)
+        self.assertEqual(list(City.active.all()), [self.city])
+
+    def bulk_forecasts(self, city, days):
+        WeatherForecast.objects.bulk_create([
+            WeatherForecast(
+                city_id=city, forecast_date=timezone.now() + timedelta(days=day),
+                temperature_min=1, temperature_max=2, condition='Rain', humidity=90,
+            ) for day in range(days)
+        ])
+
+    def test_city_delete_does_not_load_forecasts(self):
+        """Тест что число запросов при удалении города не зависит от числа прогнозов"""
+        self.bulk_forecasts(self.city, 5)
+        self.bulk_forecasts(self.other_city, 500)
+        with CaptureQueriesContext(connection) as small:
+            self.city.delete()
+        with CaptureQueriesContext(connection) as large:
+            self.other_city.delete()
+        self.assertEqual(len(small), len(large))
+        self.assertLess(len(large), 20)
+        self.assertEqual(WeatherForecast.objects.count(), 0)
+
+    def test_bulk_delete_recounts_once(self):
+        """Тест что массовое удаление пересчитывает счетчики одним запросом на все города"""
+        self.bulk_forecasts(self.city, 50)
+        self.bulk_forecasts(self.other_city, 3)
+        City.objects.refresh_forecast_counts()
+        tenth = WeatherForecast.objects.filter(city_id=self.city).order_by('pk').values_list('pk', flat=True)[9]
+        version = response_cache.get_version()
+        with CaptureQueriesContext(connection) as queries:
+            WeatherForecast.objects.filter(city_id=self.city, pk__gt=tenth).delete()
+        self.assertLess(len(queries), 10)
+        self.city.refresh_from_db()
+        self.other_city.refresh_from_db()
+        self.assertEqual((self.city.forecast_count, self.other_city.forecast_count), (10, 3))
+        self.assertNotEqual(response_cache.get_version(), version)
+
+    def test_active_manager_without_join(self):
+        """Тест что City.active не делает JOIN с таблицей прогнозов"""
+        sql = str(City.active.all().query)
+        self.assertNotIn('weatherforecast', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_refresh_command_after_bulk_load(self):
+        """Тест команды пересчета после загрузки в обход сигналов"""
+        WeatherForecast.objects.bulk_create([
+            WeatherForecast(
+                city_id=self.other_city,
+                forecast_date=timezone.now() + timedelta(days=day),
+                temperature_min=1,
+                temperature_max=2,
+                condition='Rain',
+                humidity=90
+            ) for day in range(3)
+        ])
+        self.assertFalse(City.active.filter(pk=self.other_city.pk).exists())
+        call_command('refresh_forecast_counts', stdout=StringIO())
+        self.other_city.refresh_from_db()
+        self.assertEqual(self.other_city.forecast_count, 3)
+
+
+class NearbyCitiesTests(TestCase):
+    def setUp(self):
+        self.moscow = City.objects.create(
+            name='Moscow', country='Russia', latitude=55.7558, longitude=37.6173
+        )
+        self.tver = City.objects.create(
+            name='Tver', country='Russia', latitude=56.8587, longitude=35.9176
+        )
+        self.spb = City.objects.create(
+            name='Saint Petersburg', country='Russia', latitude=59.9343, longitude=30.3351
+        )
+
+    def test_grid_index_matches_brute_force(self):
+        """Тест что сеточный индекс находит те же города, что и полный перебор"""
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(-90, 90, 2000)
+        lons = rng.uniform(-180, 180, 2000)
+        index = CityGridIndex(np.arange(2000), lats, lons, cell_deg=2.0)
+        for lat, lon in [(0, 179.9), (89.5, 10), (-45, -120), (55.7, 37.6)]:
+            distances = haversine_km(
+                np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+            )
+            expected = list(np.argsort(distances)[:5])
+            self.assertEqual([pk for pk, _ in index.query(lat, lon, k=5)], expected)
+
+    def test_nearby_endpoint(self):
+        """Тест /api/v1/cities/nearby/ с радиусом"""
+        response = self.client.get(
+            '/api/v1/cities/nearby/', {'lat': 55.75, 'lon': 37.62, 'radius_km': 200}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['name'] for c in response.json()], ['Moscow', 'Tver'])
+        self.assertLess(response.json()[0]['distance_km'], 1)
+
+    def test_index_invalidated_on_city_save(self):
+        """Тест что новый город сразу попадает в выдачу"""
+        self.client.get('/api/v1/cities/nearby/', {'lat': 0, 'lon': 0, 'k': 1})
+        City.objects.create(name='Null Island', country='-', latitude=0.1, longitude=0.1)
+        response = self.client.get('/api/v1/cities/nearby/', {'lat': 0, 'lon': 0, 'k': 1})
+        self.assertEqual(response.json()[0]['name'], 'Null Island')
+
+    def test_nearby_validates_params(self):
+        """Тест что некорректные координаты дают 400"""
+        response = self.client.get('/api/v1/cities/nearby/', {'lat': 100, 'lon': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class CitySearchIndexTests(TestCase):
+    def setUp(self):
+        self.moscow = City.objects.create(
+            name='москва', country='Россия', latitude=55.7558, longitude=37.6173
+        )
+        self.yaroslavl = City.objects.create(
+            name='Yaroslavl', country='Russia', latitude=57.6261, longitude=39.8845
+        )
+        self.paris = City.objects.create(
+            name='Paris', country='France', latitude=48.8647, longitude=2.3490
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('city_search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cities'])
+
+    def test_prefix_and_transliteration(self):
+        """Тест префиксного поиска с транслитерацией в обе стороны"""
+        self.assertEqual(self.search('mosk'), [self.moscow])
+        self.assertEqual(self.search('Moskwa'), [self.moscow])
+        self.assertEqual(self.search('Ярос'), [self.yaroslavl])
+
+    def test_ranking_prefers_name_over_country(self):
+        """Тест что совпадение в названии выше совпадения в стране"""
+        City.objects.create(name='Francetown', country='Botswana', latitude=-21.17, longitude=27.5)
+        results = self.search('france')
+        self.assertEqual(results[0].name, 'Francetown')
+        self.assertIn(self.paris, results)
+
+    def test_index_follows_city_updates(self):
+        """Тест синхронизации индекса при изменении и удалении города"""
+        self.paris.name = 'Lutetia'
+        self.paris.save()
+        self.assertEqual(self.search('lutet'), [self.paris])
+        self.paris.delete()
+        self.assertEqual(self.search('lutet'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Тест что спецсимволы FTS5 в запросе не ломают поиск"""
+        self.assertEqual(self.search('"paris* ('), [self.paris])
+
+    def test_broad_query_returns_all_matches(self):
+        """Тест что широкий запрос не теряет совпадений и сортирует их все"""
+        City.objects.bulk_create([
+            City(name=f'Ville {i:03d}', country='France', latitude=0, longitude=0) for i in range(120)
+        ])
+        search.rebuild_index(City.objects.all())
+        self.assertEqual(len(self.search('france')), 121)
+        names = [city.name for city in self.search('france', order='desc')]
+        self.assertEqual(names[:2], ['Ville 119', 'Ville 118'])
+        self.assertEqual(names[-1], 'Paris')
+
+    def test_missing_index_checked_once(self):
+        """Тест что отсутствие индекса запоминается, а не проверяется на каждый запрос"""
+        self.addCleanup(search._available.clear)
+        search._available.clear()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]) as tables:
+            self.assertFalse(search.is_available())
+            self.assertFalse(search.is_available())
+        self.assertEqual(tables.call_count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=55.7558, longitude=37.6173
+        )
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        WeatherForecast.objects.bulk_create([
+            WeatherForecast(
+                city_id=self.city,
+                forecast_date=start + timedelta(hours=day),
+                temperature_min=0,
+                temperature_max=5,
+                condition='Cloudy',
+                humidity=60
+            ) for day in range(45)
+        ])
+        # одинаковые названия - порядок определяет id
+        for i in range(25):
+            City.objects.create(name='Same', country=f'C{i}', latitude=0, longitude=0)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        return ids
+
+    def test_forecasts_cursor_walk_covers_all_rows(self):
+        """Тест обхода всех прогнозов по курсору без пропусков и повторов"""
+        ids = self.walk('/api/v1/forecasts/?page_size=10')
+        expected = list(
+            WeatherForecast.objects.order_by('forecast_date', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cities_cursor_with_duplicate_names(self):
+        """Тест курсора (name, id) при одинаковых названиях"""
+        ids = self.walk('/api/v1/cities/?page_size=7')
+        self.assertEqual(ids, list(City.objects.order_by('name', 'id').values_list('id', flat=True)))
+
+    def test_previous_link_returns_previous_page(self):
+        """Тест перехода на предыдущую страницу"""
+        first = self.client.get('/api/v1/forecasts/?page_size=10').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_page_number_mode_and_invalid_cursor(self):
+        """Тест постраничного режима ?page= и 404 на некорректный курсор"""
+        data = self.client.get('/api/v1/forecasts/', {'page': 2}).json()
+        self.assertEqual(data['count'], 45)
+        response = self.client.get('/api/v1/forecasts/', {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_crafted_cursor_values(self):
+        """Тест что значения курсора неверного типа дают 404, а не 500"""
+        from .pagination import encode_cursor
+        for values in (['garbage', 1], [[1], 1], ['2025-01-01T00:00:00+00:00', 'x'], [None, 1]):
+            cursor = encode_cursor(values)
+            response = self.client.get('/api/v1/forecasts/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, values)
+            # HTML список прогнозов при плохом курсоре показывает первую страницу
+            response = self.client.get(reverse('forecast_list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200, values)
+
+    def test_city_list_cursor_pages(self):
+        """Тест cursor пагинации HTML списка городов"""
+        City.objects.update(forecast_count=1)
+        response = self.client.get(reverse('city_list'))
+        self.assertEqual(len(response.context['cities']), 10)
+        self.assertNotContains(response, 'Страница')
+        seen = [city.pk for city in response.context['cities']]
+        while response.context['page_obj'].has_next:
+            response = self.client.get(reverse('city_list') + '?' + response.context['next_query'])
+            seen += [city.pk for city in response.context['cities']]
+        self.assertEqual(len(seen), 26)
+        self.assertEqual(len(set(seen)), 26)
+
+
+class ApiQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        for i in range(30):
+            city = City.objects.create(
+                name=f'City {i:02d}', country='Test Country', latitude=0, longitude=0
+            )
+            Favorite.objects.create(user_id=self.user, city_id=city)
+            WeatherForecast.objects.create(
+                city_id=city,
+                forecast_date=start + timedelta(days=i),
+                temperature_min=0,
+                temperature_max=5,
+                condition='Cloudy',
+                humidity=60
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url):
+        small = self.count_queries(f'{url}?page_size=2')
+        large = self.count_queries(f'{url}?page_size=25')
+        self.assertEqual(small, large, f'{url}: число запросов растет с размером страницы')
+        return large
+
+    def test_forecasts_constant_queries(self):
+        """Тест что список прогнозов не делает запрос на каждую строку"""
+        # выборка страницы + метки изменений для ETag
+        self.assertLessEqual(self.assert_constant_queries('/api/v1/forecasts/'), 2)
+
+    def test_cities_constant_queries(self):
+        """Тест что users городов подгружаются одним запросом"""
+        self.assertLessEqual(self.assert_constant_queries('/api/v1/cities/'), 2)
+
+    def test_favorites_constant_queries(self):
+        """Тест что избранное не делает запросов на город и пользователя"""
+        self.client.login(username='testuser', password='testpass123')
+        self.assert_constant_queries('/api/v1/favorites/')
+
+    def test_sparse_fieldset_skips_users(self):
+        """Тест ?fields= - лишние поля и их запросы пропускаются"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/cities/', {'fields': 'id,name'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+
+
+class ForecastListPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=0, longitude=0
+        )
+        self.other_city = City.objects.create(
+            name='Other City', country='Test Country', latitude=1, longitude=1
+        )
+        Favorite.objects.create(user_id=self.user, city_id=self.city)
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        for city in (self.city, self.other_city):
+            WeatherForecast.objects.bulk_create([
+                WeatherForecast(
+                    city_id=city,
+                    forecast_date=start + timedelta(days=day),
+                    temperature_min=0,
+                    temperature_max=5,
+                    condition='Cloudy',
+                    humidity=60
+                ) for day in range(60)
+            ])
+
+    def test_forecast_list_is_paginated(self):
+        """Тест что список прогнозов выводится страницами и с избранным по городу"""
+        response = self.client.get(reverse('forecast_list'))
+        forecasts = list(response.context['forecasts'])
+        self.assertEqual(len(forecasts), 50)
+        self.assertTrue(response.context['page_obj'].has_next)
+        self.assertContains(response, 'testuser')
+
+    def test_forecast_list_filters(self):
+        """Тест фильтров по городу и датам"""
+        response = self.client.get(reverse('forecast_list'), {
+            'city': self.city.pk, 'from': '2025-01-11', 'to': '2025-01-20'
+        })
+        forecasts = list(response.context['forecasts'])
+        self.assertEqual(len(forecasts), 10)
+        self.assertTrue(all(f.city_id_id == self.city.pk for f in forecasts))
+
+    def test_forecast_list_query_count_is_constant(self):
+        """Тест что число запросов не зависит от количества строк"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('forecast_list'))
+        # прогнозы, избранное по городам страницы, список городов для фильтра
+        self.assertLessEqual(len(queries), 3)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=0, longitude=0
+        )
+        self.other_city = City.objects.create(
+            name='Other City', country='Test Country', latitude=1, longitude=1
+        )
+        self.forecast = WeatherForecast.objects.create(
+            city_id=self.city,
+            forecast_date=timezone.now(),
+            temperature_min=0,
+            temperature_max=5,
+            condition='Cloudy',
+            humidity=60
+        )
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_city_detail_not_modified(self):
+        """Тест 304 на странице города без выполнения шаблона"""
+        url = reverse('city_detail', args=[self.city.pk])
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+
+    def test_etag_ignores_parameter_order(self):
+        """Тест что равнозначные URL (другой порядок параметров) получают один ETag"""
+        # без кэша ответов (он только для анонимов): ETag считается для каждого URL
+        self.client.force_login(User.objects.create_user(username='reader', password='pass'))
+        first = self.client.get(f'/api/v1/forecasts/?city={self.city.pk}&from=2020-01-01')
+        second = self.client.get(f'/api/v1/forecasts/?from=2020-01-01&city={self.city.pk}')
+        self.assertEqual(first['ETag'], second['ETag'])
+        other = self.client.get(f'/api/v1/forecasts/?city={self.city.pk}&from=2020-01-02')
+        self.assertNotEqual(first['ETag'], other['ETag'])
+
+    def test_forecast_change_invalidates_only_its_city(self):
+        """Тест гранулярности по городу"""
+        url = '/api/v1/forecasts/'
+        mine = self.client.get(url, {'city': self.city.pk})
+        other = self.client.get(url, {'city': self.other_city.pk})
+
+        self.forecast.humidity = 99
+        self.forecast.save()
+
+        self.assertEqual(self.revalidate(url, mine, city=self.city.pk).status_code, 200)
+        self.assertEqual(self.revalidate(url, other, city=self.other_city.pk).status_code, 304)
+
+    def test_query_string_changes_etag(self):
+        """Тест что разные фильтры имеют разные ETag"""
+        first = self.client.get('/api/v1/forecasts/')
+        second = self.client.get('/api/v1/forecasts/', {'fields': 'id'})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_favorite_change_invalidates_city(self):
+        """Тест что изменение избранного меняет ETag города в API"""
+        url = f'/api/v1/cities/{self.city.pk}/'
+        first = self.client.get(url)
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        Favorite.objects.create(user_id=user, city_id=self.city)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=0, longitude=0
+        )
+        self.forecast = WeatherForecast.objects.create(
+            city_id=self.city,
+            forecast_date=timezone.now(),
+            temperature_min=0,
+            temperature_max=5,
+            condition='Cloudy',
+            humidity=60
+        )
+
+    def test_second_anonymous_request_served_from_cache(self):
+        """Тест что повторный анонимный запрос не обращается к базе"""
+        self.client.get(reverse('city_list'), {'sort': 'name'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('city_list'), {'sort': 'name'})
+        self.assertContains(response, 'Test City')
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+    def test_forecast_save_bumps_version(self):
+        """Тест что изменение прогноза сбрасывает кэш API"""
+        url = '/api/v1/forecasts/'
+        self.assertEqual(self.client.get(url).json()['results'][0]['humidity'], 60)
+        self.forecast.humidity = 99
+        self.forecast.save()
+        self.assertEqual(self.client.get(url).json()['results'][0]['humidity'], 99)
+
+    def test_bulk_ingest_bumps_version(self):
+        """Тест что массовая загрузка (без сигналов) сбрасывает кэш"""
+        url = reverse('city_detail', args=[self.city.pk])
+        self.client.get(url)
+        ingestor = ForecastIngestor()
+        ingestor.run([{
+            'city_id': self.city.pk, 'forecast_date': '2030-01-01',
+            'temperature_min': -40, 'temperature_max': -30,
+            'condition': 'Blizzard', 'humidity': 10,
+        }])
+        self.assertContains(self.client.get(url), 'Blizzard')
+
+    def test_authenticated_requests_bypass_cache(self):
+        """Тест что ответы авторизованным не кэшируются"""
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('city_list'))
+        self.client.get(reverse('city_list'))
+        self.assertEqual(response_cache.stats()['hits'], 0)
+
+
+class AsyncReadViewsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=0, longitude=0
+        )
+        Favorite.objects.create(user_id=self.user, city_id=self.city)
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        WeatherForecast.objects.bulk_create([
+            WeatherForecast(
+                city_id=self.city,
+                forecast_date=start + timedelta(days=day),
+                temperature_min=0,
+                temperature_max=5,
+                condition='Cloudy',
+                humidity=60
+            ) for day in range(30)
+        ])
+        City.objects.refresh_forecast_counts()
+
+    async def test_async_city_detail(self):
+        """Тест асинхронной страницы города с фильтром по датам"""
+        response = await self.async_client.get(
+            reverse('async_city_detail', args=[self.city.pk]),
+            {'from': '2025-01-01', 'to': '2025-01-10'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['forecasts']), 10)
+        self.assertContains(response, 'Test City')
+
+    async def test_async_city_detail_not_found(self):
+        response = await self.async_client.get(reverse('async_city_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_city_detail_favorite_for_user(self):
+        """Тест что асинхронная страница видит вошедшего пользователя"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('async_city_detail', args=[self.city.pk]))
+        self.assertTrue(response.context['is_favorite'])
+
+    async def test_async_forecast_list(self):
+        response = await self.async_client.get(reverse('async_forecast_list'), {'city': self.city.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['forecasts']), 30)
+        self.assertContains(response, 'testuser')
+
+    async def test_async_api_matches_sync_api(self):
+        """Тест что асинхронный API отдает те же данные, что и viewset"""
+        params = {'city': self.city.pk, 'from': '2025-01-05', 'page_size': 5}
+        sync_data = (await self.async_client.get('/api/v1/forecasts/', params)).json()
+        async_data = (await self.async_client.get(
+            reverse('async-forecast-list'), params
+        )).json()
+        self.assertEqual(async_data['results'], sync_data['results'])
+        self.assertIsNotNone(async_data['next'])
+
+        sync_city = (await self.async_client.get(f'/api/v1/cities/{self.city.pk}/')).json()
+        async_city = (await self.async_client.get(
+            reverse('async-city-detail', args=[self.city.pk])
+        )).json()
+        self.assertEqual(async_city, sync_city)
+
+    async def test_async_api_errors(self):
+        response = await self.async_client.get(reverse('async-forecast-list'), {'city': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse('async-forecast-list'), {'cursor': 'xx'})
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('async-forecast-detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_api_bytes_match_drf(self):
+        """Тест что тела ответов и ошибок совпадают с DRF побайтно (UTF-8, без экранирования)"""
+        city = await City.objects.acreate(name='Москва', country='Россия', latitude=55.75, longitude=37.62)
+        pairs = [
+            (f'/api/v1/cities/{city.pk}/', reverse('async-city-detail', args=[city.pk]), {}),
+            ('/api/v1/forecasts/999/', reverse('async-forecast-detail', args=[999]), {}),
+            ('/api/v1/cities/999/', reverse('async-city-detail', args=[999]), {}),
+            ('/api/v1/forecasts/', reverse('async-forecast-list'), {'city': 'abc'}),
+            ('/api/v1/forecasts/', reverse('async-forecast-list'), {'cursor': 'xx'}),
+        ]
+        for sync_url, async_url, params in pairs:
+            sync_response = await self.async_client.get(sync_url, params)
+            async_response = await self.async_client.get(async_url, params)
+            self.assertEqual(async_response.status_code, sync_response.status_code, sync_url)
+            self.assertEqual(async_response.content, sync_response.content, sync_url)
+        response = await self.async_client.get(reverse('async-city-detail', args=[city.pk]))
+        self.assertIn('"name":"Москва"'.encode(), response.content)
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    """locmem backend, считающий открытые соединения"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('connection refused')
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='staff', password='testpass123', is_staff=True
+        )
+        CountingEmailBackend.opened = 0
+
+    def test_support_request_is_queued_not_sent(self):
+        """Тест что форма поддержки только ставит письмо в очередь"""
+        response = self.client.post(reverse('support_request'), {
+            'name': 'Иван', 'email': 'ivan@example.com',
+            'subject': 'Вопрос', 'message': 'Текст'
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipients, ['support@meteoservice.com'])
+        self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+
+    def test_support_response_is_queued(self):
+        support_request = SupportRequest.objects.create(
+            name='Иван', email='ivan@example.com', subject='Вопрос', message='Текст'
+        )
+        self.client.login(username='staff', password='testpass123')
+        self.client.post(reverse('support_request_detail', args=[support_request.pk]), {
+            'admin_response': 'Ответ', 'status': 'resolved'
+        })
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().recipients, ['ivan@example.com'])
+
+    @override_settings(EMAIL_BACKEND='weather_app.tests.CountingEmailBackend')
+    def test_deliver_outbox_uses_one_connection(self):
+        """Тест что пачка писем уходит через одно соединение"""
+        for i in range(5):
+            outbox.enqueue(f'Письмо {i}', 'Текст', ['user@example.com'])
+        out = StringIO()
+        call_command('deliver_outbox', stdout=out)
+        self.assertIn('Отправлено писем: 5', out.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.STATUS_SENT).exists())
+
+        # отправленные письма повторно не уходят
+        call_command('deliver_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(EMAIL_BACKEND='weather_app.tests.FailingEmailBackend',
+                       OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=60)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        email = outbox.enqueue('Письмо', 'Текст', ['user@example.com'])
+        self.assertEqual(outbox.deliver(), (0, 1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('connection refused', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # до срока повтора письмо не берется
+        self.assertEqual(outbox.deliver(), (0, 0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.deliver(), (0, 0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_FAILED)
+
+    def test_retry_delay_grows_exponentially(self):
+        with self.settings(OUTBOX_RETRY_DELAY=10):
+            self.assertEqual(outbox.retry_delay(1), timedelta(seconds=10))
+            self.assertEqual(outbox.retry_delay(3), timedelta(seconds=40))
+            self.assertEqual(outbox.retry_delay(20), timedelta(hours=1))
+
+
+class ImageDerivativesTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.city = City.objects.create(
+            name='Test City', country='Test Country', latitude=0, longitude=0,
+            photo=self.upload('city.png', 800, 400)
+        )
+
+    def upload(self, name, width, height):
+        buffer = BytesIO()
+        Image.new('RGBA', (width, height), (200, 100, 50, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_city_page_uses_srcset(self):
+        """Тест что копии создаются при первом показе и попадают в srcset"""
+        response = self.client.get(reverse('city_detail', args=[self.city.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '/160.jpg 160w')
+        self.assertContains(response, '/640.webp 640w')
+        for width in images.WIDTHS:
+            for extension in ('webp', 'jpg'):
+                path = os.path.join(
+                    self.media_root, images.derivative_name(self.city.photo.name, width, extension)
+                )
+                self.assertTrue(os.path.exists(path))
+        with Image.open(os.path.join(
+            self.media_root, images.derivative_name(self.city.photo.name, 320, 'jpg')
+        )) as derivative:
+            self.assertEqual(derivative.size, (320, 160))
+            self.assertEqual(derivative.mode, 'RGB')
+
+    async def test_async_city_page_with_photo(self):
+        """Тест что асинхронная страница с фото создает копии без записи в базу из шаблона"""
+        response = await self.async_client.get(reverse('async_city_detail', args=[self.city.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/640.webp 640w')
+
+    def test_small_image_is_not_upscaled(self):
+        self.city.photo = self.upload('small.png', 100, 50)
+        self.city.save()
+        sets = images.srcsets(self.city.photo.name)
+        self.assertEqual(dict(sets)['image/jpeg'].split()[-1], '100w')
+
+    def test_pending_derivatives_skip_response_cache(self):
+        """Тест что страница без готовых копий отдает оригинал и не кэшируется"""
+        url = reverse('city_detail', args=[self.city.pk])
+        with self.settings(IMAGE_WORKERS=2), mock.patch.object(images, 'schedule') as schedule:
+            response = self.client.get(url)
+        schedule.assert_called_once_with(self.city.photo.name)
+        self.assertNotContains(response, 'srcset')
+        self.assertContains(response, self.city.photo.url)
+        self.assertEqual(response_cache.stats()['hits'], 0)
+
+        # после готовности копий страница отдает srcset
+        self.assertContains(self.client.get(url), 'srcset')
+
+    def test_cleanup_removes_orphaned_derivatives(self):
+        old_name = self.city.photo.name
+        images.srcsets(old_name)
+        self.city.photo = self.upload('new.png', 400, 200)
+        self.city.save()
+        images.srcsets(self.city.photo.name)
+
+        out = StringIO()
+        call_command('cleanup_image_derivatives', stdout=out)
+        self.assertIn('Удалено каталогов копий: 1', out.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, images.derivative_dir(old_name))))
+        self.assertIsNotNone(images.load_manifest(self.city.photo.name))
+
+
+class ForecastResourceImportTests(TestCase):
+    def setUp(self):
+        self.cities = [
+            City.objects.create(name=f'City {i}', country='Test', latitude=0, longitude=0)
+            for i in range(5)
+        ]
+
+    def dataset(self, rows):
+        dataset = tablib.Dataset(headers=[
+            'city', 'forecast_date', 'temperature_min', 'temperature_max', 'condition', 'humidity'
+        ])
+        for row in rows:
+            dataset.append(row)
+        return dataset
+
+    def rows(self, days, temperature=1):
+        return [
+            [city.name, (datetime(2025, 1, 1) + timedelta(days=day)).strftime('%Y-%m-%d'),
+             temperature, temperature + 5, 'Sunny', 50]
+            for city in self.cities for day in range(days)
+        ]
+
+    def test_bulk_import_uses_constant_queries(self):
+        """Тест что число запросов не зависит от числа строк"""
+        progress = []
+        resource = WeatherForecastResource(progress=lambda done, total: progress.append(done))
+        with CaptureQueriesContext(connection) as queries:
+            result = resource.import_data(self.dataset(self.rows(600)))
+        self.assertFalse(result.has_errors())
+        self.assertEqual(WeatherForecast.objects.count(), 3000)
+        self.assertEqual(progress, [1000, 2000, 3000])
+        # SQLite ограничивает число параметров, поэтому пачка уходит несколькими
+        # INSERT, но запросов на порядки меньше, чем строк
+        self.assertLess(len(queries), 60)
+        self.assertEqual(
+            set(City.objects.values_list('forecast_count', flat=True)), {600}
+        )
+
+    def test_reimport_updates_existing_forecasts(self):
+        WeatherForecastResource().import_data(self.dataset(self.rows(3)))
+        result = WeatherForecastResource().import_data(self.dataset(self.rows(3, temperature=7)))
+        self.assertFalse(result.has_errors())
+        self.assertEqual(WeatherForecast.objects.count(), 15)
+        self.assertEqual(set(WeatherForecast.objects.values_list('temperature_min', flat=True)), {7})
+
+    def test_duplicate_rows_counted_once(self):
+        """Тест что повтор (город, дата) в пачке не завышает число записанных"""
+        rows = self.rows(2)
+        rows += [row[:2] + [9, 14, 'Rain', 80] for row in rows[:3]]
+        progress = []
+        resource = WeatherForecastResource(progress=lambda done, total: progress.append((done, total)))
+        result = resource.import_data(self.dataset(rows))
+        self.assertFalse(result.has_errors())
+        self.assertEqual(resource.written, 10)
+        self.assertEqual(progress, [(10, 13)])
+        self.assertEqual(WeatherForecast.objects.filter(temperature_min=9).count(), 3)
+
+    def test_unknown_cities_reported_once(self):
+        """Тест что неизвестные города дают одну ошибку со списком названий"""
+        rows = self.rows(2) + [['Atlantis', '2025-01-01', 0, 1, 'Rain', 90]] * 3
+        rows.append(['Nowhere', '2025-01-02', 0, 1, 'Rain', 90])
+        result = WeatherForecastResource().import_data(self.dataset(rows))
+        self.assertTrue(result.has_errors())
+        self.assertEqual(len(result.base_errors), 1)
+        self.assertEqual(result.row_errors(), [])
+        message = str(result.base_errors[0].error)
+        self.assertIn('Неизвестные города (2)', message)
+        self.assertIn('Atlantis (первая строка 11)', message)
+        self.assertIn('Nowhere', message)
+        self.assertEqual(WeatherForecast.objects.count(), 0)
+
+    def test_invalid_rows_reported_per_row(self):
+        """Тест что строка с пустой или некорректной ячейкой не обрывает пачку"""
+        rows = self.rows(2)
+        rows[1][2] = ''
+        rows[3][5] = 'влажно'
+        rows[4][1] = ''
+        rows[5][0] = ''
+        result = WeatherForecastResource().import_data(self.dataset(rows))
+        self.assertFalse(result.has_errors())
+        self.assertEqual(
+            [(row.number, sorted(row.field_specific_errors)) for row in result.invalid_rows],
+            [(2, ['temperature_min']), (4, ['humidity']), (5, ['forecast_date']), (6, ['city_id'])],
+        )
+        self.assertEqual(WeatherForecast.objects.count(), 6)
+
+    def test_ambiguous_city_names_rejected(self):
+        City.objects.create(name='City 0', country='Other', latitude=1, longitude=1)
+        result = WeatherForecastResource().import_data(self.dataset(self.rows(1)))
+        self.assertIn('Неоднозначные названия', str(result.base_errors[0].error))
+
+
+class ForecastExportTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(
+            name='Москва', country='Россия', latitude=55.75, longitude=37.62
+        )
+        self.other_city = City.objects.create(
+            name='Other City', country='Test Country', latitude=1, longitude=1
+        )
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        for city in (self.city, self.other_city):
+            WeatherForecast.objects.bulk_create([
+                WeatherForecast(
+                    city_id=city,
+                    forecast_date=start + timedelta(days=day),
+                    temperature_min=day,
+                    temperature_max=day + 5,
+                    condition='Cloudy',
+                    humidity=60
+                ) for day in range(30)
+            ])
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_export_csv(self):
+        response = self.client.get('/api/v1/forecasts/export.csv', {'city': self.city.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(self.content(response).decode().splitlines()))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[0]['city_name'], 'Москва')
+        self.assertEqual(rows[3]['temperature_min'], '3.0')
+        self.assertEqual(
+            [row['forecast_date'] for row in rows], sorted(row['forecast_date'] for row in rows)
+        )
+
+    def test_export_ndjson_with_date_filter(self):
+        response = self.client.get('/api/v1/forecasts/export.ndjson', {
+            'from': '2025-01-11', 'to': '2025-01-20'
+        })
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual(len(lines), 20)
+        row = json.loads(lines[0])
+        self.assertEqual(row['forecast_date'][:10], '2025-01-11')
+        self.assertEqual(set(row), {
+            'id', 'city_id', 'city_name', 'city_country', 'forecast_date',
+            'temperature_min', 'temperature_max', 'condition', 'humidity'
+        })
+
+    def test_export_gzip(self):
+        """Тест сжатия на лету при Accept-Encoding: gzip"""
+        response = self.client.get('/api/v1/forecasts/export.csv', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        lines = gzip.decompress(self.content(response)).decode().splitlines()
+        self.assertEqual(len(lines), 61)
+
+    def test_export_gzip_refused_with_zero_quality(self):
+        """Тест что gzip;q=0 отключает сжатие, а q учитывается и для *"""
+        response = self.client.get('/api/v1/forecasts/export.csv', HTTP_ACCEPT_ENCODING='br, gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(self.content(response).decode().splitlines()), 61)
+
+        from . import export
+        self.assertTrue(export.accepts_gzip('deflate, GZIP ; q=0.5'))
+        self.assertTrue(export.accepts_gzip('*'))
+        self.assertFalse(export.accepts_gzip('*;q=0'))
+        self.assertFalse(export.accepts_gzip('x-gzip, identity'))
+        self.assertFalse(export.accepts_gzip(''))
+
+    def test_export_reads_in_chunks(self):
+        """Тест что строки читаются курсором пачками, а не одним списком"""
+        from . import export
+        chunks = list(export.export_rows(WeatherForecast.objects.all(), chunk_size=25))
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 10])
+
+    def test_export_empty_and_errors(self):
+        response = self.client.get('/api/v1/forecasts/export.csv', {'from': '2030-01-01'})
+        self.assertEqual(self.content(response).decode().strip(), ','.join([
+            'id', 'city_id', 'city_name', 'city_country', 'forecast_date',
+            'temperature_min', 'temperature_max', 'condition', 'humidity'
+        ]))
+        self.assertEqual(
+            self.client.get('/api/v1/forecasts/export.csv', {'city': 'abc'}).status_code, 400
+        )
+        self.assertEqual(self.client.get('/api/v1/forecasts/export.xml').status_code, 404)
+
+
+class SqliteProfileTests(TestCase):
+    def test_production_profile_pragmas(self):
+        """Тест что профиль production включает WAL и прагмы на соединении"""
+        from django.conf import settings
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        path = os.path.join(tempfile.mkdtemp(), 'profile.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        database = connections.configure_settings({'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+            **settings.SQLITE_PRODUCTION_PROFILE,
+        }})['default']
+        wrapper = DatabaseWrapper(database, alias='profile')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'cache_size', 'busy_timeout', 'mmap_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)  # NORMAL
+        self.assertEqual(pragmas['cache_size'], -65536)
+        self.assertEqual(pragmas['busy_timeout'], 10000)
+        self.assertEqual(pragmas['mmap_size'], 268435456)
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+
+@override_settings(REPLICA_READS=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer', password='testpass123')
+        self.city = City.objects.create(name='Replica City', country='RC', latitude=1, longitude=2)
+
+    def test_router_uses_replica_only_inside_replica_reads(self):
+        """Тест что в реплику идут только чтения помеченных view вне транзакции"""
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(City), 'default')
+
+        @replica_reads
+        def view(request):
+            from django.http import HttpResponse
+            aliases = [router.db_for_read(City)]
+            with transaction.atomic():
+                aliases.append(router.db_for_read(City))
+            return HttpResponse(','.join(aliases))
+
+        # новый контекст: записи в setUp закрепили текущий за основной базой
+        run = contextvars.Context().run
+        self.assertEqual(run(view, RequestFactory().get('/')).content, b'replica,default')
+        self.assertEqual(run(view, RequestFactory().post('/')).content, b'default,default')
+
+    def test_api_reads_go_to_replica(self):
+        """Тест что GET списков API выполняет запросы в реплике"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get('/api/v1/cities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Replica City')
+        self.assertGreater(len(replica), 0)
+        self.assertEqual(len(primary), 0)
+
+    def test_city_search_reads_replica(self):
+        """Тест что поиск читает FTS индекс из той же базы, что и города"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('city_search'), {'q': 'replica'})
+        self.assertEqual(list(response.context['cities']), [self.city])
+        self.assertTrue(any('weather_app_city_fts' in q['sql'] for q in replica))
+        self.assertEqual(len(primary), 0)
+
+    def test_write_pins_user_to_primary(self):
+        """Тест что после записи cookie закрепляет чтения за основной базой"""
+        self.client.force_login(self.user)
+        response = self.client.post('/api/v1/cities/', {
+            'name': 'New City', 'country': 'NC', 'latitude': 3, 'longitude': 4,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get('/api/v1/cities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
+        self.assertIn('New City', [c['name'] for c in response.json()['results']])
+
+    def test_sync_replica_requires_separate_file(self):
+        """Тест что sync_replica не копирует базу саму в себя"""
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', verbosity=0)
+
+    def test_sync_sqlite_copies_database(self):
+        """Тест копирования базы SQLite в файл реплики"""
+        import sqlite3
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = sqlite3.connect(os.path.join(directory, 'primary.sqlite3'))
+        self.addCleanup(source.close)
+        source.execute('CREATE TABLE t (x INTEGER)')
+        source.execute('INSERT INTO t VALUES (1), (2)')
+        source.commit()
+
+        target = os.path.join(directory, 'replica.sqlite3')
+        sync_sqlite(source, target)
+        copy = sqlite3.connect(target)
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.execute('SELECT count(*) FROM t').fetchone()[0], 2)
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class PerformanceTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name='Timed City', country='TC', latitude=0, longitude=0)
+        WeatherForecast.objects.create(
+            city_id=self.city, forecast_date=timezone.now(),
+            temperature_min=0, temperature_max=5, condition='Sunny', humidity=50
+        )
+
+    def get_record(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_page_timings(self):
+        """Тест Server-Timing и строки лога для HTML страницы"""
+        with self.assertLogs('weather_app.perf', 'INFO') as logs:
+            response = self.client.get(reverse('city_detail', args=[self.city.pk]))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'ser;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        record = self.get_record(logs)
+        self.assertEqual(record['view'], 'city_detail')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertIn(f"SQL ({record['db_queries']} queries)", header)
+        self.assertGreater(record['tpl_ms'], 0)
+        self.assertEqual(record['ser_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['tpl_ms'])
+
+    def test_api_serializer_time(self):
+        """Тест что для API учитывается время сериализаторов"""
+        with self.assertLogs('weather_app.perf', 'INFO') as logs:
+            self.client.get('/api/v1/forecasts/')
+        record = self.get_record(logs)
+        self.assertGreater(record['ser_ms'], 0)
+        self.assertEqual(record['tpl_ms'], 0)
+
+    async def test_async_view_queries(self):
+        """Тест что запросы асинхронных view тоже учитываются"""
+        with self.assertLogs('weather_app.perf', 'INFO') as logs:
+            response = await self.async_client.get(reverse('async-forecast-list'))
+        self.assertIn('Server-Timing', response)
+        self.assertGreater(self.get_record(logs)['db_queries'], 0)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_skip_timings(self):
+        with self.assertNoLogs('weather_app.perf', 'INFO'):
+            response = self.client.get(reverse('city_detail', args=[self.city.pk]))
+        self.assertNotIn('Server-Timing', response)
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token')
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        City.objects.create(name='Metric City', country='MC', latitude=0, longitude=0)
+
+    def test_request_metrics_by_url_name(self):
+        """Тест счетчиков и гистограмм по имени URL"""
+        self.client.get(reverse('city_list'))
+        self.client.get(reverse('city_list'))
+        self.client.get('/api/v1/cities/')
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn(
+            'meteoservice_http_requests_total{view="city_list",method="GET",status="200"} 2', body
+        )
+        self.assertIn(
+            'meteoservice_http_requests_total{view="city-list",method="GET",status="200"} 1', body
+        )
+        self.assertIn('meteoservice_http_request_duration_seconds_count{view="city_list"} 2', body)
+        self.assertIn('meteoservice_http_request_duration_seconds_bucket{view="city_list",le="+Inf"} 2', body)
+        self.assertIn('meteoservice_db_queries_per_request_count{view="city-list"} 1', body)
+        self.assertIn('meteoservice_response_cache_misses_total', body)
+
+    def test_aggregates_worker_files(self):
+        """Тест суммирования метрик других воркеров и архива завершившихся"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        other = {
+            'counters': [['http_requests_total', ['city_list', 'GET', '200'], 5]],
+            'histograms': [['db_queries_per_request', ['city_list'], [0, 5] + [0] * 7 + [5, 5]]],
+        }
+        with open(os.path.join(directory, '999999.json'), 'w') as f:
+            json.dump(other, f)
+
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('city_list'))
+            total = metrics.collect()
+            self.assertEqual(total['counters'][('http_requests_total', ('city_list', 'GET', '200'))], 6)
+            self.assertEqual(total['histograms'][('db_queries_per_request', ('city_list',))][-1], 6)
+
+            # завершившийся воркер переносится в архив, сумма не меняется
+            metrics.archive(directory, 999999)
+            self.assertFalse(os.path.exists(os.path.join(directory, '999999.json')))
+            total = metrics.collect()
+            self.assertEqual(total['counters'][('http_requests_total', ('city_list', 'GET', '200'))], 6)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_requires_token_or_staff(self):
+        """Тест что метрики отдаются только сборщику с токеном и сотрудникам"""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        User.objects.create_user(username='user', password='pass')
+        self.client.login(username='user', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        User.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+class ForecastFetchTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            City.objects.create(name=f'Fetch {i}', country='FC', latitude=10 * i, longitude=20 * i)
+
+    def start_provider(self, **options):
+        server, url = stub_provider.start_in_thread(**options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, url
+
+    def fetch(self, url, **options):
+        client = ProviderClient(url=url, workers=4, rate=0, **options)
+        self.addCleanup(client.close)
+        return fetch_forecasts(City.objects.order_by('pk'), client, workers=4, days=5, batch_size=2)
+
+    def test_fetch_and_conditional_refetch(self):
+        """Тест загрузки прогнозов и повторного условного запроса (304)"""
+        server, url = self.start_provider()
+        stats = self.fetch(url)
+        self.assertEqual((stats.cities, stats.updated, stats.failed), (3, 3, 0))
+        self.assertEqual(WeatherForecast.objects.count(), 15)
+        self.assertEqual(City.objects.filter(forecast_count=5).count(), 3)
+        self.assertEqual(ForecastFetchState.objects.exclude(etag='').count(), 3)
+
+        stats = self.fetch(url)
+        self.assertEqual((stats.not_modified, stats.ingest.written), (3, 0))
+        self.assertEqual(server.counts['304'], 3)
+        self.assertEqual(WeatherForecast.objects.count(), 15)
+
+    def test_retries_then_records_failure(self):
+        """Тест повторов после 503 и учета ошибки в состоянии города"""
+        server, url = self.start_provider(error_rate=1.0)
+        stats = self.fetch(url, retries=1, backoff=0)
+        self.assertEqual((stats.failed, stats.requests), (3, 6))
+        self.assertEqual(server.counts['503'], 6)
+        state = ForecastFetchState.objects.get(city__name='Fetch 0')
+        self.assertEqual((state.failures, state.last_error), (1, 'HTTP 503'))
+        self.assertEqual(WeatherForecast.objects.count(), 0)
+
+    def test_timeout(self):
+        """Тест что зависший ответ провайдера обрывается таймаутом"""
+        _, url = self.start_provider(hang_rate=1.0, hang_seconds=2)
+        started = time.monotonic()
+        stats = self.fetch(url, timeout=0.2, retries=0)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(stats.failed, 3)
+        self.assertIn('Timeout', ForecastFetchState.objects.first().last_error)
+
+    def test_state_created_by_hit_flush_during_fetch(self):
+        """Тест что состояние, созданное сбросом просмотров во время загрузки, обновляется"""
+        refresh._hits.clear()
+        _, url = self.start_provider()
+        client = ProviderClient(url=url, workers=4, rate=0)
+        self.addCleanup(client.close)
+
+        def flush_hit(result):
+            # как record_hit со страницы города, пока идет загрузка
+            refresh._hits[City.objects.get(name='Fetch 2').pk] = 1
+            refresh.flush_hits()
+
+        stats = fetch_forecasts(
+            City.objects.order_by('pk'), client, workers=4, days=5, batch_size=2, on_result=flush_hit,
+        )
+        self.assertEqual((stats.cities, stats.failed), (3, 0))
+        state = ForecastFetchState.objects.get(city__name='Fetch 2')
+        self.assertNotEqual(state.etag, '')
+        # просмотры всех трех сбросов сохранились
+        self.assertEqual(round(state.recent_hits), 3)
+
+    def test_state_saved_only_after_rows_written(self):
+        """Тест что ETag не сохраняется для города, чьи прогнозы не записались"""
+        _, url = self.start_provider()
+        write = ForecastIngestor.write
+        calls = []
+
+        def failing_write(ingestor, forecasts):
+            calls.append(len(forecasts))
+            if len(calls) == 4:
+                raise IntegrityError('database is locked')
+            write(ingestor, forecasts)
+
+        with mock.patch.object(ForecastIngestor, 'write', autospec=True, side_effect=failing_write):
+            with self.assertRaises(IntegrityError):
+                self.fetch(url)
+        # пачки по 2 строки: записаны 6 строк - все 5 прогнозов одного города
+        saved = ForecastFetchState.objects.exclude(etag='')
+        self.assertEqual(saved.count(), 1)
+        self.assertEqual(WeatherForecast.objects.filter(city_id=saved.get().city_id).count(), 5)
+        self.assertEqual(ForecastFetchState.objects.filter(refreshed_at__isnull=False).count(), 1)
+
+    def fetch_results(self, *results):
+        """fetch_forecasts с клиентом, который отдает готовые FetchResult по городам"""
+        by_city = dict(zip(City.objects.order_by('pk').values_list('pk', flat=True), results))
+        client = mock.Mock()
+        client.fetch.side_effect = lambda city_id, *args: by_city[city_id]
+        cities = City.objects.filter(pk__in=by_city).order_by('pk')
+        return fetch_forecasts(cities, client, workers=2, batch_size=2)
+
+    def test_validators_kept_when_missing_or_rows_rejected(self):
+        """Тест что 304 без ETag не стирает валидаторы, а ответ без корректных строк их не сохраняет"""
+        first, second = City.objects.order_by('pk')[:2]
+        ForecastFetchState.objects.create(city=first, etag='"v1"', last_modified='Mon, 01 Jan 2025 00:00:00 GMT')
+        self.fetch_results(
+            FetchResult(first.pk, status=304),
+            FetchResult(second.pk, status=200, etag='"bad"', forecasts=[{'date': 'завтра'}, 'x']),
+        )
+        state = ForecastFetchState.objects.get(city=first)
+        self.assertEqual((state.etag, state.last_modified), ('"v1"', 'Mon, 01 Jan 2025 00:00:00 GMT'))
+        self.assertIsNotNone(state.refreshed_at)
+        state = ForecastFetchState.objects.get(city=second)
+        self.assertEqual((state.etag, state.refreshed_at), ('', None))
+        self.assertEqual(state.last_error, 'нет корректных прогнозов')
+
+    def test_retry_after_is_bounded(self):
+        """Тест что Retry-After (секунды или HTTP-дата) не дольше таймаута запроса"""
+        client = ProviderClient(url='http://provider.invalid/', timeout=2, backoff=0.5)
+        self.addCleanup(client.close)
+
+        def delay(value):
+            return client._retry_after(mock.Mock(headers={'Retry-After': value}), attempt=1)
+
+        self.assertEqual(delay('86400'), 2)
+        self.assertEqual(delay('1'), 1)
+        self.assertEqual(delay('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        future = timezone.now() + timedelta(hours=1)
+        self.assertEqual(delay(future.strftime('%a, %d %b %Y %H:%M:%S GMT')), 2)
+        self.assertEqual(delay('скоро'), 0.5)
+
+    def test_rate_limit_per_host(self):
+        limiter = HostRateLimiter(rate=50)
+        started = time.monotonic()
+        for _ in range(11):
+            limiter.wait('provider')
+        limiter.wait('other-host')
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_command(self):
+        _, url = self.start_provider()
+        out = StringIO()
+        call_command('fetch_forecasts', url=url, days=3, workers=2, rate=0, stdout=out)
+        self.assertIn('Городов: 3 (обновлено 3', out.getvalue())
+        self.assertEqual(WeatherForecast.objects.count(), 9)
+
+class RefreshSchedulerTests(TestCase):
+    def setUp(self):
+        refresh._hits.clear()
+        now = timezone.now()
+        self.old = City.objects.create(name='Old', country='RF', latitude=1, longitude=1)
+        self.liked = City.objects.create(name='Liked', country='RF', latitude=2, longitude=2)
+        self.fresh = City.objects.create(name='Fresh', country='RF', latitude=3, longitude=3)
+        self.never = City.objects.create(name='Never', country='RF', latitude=4, longitude=4)
+        for city, age in ((self.old, 4), (self.liked, 4), (self.fresh, 1)):
+            ForecastFetchState.objects.create(city=city, refreshed_at=now - timedelta(hours=age))
+        for i in range(2):
+            user = User.objects.create_user(username=f'fan{i}', password='pass')
+            Favorite.objects.create(user_id=user, city_id=self.liked)
+
+    def test_plan_ranks_by_demand_and_age(self):
+        """Тест приоритета очереди: без данных, затем с избранным, свежие не в очереди"""
+        self.assertEqual(refresh.plan(10), [self.never, self.liked, self.old])
+        self.assertEqual(refresh.plan(2), [self.never, self.liked])
+
+    def test_page_views_raise_priority(self):
+        ForecastFetchState.objects.filter(city=self.old).update(recent_hits=10, hits_at=timezone.now())
+        self.assertEqual(refresh.plan(2), [self.never, self.old])
+
+    @override_settings(CITY_HITS_FLUSH_INTERVAL=3600)
+    def test_flush_hits_decays_previous_count(self):
+        """Тест записи просмотров: прежний счетчик затухает за период полураспада"""
+        half_life_ago = timezone.now() - timedelta(seconds=settings.CITY_HITS_HALF_LIFE)
+        ForecastFetchState.objects.filter(city=self.old).update(recent_hits=8, hits_at=half_life_ago)
+        refresh.record_hit(self.old.pk)
+        refresh.record_hit(self.never.pk)
+        refresh.record_hit(self.never.pk)
+        self.assertFalse(ForecastFetchState.objects.filter(city=self.never).exists())
+
+        refresh.flush_hits()
+        self.assertAlmostEqual(ForecastFetchState.objects.get(city=self.old).recent_hits, 5, places=2)
+        self.assertEqual(ForecastFetchState.objects.get(city=self.never).recent_hits, 2)
+
+    @override_settings(CITY_HITS_FLUSH_INTERVAL=0)
+    def test_city_page_counts_hits(self):
+        """Тест учета просмотров страницы города, в том числе ответов из кэша"""
+        url = reverse('city_detail', args=[self.fresh.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(round(ForecastFetchState.objects.get(city=self.fresh).recent_hits), 2)
+
+    def test_queue_stats(self):
+        stats = refresh.queue_stats()
+        self.assertEqual((stats['total'], stats['queue_depth'], stats['never_fetched']), (4, 3, 1))
+        self.assertEqual(stats['staleness'][3600], 0)
+        self.assertEqual(stats['staleness'][3 * 3600], 1)
+        self.assertEqual(stats['staleness'][24 * 3600], 3)
+
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token'):
+            body = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token'
+            ).content.decode()
+        self.assertIn('meteoservice_refresh_queue_depth 3', body)
+        self.assertIn('meteoservice_forecast_staleness_cities{le="+Inf"} 3', body)
+
+    def test_command_refreshes_within_budget(self):
+        server, url = stub_provider.start_in_thread()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        out = StringIO()
+        call_command('refresh_forecasts', url=url, budget=2, days=3, rate=0, stdout=out)
+        self.assertIn('Обновлено городов: 2', out.getvalue())
+        self.assertIn('В очереди: 1 из 4', out.getvalue())
+        self.assertEqual(
+            set(City.objects.filter(forecast_count=3).values_list('name', flat=True)), {'Never', 'Liked'}
+        )
+
+    def test_loop_survives_failed_cycle(self):
+        """Тест что ошибка цикла записывается в журнал, а --loop продолжает работу"""
+        cycles = mock.Mock(side_effect=[IntegrityError('UNIQUE constraint failed'), None, KeyboardInterrupt])
+        with mock.patch('weather_app.management.commands.refresh_forecasts.Command.run_cycle', cycles), \
+                self.assertLogs('weather_app.management.commands.refresh_forecasts', 'ERROR'):
+            call_command('refresh_forecasts', url='http://provider.invalid/', loop=True, interval=0)
+        self.assertEqual(cycles.call_count, 3)
+
+        # без --loop ошибка не скрывается
+        with mock.patch('weather_app.management.commands.refresh_forecasts.Command.run_cycle',
+                        side_effect=IntegrityError('UNIQUE constraint failed')):
+            with self.assertRaises(IntegrityError):
+                call_command('refresh_forecasts', url='http://provider.invalid/')
+
+class ColumnarFormatTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(name='Columns', country='RF', latitude=55.75, longitude=37.62)
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        for day in range(5):
+            WeatherForecast.objects.create(
+                city_id=self.city, forecast_date=start + timedelta(days=day),
+                temperature_min=day - 5, temperature_max=day + 0.5,
+                condition=['Snow', 'Cloudy'][day % 2], humidity=60 + day,
+            )
+
+    def get(self, **params):
+        return self.client.get('/api/v1/forecasts/', {'city': self.city.pk, 'format': 'columnar', **params})
+
+    def test_matches_row_format(self):
+        """Тест что колоночный формат содержит те же данные, что и построчный"""
+        rows = self.client.get('/api/v1/forecasts/', {'city': self.city.pk}).json()['results']
+        with self.assertNumQueries(3):  # метки для ETag, город, строки
+            response = self.get()
+        self.assertEqual(response['Content-Type'], 'application/vnd.meteoservice.columnar+json')
+        data = response.json()
+        self.assertEqual(data['city']['name'], 'Columns')
+        self.assertEqual(data['conditions'], ['Snow', 'Cloudy'])
+        columns = data['columns']
+        self.assertEqual(columns['temperature_min'], [row['temperature_min'] for row in rows])
+        self.assertEqual(columns['humidity'], [row['humidity'] for row in rows])
+        self.assertEqual([data['conditions'][code] for code in columns['condition']],
+                         [row['condition'] for row in rows])
+        self.assertEqual(
+            columns['timestamp'],
+            [int(datetime.fromisoformat(row['forecast_date'].replace('Z', '+00:00')).timestamp()) for row in rows],
+        )
+        self.assertLess(len(response.content), len(json.dumps(rows)))
+
+    def test_cursor_pages(self):
+        first = self.get(page_size=2).json()
+        self.assertEqual(first['count'], 2)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['count'], 2)
+        self.assertEqual(self.client.get(second['previous']).json()['columns'], first['columns'])
+
+    def test_accept_header(self):
+        response = self.client.get(
+            '/api/v1/forecasts/', {'city': self.city.pk},
+            HTTP_ACCEPT='application/vnd.meteoservice.columnar+json',
+        )
+        self.assertEqual(len(response.json()['columns']['timestamp']), 5)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/api/v1/forecasts/', {'format': 'columnar'}).status_code, 400)
+        self.assertEqual(self.get(city=999999).status_code, 404)
+        forecast = WeatherForecast.objects.first()
+        self.assertEqual(
+            self.client.get(f'/api/v1/forecasts/{forecast.pk}/', {'format': 'columnar'}).status_code, 404
+        )
+
+class ForecastAggregateTests(TestCase):
+    def setUp(self):
+        self.city = City.objects.create(name='Agg', country='AggLand', latitude=0, longitude=0)
+        other = City.objects.create(name='Agg 2', country='AggLand', latitude=1, longitude=1)
+        City.objects.create(name='Elsewhere', country='Other', latitude=2, longitude=2)
+        # 2025-01-01 - среда; 40 дней захватывают три месяца и 7 недель
+        start = timezone.make_aware(datetime(2025, 1, 1))
+        for day in range(40):
+            WeatherForecast.objects.create(
+                city_id=self.city, forecast_date=start + timedelta(days=day),
+                temperature_min=day, temperature_max=day + 10, condition='Sunny', humidity=50 + day % 3,
+            )
+        WeatherForecast.objects.create(
+            city_id=other, forecast_date=start + timedelta(hours=12),
+            temperature_min=-20, temperature_max=-10, condition='Snow', humidity=90,
+        )
+
+    def get(self, **params):
+        response = self.client.get('/api/v1/forecasts/aggregate/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_daily_city(self):
+        data = self.get(city=self.city.pk, bucket='day', to='2025-01-03')
+        self.assertEqual(data['city']['name'], 'Agg')
+        self.assertEqual([b['start'] for b in data['buckets']], ['2025-01-01', '2025-01-02', '2025-01-03'])
+        first = data['buckets'][0]
+        self.assertEqual((first['count'], first['temperature_min'], first['temperature_max']), (1, 0, 10))
+        self.assertEqual(first['temperature_mean'], 5)
+
+    def test_weekly_and_monthly(self):
+        weeks = self.get(city=self.city.pk, bucket='week')['buckets']
+        self.assertEqual(weeks[0]['start'], '2024-12-30')  # понедельник
+        self.assertEqual(weeks[0]['count'], 5)
+        self.assertEqual(sum(b['count'] for b in weeks), 40)
+
+        months = self.get(city=self.city.pk, bucket='month')['buckets']
+        self.assertEqual([(b['start'], b['count']) for b in months], [('2025-01-01', 31), ('2025-02-01', 9)])
+        january = months[0]
+        self.assertEqual((january['temperature_min'], january['temperature_max']), (0, 40))
+        self.assertEqual(january['temperature_mean'], 20)
+        self.assertEqual((january['humidity_min'], january['humidity_max']), (50, 52))
+
+    def test_country_combines_cities(self):
+        data = self.get(country='AggLand', bucket='day', to='2025-01-01')
+        self.assertEqual(data['country'], 'AggLand')
+        self.assertEqual(data['buckets'], [{
+            'start': '2025-01-01', 'count': 2,
+            'temperature_min': -20, 'temperature_max': 10, 'temperature_mean': -5,
+            'humidity_min': 50, 'humidity_max': 90, 'humidity_mean': 70,
+        }])
+        self.assertEqual(self.get(country='Other')['buckets'], [])
+
+    def test_matches_sql_aggregates(self):
+        """Тест что векторные агрегаты совпадают с агрегатами базы"""
+        from django.db.models import Avg, Max, Min
+        from django.db.models.functions import TruncMonth
+        expected = (
+            WeatherForecast.objects.filter(city_id=self.city)
+            .annotate(month=TruncMonth('forecast_date')).values('month')
+            .annotate(low=Min('temperature_min'), high=Max('temperature_max'), wet=Avg('humidity'))
+            .order_by('month')
+        )
+        buckets = self.get(city=self.city.pk, bucket='month')['buckets']
+        self.assertEqual(
+            [(b['temperature_min'], b['temperature_max'], b['humidity_mean']) for b in buckets],
+            [(row['low'], row['high'], round(row['wet'], 2)) for row in expected],
+        )
+
+    def test_validation(self):
+        url = '/api/v1/forecasts/aggregate/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'city': self.city.pk, 'country': 'AggLand'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'city': self.city.pk, 'bucket': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'city': self.city.pk, 'from': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'city': 999999}).status_code, 404)
+
+def reference_lttb(points, n):
+    """Последовательный LTTB по одной кривой (эталон для проверки)"""
+    every = (len(points) - 2) / (n - 2)
+    selected, a = [0], 0
+    for i in range(n - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        following = points[end:int((i + 2) * every) + 1] if i < n - 3 else points[-1:]
+        cx = sum(p[0] for p in following) / len(following)
+        cy = sum(p[1] for p in following) / len(following)
+        ax, ay = points[a]
+        areas = [abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay)) for x, y in points[start:end]]
+        a = start + areas.index(max(areas))
+        selected.append(a)
+    return selected + [len(points) - 1]
+
+
+class ForecastDownsampleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name='Series', country='RF', latitude=0, longitude=0)
+        start = timezone.make_aware(datetime(2020, 1, 1))
+        rng = np.random.default_rng(0)
+        lows = np.round(rng.normal(0, 5, 600), 1)
+        lows[300] = 45  # выброс должен пережить прореживание
+        WeatherForecast.objects.bulk_create(
+            WeatherForecast(
+                city_id=self.city, forecast_date=start + timedelta(days=day),
+                temperature_min=float(low), temperature_max=float(low) + 8,
+                condition='Cloudy', humidity=50,
+            )
+            for day, low in enumerate(lows)
+        )
+
+    def get(self, **params):
+        return self.client.get('/api/v1/forecasts/', {'city': self.city.pk, **params})
+
+    def test_matches_reference_lttb(self):
+        rng = np.random.default_rng(1)
+        x = np.cumsum(rng.uniform(0.5, 2, 1000))
+        y = rng.normal(0, 1, 1000)
+        for n in (3, 10, 97, 500):
+            self.assertEqual(
+                downsample.lttb_indices(x, y[None, :], n).tolist(),
+                reference_lttb(list(zip(x.tolist(), y.tolist())), n),
+            )
+        self.assertEqual(downsample.lttb_indices(x[:5], y[None, :5], 10).tolist(), [0, 1, 2, 3, 4])
+
+    def test_equivalent_params_share_cached_selection(self):
+        """Тест что ?city=01 и другая запись той же даты используют одну выборку"""
+        with mock.patch.object(downsample, 'lttb_indices', wraps=downsample.lttb_indices) as lttb:
+            self.get(max_points=20, **{'from': '2020-02-01'})
+            self.client.get('/api/v1/forecasts/', {
+                'city': f'0{self.city.pk}', 'max_points': 20, 'from': '2020-02-01T00:00:00',
+            })
+            self.assertEqual(lttb.call_count, 1)
+            self.get(max_points=20, **{'from': '2020-02-02'})
+            self.assertEqual(lttb.call_count, 2)
+
+    def test_row_and_columnar_formats(self):
+        rows = self.get(max_points=50).json()['results']
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[0]['forecast_date'][:10], '2020-01-01')
+        self.assertIn(45, [row['temperature_min'] for row in rows])
+        dates = [row['forecast_date'] for row in rows]
+        self.assertEqual(dates, sorted(dates))
+
+        data = self.get(max_points=50, format='columnar').json()
+        self.assertEqual(data['count'], 50)
+        self.assertEqual(data['columns']['temperature_min'], [row['temperature_min'] for row in rows])
+        self.assertIsNone(data['next'])
+
+    def test_cached_until_data_changes(self):
+        self.get(max_points=20, **{'from': '2020-03-01'})
+        self.client.force_login(User.objects.create_user(username='viewer', password='pass'))
+        with mock.patch.object(downsample, 'load_columns', wraps=downsample.load_columns) as load:
+            self.get(max_points=20, **{'from': '2020-03-01'})
+            self.assertEqual(load.call_count, 0)
+            self.get(max_points=21, **{'from': '2020-03-01'})
+            self.assertEqual(load.call_count, 1)
+            WeatherForecast.objects.filter(city_id=self.city).first().delete()
+            self.get(max_points=20, **{'from': '2020-03-01'})
+            self.assertEqual(load.call_count, 2)
+
+    def test_validation(self):
+        self.assertEqual(self.client.get('/api/v1/forecasts/', {'max_points': 10}).status_code, 400)
+        self.assertEqual(self.get(max_points=2).status_code, 400)
+        self.assertEqual(self.get(max_points='many').status_code, 400)
+        self.assertEqual(self.get(max_points=downsample.MAX_POINTS + 1).status_code, 400)
@@ -0,0 +1,180 @@
+"""
+Замеры времени запроса: SQL (число и время), шаблоны, сериализаторы, всего.
+
+PerformanceMiddleware собирает замеры каждого запроса для метрик /metrics
+(weather_app/metrics.py, METRICS_ENABLED), а для доли запросов
+PERF_SAMPLE_RATE (0..1) отдает их заголовком Server-Timing (видно во
+вкладке Network браузера) и одной JSON строкой в логгер weather_app.perf.
+Замер - пара вызовов perf_counter на SQL запрос и шаблон; без метрик
+невыбранные запросы проходят вовсе без замеров.
+
+Время шаблона включает ленивые SQL запросы, выполненные при рендеринге.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+from . import metrics
+
+logger = logging.getLogger("weather_app.perf")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+# метрика -> описание в Server-Timing (заголовок допускает только latin-1)
+METRICS = {
+    "db": "SQL",
+    "tpl": "templates",
+    "ser": "serializers",
+}
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.queries = 0
+        self._open = set()
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms):
+        descriptions = {**METRICS, "db": f"SQL ({self.queries} queries)"}
+        parts = [
+            f'{name};dur={self.durations[name] * 1000:.1f};desc="{desc}"'
+            for name, desc in descriptions.items()
+        ]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    def record(self, request, response, total_ms):
+        match = request.resolver_match
+        return {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            "db_queries": self.queries,
+            **{f"{name}_ms": round(value * 1000, 2) for name, value in self.durations.items()},
+        }
+
+
+@contextmanager
+def span(name):
+    """Добавляет время блока к метрике name, вложенные блоки не считаются дважды."""
+    timings = _current.get()
+    if timings is None or name in timings._open:
+        yield
+        return
+    timings._open.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started
+        timings._open.discard(name)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.durations["db"] += time.perf_counter() - started
+        timings.queries += 1
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    # обертка живет все время соединения; contextvar копируется и в потоки
+    # sync_to_async, поэтому запросы асинхронных view тоже учитываются
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+class TimedTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, время рендеринга попадает в метрику tpl."""
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with span("tpl"):
+            return self.template.render(context, request)
+
+
+class PerformanceMiddleware:
+    """Server-Timing и строка лога для выборки запросов (см. модуль)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sampled = self.sampled()
+        if not sampled and not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+            # ленивый TemplateResponse уже отрендерен обработчиком запроса
+            return self.finish(request, response, timings, sampled)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        sampled = self.sampled()
+        if not sampled and not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, timings, sampled)
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def sampled():
+        rate = settings.PERF_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @staticmethod
+    def finish(request, response, timings, sampled):
+        total_ms = timings.total_ms()
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(request, response, timings, total_ms)
+        if sampled:
+            response["Server-Timing"] = timings.server_timing(total_ms)
+            record = timings.record(request, response, total_ms)
+            logger.info(json.dumps(record, ensure_ascii=False), extra={"perf": record})
+        return response
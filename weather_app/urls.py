@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 from .views import CityCreateView, CityDetailView, CitySearchView, CityUpdateView, CityDeleteView
 
 urlpatterns = [
@@ -16,8 +16,15 @@ urlpatterns = [
     path("cities/<int:pk>/favorite/add/", views.add_favorite, name="add_favorite"),
     path("cities/<int:pk>/favorite/remove/", views.remove_favorite, name="remove_favorite"),
 
+    # асинхронные версии страниц для ASGI
+    path("async/cities/<int:pk>/", async_views.city_detail, name="async_city_detail"),
+    path("async/forecasts/", async_views.forecast_list, name="async_forecast_list"),
+
     # support URLs
     path('support/', views.support_request, name='support_request'),
     path('support/dashboard/', views.support_dashboard, name='support_dashboard'),
     path('support/<int:pk>/', views.support_request_detail, name='support_request_detail'),
+
+    # метрики Prometheus
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,4 +1,7 @@
+import hmac
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, HttpResponse
 from .models import City, WeatherForecast, Favorite  # ← ДОБАВИЛ Favorite
 from django.views.generic import DetailView, CreateView, ListView, UpdateView, DeleteView
 from django.urls import reverse_lazy
@@ -16,8 +19,16 @@ from .models import Profile, SupportRequest
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.conf import settings
-from django.core.mail import send_mail
 from django.utils import timezone
+from .filters import filter_forecast_dates
+from . import search
+from .pagination import keyset_paginate
+from .conditional import city_page_conditional
+from .cache import cached_response
+from . import outbox
+from . import metrics
+from .replica import replica_reads, ReplicaReadsMixin
+from .refresh import count_city_hits
 
 class AdminRequiredMixin(UserPassesTestMixin):
     def test_func(self):
@@ -28,6 +39,15 @@ class AdminRequiredMixin(UserPassesTestMixin):
         return redirect('city_list')
 # Create your views here.
 
+CITY_LIST_SORTS = {
+    "name": ("name", "id"),
+    "-name": ("-name", "-id"),
+    "country": ("country", "id"),
+    "-country": ("-country", "-id"),
+}
+
+@replica_reads
+@cached_response("city_list")
 def city_list(request):
     cities = City.active.all() 
     # фильтр по названию города
@@ -40,35 +60,107 @@ def city_list(request):
     if country:
         cities = cities.filter(country__icontains=country)
 
-    # сортировка
+    # сортировка: (поле, id) - ключ для cursor пагинации
     sort = request.GET.get("sort")
-    if sort == "name":
-        cities = cities.order_by("name")
-    elif sort == "-name":
-        cities = cities.order_by("-name")
-    elif sort == "country":
-        cities = cities.order_by("country")
-    elif sort == "-country":
-        cities = cities.order_by("-country")
-    
-    # ПАГИНАЦИЯ
-    paginator = Paginator(cities, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    if sort not in CITY_LIST_SORTS:
+        sort = "name"
+    ordering = CITY_LIST_SORTS[sort]
+
+    # ПАГИНАЦИЯ: по умолчанию cursor (без OFFSET и COUNT), ?page= - постраничная
+    if "page" in request.GET:
+        paginator = Paginator(cities.order_by(*ordering), 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    else:
+        try:
+            page_obj = keyset_paginate(cities, ordering, request.GET.get("cursor"), 10)
+        except ValueError:
+            page_obj = keyset_paginate(cities, ordering, None, 10)
+
     return render(request, "city_list.html", {
         "cities": page_obj,
-        "page_obj": page_obj
+        "page_obj": page_obj,
+        "next_query": _replace_query(request, cursor=getattr(page_obj, "next_cursor", None)),
+        "previous_query": _replace_query(request, cursor=getattr(page_obj, "previous_cursor", None)),
     })
 
+def _replace_query(request, **params):
+    """Query string текущего запроса с замененными параметрами (без page)."""
+    if any(value is None for value in params.values()):
+        return None
+    query = request.GET.copy()
+    query.pop("page", None)
+    for name, value in params.items():
+        query[name] = value
+    return query.urlencode()
+
+FORECAST_LIST_ORDERING = ("forecast_date", "id")
+FORECAST_LIST_PAGE_SIZE = 50
+
+def filter_forecast_list(params):
+    """Выборка прогнозов по фильтрам ?city=&from=&to= и ошибка разбора дат"""
+    forecasts = WeatherForecast.objects.select_related("city_id")
+    date_error = None
+
+    # фильтр по городу (id)
+    city = params.get("city", "")
+    if city.isdigit():
+        forecasts = forecasts.filter(city_id=city)
+
+    # фильтр по датам ?from=&to=
+    try:
+        forecasts = filter_forecast_dates(forecasts, params)
+    except ValueError as e:
+        date_error = str(e)
+    return forecasts, date_error
+
+def favorited_by_query(page):
+    """Пользователи, добавившие в избранное города страницы, - один запрос"""
+    return Favorite.objects.filter(
+        city_id__in={f.city_id_id for f in page}
+    ).values_list("city_id", "user_id__username").order_by("city_id", "user_id__username")
+
+def forecast_list_context(request, page_obj, favorites, cities, date_error):
+    favorited_by = {}
+    for city_id, username in favorites:
+        favorited_by.setdefault(city_id, []).append(username)
+    for forecast in page_obj:
+        forecast.favorited_by = favorited_by.get(forecast.city_id_id, [])
+    return {
+        "forecasts": page_obj,
+        "page_obj": page_obj,
+        "cities": cities,
+        "city": request.GET.get("city", ""),
+        "date_from": request.GET.get("from", ""),
+        "date_to": request.GET.get("to", ""),
+        "date_error": date_error,
+        "next_query": _replace_query(request, cursor=page_obj.next_cursor),
+        "previous_query": _replace_query(request, cursor=page_obj.previous_cursor),
+    }
+
+@replica_reads
 def forecast_list(request):
-    forecasts = (
-        WeatherForecast.objects
-        .select_related("city_id")
-        .prefetch_related("city_id__users")
+    forecasts, date_error = filter_forecast_list(request.GET)
+
+    # cursor пагинация по (дата, id): страница не зависит от размера таблицы
+    try:
+        page_obj = keyset_paginate(
+            forecasts, FORECAST_LIST_ORDERING, request.GET.get("cursor"), FORECAST_LIST_PAGE_SIZE
+        )
+    except ValueError:
+        page_obj = keyset_paginate(forecasts, FORECAST_LIST_ORDERING, None, FORECAST_LIST_PAGE_SIZE)
+
+    context = forecast_list_context(
+        request,
+        page_obj,
+        favorited_by_query(page_obj),
+        City.active.values_list("pk", "name", "country"),
+        date_error,
     )
-    return render(request, "forecast_list.html", {"forecasts": forecasts})
+    return render(request, "forecast_list.html", context)
 
+@method_decorator(count_city_hits, name='get')
+@method_decorator(city_page_conditional, name='get')
+@method_decorator(cached_response("city_detail"), name='get')
 class CityDetailView(DetailView):
     model = City
     template_name = "city_detail.html"
@@ -76,8 +168,15 @@ class CityDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Добавляем прогнозы погоды для выбранного города
-        context["forecasts"] = WeatherForecast.objects.filter(city_id=self.object)
+        # Добавляем прогнозы погоды для выбранного города (?from=&to=)
+        forecasts = WeatherForecast.objects.filter(city_id=self.object)
+        try:
+            forecasts = filter_forecast_dates(forecasts, self.request.GET)
+        except ValueError as e:
+            context["date_error"] = str(e)
+        context["forecasts"] = forecasts
+        context["date_from"] = self.request.GET.get("from", "")
+        context["date_to"] = self.request.GET.get("to", "")
         # Проверяем, есть ли город в избранном у текущего пользователя
         if self.request.user.is_authenticated:
             context["is_favorite"] = Favorite.objects.filter(
@@ -94,7 +193,8 @@ class CityCreateView(AdminRequiredMixin, SuccessMessageMixin, CreateView):
     success_message = "Город успешно добавлен"
     success_url = reverse_lazy("city_list")
 
-class CitySearchView(ListView):
+@method_decorator(cached_response("city_search"), name='get')
+class CitySearchView(ReplicaReadsMixin, ListView):
     model = City
     template_name = "city_search.html"
     context_object_name = "cities"
@@ -105,9 +205,19 @@ class CitySearchView(ListView):
         order = self.request.GET.get("order")
 
         if query:
-            queryset = queryset.filter(
-                models.Q(name__icontains=query) | models.Q(country__icontains=query)
-            )
+            if search.is_available(queryset.db):
+                # FTS5 индекс: префиксы, транслитерация, ранжирование. Совпадений
+                # может быть много (запрос по стране): города читаются in_bulk
+                # пачками, порядок - по релевантности или по названию
+                ids = search.search_city_ids(query, using=queryset.db)
+                cities = queryset.in_bulk(ids)
+                if order in ("asc", "desc"):
+                    return sorted(cities.values(), key=lambda city: city.name, reverse=order == "desc")
+                return [cities[pk] for pk in ids if pk in cities]
+            else:
+                queryset = queryset.filter(
+                    models.Q(name__icontains=query) | models.Q(country__icontains=query)
+                )
 
         if order == "asc":
             queryset = queryset.order_by("name")
@@ -248,11 +358,10 @@ def support_request(request):
             
             support_request.save()
             
-            # Отправляем email уведомление
-            try:
-                send_mail(
-                    f'Новая заявка в поддержку: {support_request.subject}',
-                    f'''Поступила новая заявка в поддержку:
+            # Уведомление сотруднику ставится в очередь (отправит deliver_outbox)
+            outbox.enqueue(
+                f'Новая заявка в поддержку: {support_request.subject}',
+                f'''Поступила новая заявка в поддержку:
                     
 Имя: {support_request.name}
 Email: {support_request.email}
@@ -261,13 +370,8 @@ Email: {support_request.email}
 
 Для ответа перейдите в админ-панель.
                     ''',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [settings.SUPPORT_EMAIL],  # email сотрудника
-                    fail_silently=False,
-                )
-            except Exception as e:
-                # Если отправка email не удалась, просто логируем ошибку
-                print(f"Ошибка отправки email: {e}")
+                [settings.SUPPORT_EMAIL],  # email сотрудника
+            )
             
             messages.success(request, '✅ Ваше сообщение отправлено! Мы ответим вам в ближайшее время.')
             return redirect('support_request')
@@ -320,11 +424,10 @@ def support_request_detail(request, pk):
             response.responded_at = timezone.now()
             response.save()
             
-            # Отправляем ответ пользователю
-            try:
-                send_mail(
-                    f'Ответ на вашу заявку: {response.subject}',
-                    f'''Здравствуйте, {response.name}!
+            # Ответ пользователю ставится в очередь (отправит deliver_outbox)
+            outbox.enqueue(
+                f'Ответ на вашу заявку: {response.subject}',
+                f'''Здравствуйте, {response.name}!
 
 Спасибо за ваше обращение в поддержку.
 
@@ -334,13 +437,9 @@ def support_request_detail(request, pk):
 С уважением,
 Служба поддержки Метеосервиса
                     ''',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [response.email],
-                    fail_silently=False,
-                )
-                messages.success(request, '✅ Ответ отправлен пользователю!')
-            except Exception as e:
-                messages.error(request, f'❌ Ошибка отправки email: {e}')
+                [response.email],
+            )
+            messages.success(request, '✅ Ответ сохранен и будет отправлен пользователю!')
             
             return redirect('support_dashboard')
     else:
@@ -350,3 +449,16 @@ def support_request_detail(request, pk):
         'support_request': support_request,
         'form': form
     })
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus (см. weather_app/metrics.py)"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (
+        request.user.is_staff
+        or token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    ):
+        raise PermissionDenied
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")